@@ -0,0 +1,248 @@
+"""
+Corporate-action adjustments (splits, rights issues, bonus shares).
+
+Per symbol we keep the raw bars exactly as unadjusted providers (data.go.kr)
+report them, plus a factor table of (ex_date, factor) events. The adjusted
+series in price_store is a materialized view: bars before an ex-date are
+multiplied by the product of the factors of every later event (volume is
+divided). Adjusted providers (FDR, yfinance) are turned back into raw bars
+through the same table.
+
+Events are recorded explicitly (record_action, from the admin endpoint
+POST /api/admin/stock/{code}/adjustments) or inferred: wherever raw and
+adjusted closes overlap, a step in adjusted/raw between two trading days is
+an ex-date. Symbols served only by data.go.kr (raw) never get an adjusted
+reference, so a raw day-over-day move beyond the KRX price limit is taken as
+an action too, its ratio snapped to n:1 / 1:n. A new event rescales only the
+stored bars before its ex-date, in place; nothing is invalidated or re-downloaded.
+"""
+import logging
+import os
+
+import numpy as np
+
+import price_store
+
+logger = logging.getLogger(__name__)
+
+ADJUSTMENT_TOLERANCE = float(os.getenv("ADJUSTMENT_TOLERANCE", "0.01")) # ratio step that counts as an action
+# KRX limits a day's move to +-30%; a larger raw gap can only be a corporate action
+RAW_GAP_THRESHOLD = float(os.getenv("RAW_GAP_THRESHOLD", "0.35"))
+SPLIT_SNAP_TOLERANCE = 0.1 # observed ratio within 10% of n:1 or 1:n is taken as exactly that
+PRICE_FIELDS = ("open", "high", "low", "close")
+
+ADJUSTMENT_STATE = {
+    "raw": {},     # symbol -> price_store.PriceSeries of unadjusted bars (observed only)
+    "factors": {}, # symbol -> FactorTable
+}
+
+class FactorTable:
+    """
+    Events sorted by ex_date; factor is the price multiplier for bars before ex_date.
+    """
+    def __init__(self):
+        self.ex_dates = np.array([], dtype="datetime64[D]")
+        self.factors = np.array([], dtype=np.float64)
+        self.kinds = []
+
+    def __len__(self):
+        return len(self.ex_dates)
+
+    def cumulative(self, dates):
+        """
+        Factor to apply to raw bars on each date: product of every event after it.
+        """
+        out = np.ones(len(dates))
+        if not len(self.ex_dates):
+            return out
+        suffix = np.cumprod(self.factors[::-1])[::-1] # suffix[i] = prod(factors[i:])
+        idx = np.searchsorted(self.ex_dates, dates, side="right")
+        later = idx < len(self.ex_dates)
+        out[later] = suffix[idx[later]]
+        return out
+
+    def add(self, ex_date, factor: float, kind: str):
+        """
+        Insert (or fold into an existing event on the same ex_date).
+        """
+        ex_date = np.datetime64(ex_date, "D")
+        i = int(np.searchsorted(self.ex_dates, ex_date))
+        if i < len(self.ex_dates) and self.ex_dates[i] == ex_date:
+            self.factors[i] *= factor
+            return
+        self.ex_dates = np.insert(self.ex_dates, i, ex_date)
+        self.factors = np.insert(self.factors, i, factor)
+        self.kinds.insert(i, kind)
+
+    def to_list(self):
+        return [
+            {"ex_date": str(d), "factor": round(float(f), 6), "kind": k}
+            for d, f, k in zip(self.ex_dates, self.factors, self.kinds)
+        ]
+
+def get_factors(symbol: str):
+    table = ADJUSTMENT_STATE["factors"].get(symbol)
+    if table is None:
+        table = ADJUSTMENT_STATE["factors"][symbol] = FactorTable()
+    return table
+
+def get_events(symbol: str):
+    table = ADJUSTMENT_STATE["factors"].get(symbol)
+    return table.to_list() if table is not None else []
+
+def _scale(columns: dict, factor):
+    """
+    Adjust (factor) or un-adjust (1 / factor) column bars.
+    """
+    out = {"date": columns["date"]}
+    for field in PRICE_FIELDS:
+        if field in columns:
+            out[field] = columns[field] * factor
+    if "volume" in columns:
+        out["volume"] = columns["volume"] / factor
+    return out
+
+def _columns(bars):
+    dates, data = price_store._as_columns(bars)
+    return {"date": dates, **data}
+
+def _apply(symbol: str, ex_date, factor: float, kind: str, rescale: bool = True):
+    """
+    Record one event and rescale the adjusted bars before ex_date in place
+    (rescale=False when the stored bars already reflect it).
+    """
+    get_factors(symbol).add(ex_date, factor, kind)
+    logger.info(f"[INFO] {symbol}: {kind} action on {ex_date} (x{factor:.4f})")
+    series = price_store.get_series(symbol)
+    if not rescale or series is None or not len(series):
+        return
+    end = int(np.searchsorted(series.dates, np.datetime64(ex_date, "D")))
+    if end == 0:
+        return
+    for field in PRICE_FIELDS:
+        getattr(series, field)[:end] *= factor
+    series.volume[:end] /= factor
+    price_store.mark_changed(series, 0)
+
+def _detect(symbol: str, dates, raw_close, adj_close, adjusted_dates, rescale: bool):
+    """
+    Infer events from overlapping raw/adjusted closes (both aligned on dates).
+    adjusted_dates: every adjusted bar date, used to place an event that
+    happened after the last overlapping bar.
+    """
+    valid = (raw_close > 0) & (adj_close > 0)
+    if valid.sum() == 0:
+        return
+    dates, raw_close, adj_close = dates[valid], raw_close[valid], adj_close[valid]
+    # Residual against what the table already explains; 1.0 everywhere when nothing is missing
+    q = adj_close / raw_close / get_factors(symbol).cumulative(dates)
+
+    events = []
+    for i in range(1, len(q)):
+        step = q[i - 1] / q[i]
+        if abs(step - 1) <= ADJUSTMENT_TOLERANCE:
+            continue
+        # A one-day glitch snaps back on the next bar; an action holds
+        if i + 1 < len(q) and abs(q[i + 1] / q[i - 1] - 1) <= ADJUSTMENT_TOLERANCE:
+            continue
+        events.append((dates[i], step))
+    tail = q[-1]
+    later_dates = adjusted_dates[adjusted_dates > dates[-1]]
+    if abs(tail - 1) > ADJUSTMENT_TOLERANCE and len(later_dates):
+        # Action after our last raw bar: the first adjusted bar past it is the best ex-date guess
+        events.append((later_dates[0], tail))
+
+    for ex_date, factor in events:
+        _apply(symbol, str(ex_date), float(factor), "inferred", rescale)
+
+def _snap_ratio(factor: float):
+    n = round(1 / factor) if factor < 1 else round(factor)
+    nice = 1 / n if factor < 1 else n
+    return float(nice) if n >= 2 and abs(factor / nice - 1) <= SPLIT_SNAP_TOLERANCE else factor
+
+def _detect_gaps(symbol: str, raw: price_store.PriceSeries):
+    """
+    Infer events from the raw bars alone: a move beyond the daily price limit that
+    the factor table does not already explain. The ex-date's open (close when
+    missing) against the previous close gives the ratio.
+    """
+    if not symbol.isdigit() or len(raw) < 2:
+        return []
+    cumulative = get_factors(symbol).cumulative(raw.dates)
+    close = raw.close * cumulative
+    reference = np.where(np.isnan(raw.open) | (raw.open <= 0), raw.close, raw.open) * cumulative
+    valid = np.flatnonzero(close > 0)
+    if len(valid) < 2:
+        return []
+    prev, cur = valid[:-1], valid[1:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        move = close[cur] / close[prev]
+    gaps = np.flatnonzero(np.abs(move - 1) > RAW_GAP_THRESHOLD)
+    events = []
+    for i in gaps:
+        factor = _snap_ratio(float(reference[cur[i]] / close[prev[i]]))
+        events.append((str(raw.dates[cur[i]]), factor))
+    return events
+
+def record_action(symbol: str, ex_date: str, factor: float, kind: str = "split"):
+    """
+    Register a known corporate action, e.g. a 1:50 split is factor 1/50.
+    """
+    if not factor or factor <= 0:
+        raise ValueError("factor must be positive")
+    _apply(symbol, ex_date, float(factor), kind)
+    return get_factors(symbol).to_list()
+
+def ingest(symbol: str, bars, adjusted: bool, name: str = None):
+    """
+    Store provider bars. Raw bars are kept as-is and adjusted into price_store;
+    adjusted bars are checked against raw bars for new actions, then merged.
+    Returns (series, start) like price_store.merge_bars.
+    """
+    columns = _columns(bars)
+    dates = columns["date"]
+    series = price_store.get_series(symbol)
+    raw = ADJUSTMENT_STATE["raw"].get(symbol)
+
+    if adjusted:
+        if raw is not None and len(raw):
+            pos = np.searchsorted(raw.dates, dates).clip(max=len(raw.dates) - 1)
+            hit = raw.dates[pos] == dates
+            # Incoming bars reflect every action; the stored ones do not know the new ones yet
+            _detect(symbol, dates[hit], raw.close[pos[hit]], columns["close"][hit], dates, rescale=True)
+        return price_store.merge_bars(symbol, columns, name)
+
+    if raw is None:
+        raw = ADJUSTMENT_STATE["raw"][symbol] = price_store.PriceSeries(symbol, name)
+    price_store.merge_into(raw, columns)
+    if series is not None and len(series):
+        pos = np.searchsorted(series.dates, dates).clip(max=len(series.dates) - 1)
+        hit = series.dates[pos] == dates
+        # The stored adjusted bars are where the actions were seen, so they stay as they are
+        _detect(symbol, dates[hit], columns["close"][hit], series.close[pos[hit]], series.dates, rescale=False)
+    for ex_date, gap_factor in _detect_gaps(symbol, raw):
+        # Stored bars before the gap were adjusted without this event: rescale them
+        _apply(symbol, ex_date, gap_factor, "inferred_gap", rescale=True)
+    factor = get_factors(symbol).cumulative(dates)
+    return price_store.merge_bars(symbol, _scale(columns, factor), name)
+
+def raw_records(symbol: str, start_date: str = None, end_date: str = None):
+    """
+    Unadjusted closes in the get_stock_price shape: observed raw bars where we
+    have them, otherwise adjusted bars divided back through the factor table.
+    """
+    series = price_store.get_series(symbol)
+    if series is None:
+        return []
+    sl = series.window(start_date, end_date)
+    dates = series.dates[sl]
+    closes = series.close[sl] / get_factors(symbol).cumulative(dates)
+    raw = ADJUSTMENT_STATE["raw"].get(symbol)
+    if raw is not None and len(raw) and len(dates):
+        pos = np.searchsorted(raw.dates, dates).clip(max=len(raw.dates) - 1)
+        hit = (raw.dates[pos] == dates) & ~np.isnan(raw.close[pos])
+        closes[hit] = raw.close[pos[hit]]
+    return [
+        {"date": d, "close": price_store.format_close(c)}
+        for d, c in zip(dates.astype(str).tolist(), closes.tolist()) if c == c
+    ]
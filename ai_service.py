@@ -1,9 +1,11 @@
-import openai
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import logging
 
+import executors
+import metrics
+import price_features
+
 # Configure Logging
 logger = logging.getLogger(__name__)
 
@@ -12,13 +14,45 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-async def analyze_stock(stock_name: str, price_data, financials):
-    last_close = price_data[-1]['close'] if price_data else "Unknown"
+# One client per process: building one loads an SSL context (tens of ms, GIL held),
+# and httpx's connection pool is shared safely between executor threads
+AI_CLIENTS = {"openai": None}
+
+# The SDKs are imported on first use: together they add most of a second to startup
+def _openai_client():
+    if AI_CLIENTS["openai"] is None:
+        import openai
+        AI_CLIENTS["openai"] = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return AI_CLIENTS["openai"]
+
+def _gemini_model(name: str):
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(name)
+
+# The SDK calls block for seconds: they run on the "llm" executor, never on the event loop
+def _openai_chat(model: str, messages: list, operation: str):
+    client = _openai_client()
+    with metrics.upstream("openai", operation):
+        response = client.chat.completions.create(model=model, messages=messages)
+    return response.choices[0].message.content
+
+def _gemini_generate(model_name: str, prompt: str, operation: str):
+    model = _gemini_model(model_name)
+    with metrics.upstream("gemini", operation):
+        response = model.generate_content(prompt)
+    return response.text
+
+async def analyze_stock(stock_name: str, price_data, financials, features=None):
+    # features: precomputed price_features dict (cached per symbol); else derived from price_data
+    if features is None:
+        features = price_features.features_from_records(price_data)
     
     prompt = f"""
     Analyze the investment value of {stock_name} based on the following data:
     
-    Recent Price Trend: {last_close} KRW (Last close)
+    Price Features:
+    {price_features.format_features(features)}
     Financials: {financials}
     
     Provide a concise investment outlook (Buy/Sell/Hold) and key reasons.
@@ -26,18 +60,10 @@ async def analyze_stock(stock_name: str, price_data, financials):
     """
 
     if GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key":
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt)
-        return response.text
+        return await executors.run("llm", _gemini_generate, 'gemini-pro', prompt, "analyze")
 
     if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key":
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
+        return await executors.run("llm", _openai_chat, "gpt-3.5-turbo", [{"role": "user", "content": prompt}], "analyze")
 
     return "AI API Key not configured. Please add OPENAI_API_KEY or GEMINI_API_KEY to .env file."
 
@@ -90,12 +116,9 @@ async def generate_with_openai(prompt):
     if not OPENAI_API_KEY or OPENAI_API_KEY == "your_openai_api_key":
         return None
     try:
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o", # Use 4o or 3.5-turbo
-            messages=[{"role": "user", "content": prompt}]
-        )
-        text = response.choices[0].message.content.strip()
+        # Use 4o or 3.5-turbo
+        text = await executors.run("llm", _openai_chat, "gpt-4o", [{"role": "user", "content": prompt}], "briefing")
+        text = text.strip()
         if text.startswith("```json"): text = text[7:]
         if text.endswith("```"): text = text[:-3]
         return json.loads(text)
@@ -107,11 +130,9 @@ async def generate_with_gemini(prompt):
     if not GEMINI_API_KEY or GEMINI_API_KEY == "your_gemini_api_key":
         return None
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
         # gemini-pro is deprecated/404, using 1.5-flash
-        model = genai.GenerativeModel('gemini-1.5-flash') 
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        text = await executors.run("llm", _gemini_generate, 'gemini-1.5-flash', prompt, "briefing")
+        text = text.strip()
         if text.startswith("```json"): text = text[7:]
         if text.endswith("```"): text = text[:-3]
         return json.loads(text)
@@ -173,11 +194,15 @@ async def chat_with_agent(message: str, history: list, context: dict):
     # 1. Construct System Prompt with Context
     stock_info = ""
     if context.get("stockName"):
+        features = price_features.get_features(context["stockCode"]) if context.get("stockCode") else None
+        if features is None:
+            features = price_features.features_from_records(context.get("stockData"))
         stock_info = f"""
         User is currently viewing: {context['stockName']} ({context.get('stockCode', 'N/A')})
         
         Current Data:
-        - Recent Price Data (Last 5 days): {str(context.get('stockData', [])[-5:])}
+        - Price Features:
+        {price_features.format_features(features)}
         - Financials: {str(context.get('financials', 'Not loaded'))}
         - AI Analysis Summary: {context.get('analysis', 'Not available')}
         """
@@ -212,20 +237,14 @@ async def chat_with_agent(message: str, history: list, context: dict):
     # 3. Call AI Service (OpenAI first, then Gemini)
     if OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key":
         try:
-            client = openai.OpenAI(api_key=OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model="gpt-4", # Use GPT-4 for better reasoning context
-                messages=messages
-            )
-            return response.choices[0].message.content
+            # Use GPT-4 for better reasoning context
+            return await executors.run("llm", _openai_chat, "gpt-4", messages, "chat")
         except Exception as e:
             logger.error(f"[ERROR] OpenAI Chat Failed: {e}")
 
     if GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key":
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-1.5-pro') # Use Pro for reasoning
-            
+            # Use Pro for reasoning
             # Gemini has a different chat structure, but for single turn with history, we can just pack it
             # Or use start_chat. Let's strictly map to content generation for simplicity or use pure convert
             # For simplicity in this hybrid setup, we'll format it as a single prompt for Gemini if history apis are complex,
@@ -236,8 +255,7 @@ async def chat_with_agent(message: str, history: list, context: dict):
                 full_prompt += f"{msg['role'].upper()}: {msg['content']}\n"
             full_prompt += "\nASSISTANT:"
             
-            response = model.generate_content(full_prompt)
-            return response.text
+            return await executors.run("llm", _gemini_generate, 'gemini-1.5-pro', full_prompt, "chat")
         except Exception as e:
             logger.error(f"[ERROR] Gemini Chat Failed: {e}")
 
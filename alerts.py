@@ -0,0 +1,355 @@
+"""
+Price alert engine.
+
+Active rules live in an in-memory index: per symbol, sorted threshold lists
+for "fires at or above" and "fires at or below" (percentage rules are stored
+as the absolute level they translate to). A new price is checked with two
+bisects, so only the rules that actually fire are touched, however many
+rules a symbol has.
+
+One-shot rules are level triggered and removed once they fire. Repeating
+rules stay in the index and fire on every crossing of their level between
+two consecutive prices of the same source (a live quote and a daily close
+are never compared with each other).
+
+Prices come from the quote hub (live quotes for every symbol with an active
+rule) and from the price store (new daily bars). Fired alerts are persisted
+and handed to the configured sinks off the hot path.
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+import numpy as np
+
+import crud
+import metrics
+import database
+import price_store
+import quote_stream
+from models import ALERT_ABOVE, ALERT_BELOW, ALERT_PCT_UP, ALERT_PCT_DOWN
+
+logger = logging.getLogger(__name__)
+
+ALERT_SINKS = os.getenv("ALERT_SINKS", "log,websocket")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERT_WATCH_QUOTES = os.getenv("ALERT_WATCH_QUOTES", "1") == "1" # keep live quotes polled for alerted symbols
+
+class Thresholds:
+    """
+    Sorted levels with their alert ids (parallel lists).
+    """
+    __slots__ = ("levels", "ids")
+
+    def __init__(self):
+        self.levels = []
+        self.ids = []
+
+    def add(self, level: float, alert_id: int):
+        i = bisect_right(self.levels, level)
+        self.levels.insert(i, level)
+        self.ids.insert(i, alert_id)
+
+    def remove(self, level: float, alert_id: int):
+        lo, hi = bisect_left(self.levels, level), bisect_right(self.levels, level)
+        for i in range(lo, hi):
+            if self.ids[i] == alert_id:
+                del self.levels[i], self.ids[i]
+                return True
+        return False
+
+    def __len__(self):
+        return len(self.levels)
+
+class SymbolRules:
+    __slots__ = ("once_above", "once_below", "repeat_above", "repeat_below", "last_prices")
+
+    def __init__(self):
+        self.once_above = Thresholds()   # fire when price >= level
+        self.once_below = Thresholds()   # fire when price <= level
+        self.repeat_above = Thresholds() # fire when price crosses up through level
+        self.repeat_below = Thresholds() # fire when price crosses down through level
+        self.last_prices = {} # source ("quote", "bar") -> last price it reported
+
+    def __len__(self):
+        return len(self.once_above) + len(self.once_below) + len(self.repeat_above) + len(self.repeat_below)
+
+    def bucket(self, rule: dict):
+        if rule["direction"] == ALERT_ABOVE:
+            return self.repeat_above if rule["repeat"] else self.once_above
+        return self.repeat_below if rule["repeat"] else self.once_below
+
+    def evaluate(self, price: float, source: str = "quote"):
+        """
+        Ids of the rules fired by this price; one-shot ones are removed.
+        Crossings are measured against the previous price of the same source.
+        """
+        fired = []
+        # One-shot, level triggered: the prefix/suffix of the sorted levels
+        k = bisect_right(self.once_above.levels, price)
+        if k:
+            fired += self.once_above.ids[:k]
+            del self.once_above.levels[:k], self.once_above.ids[:k]
+        k = bisect_left(self.once_below.levels, price)
+        if k < len(self.once_below):
+            fired += self.once_below.ids[k:]
+            del self.once_below.levels[k:], self.once_below.ids[k:]
+
+        # Repeating, edge triggered: levels strictly passed since the previous price
+        last = self.last_prices.get(source)
+        if last is not None:
+            if price > last:
+                lo, hi = bisect_right(self.repeat_above.levels, last), bisect_right(self.repeat_above.levels, price)
+                fired += self.repeat_above.ids[lo:hi]
+            elif price < last:
+                lo, hi = bisect_left(self.repeat_below.levels, price), bisect_left(self.repeat_below.levels, last)
+                fired += self.repeat_below.ids[lo:hi]
+        self.last_prices[source] = price
+        return fired
+
+ALERT_STATE = {
+    "symbols": {},    # stock_code -> SymbolRules
+    "rules": {},      # alert id -> {"id", "user_id", "stock_code", "kind", "value", "level", "direction", "repeat", "note"}
+    "outbox": [],     # fired events waiting for persistence + delivery
+    "dispatch_task": None,
+    "sinks": [],
+    "started": False,
+    "stats": {"evaluations": 0, "fired": 0, "eval_seconds": 0.0},
+}
+
+# 1. Index maintenance
+def direction_of(kind: str):
+    return ALERT_ABOVE if kind in (ALERT_ABOVE, ALERT_PCT_UP) else ALERT_BELOW
+
+def resolve_level(kind: str, value: float, reference: float = None):
+    """
+    Absolute trigger price of a rule; pct_* rules need a reference price.
+    """
+    if kind in (ALERT_ABOVE, ALERT_BELOW):
+        return value
+    if not reference:
+        raise ValueError("A reference price is required for percentage alerts")
+    sign = 1 if kind == ALERT_PCT_UP else -1
+    return reference * (1 + sign * abs(value) / 100)
+
+def index_rule(alert):
+    rule = {
+        "id": alert.id,
+        "user_id": alert.user_id,
+        "stock_code": alert.stock_code,
+        "kind": alert.kind,
+        "value": alert.value,
+        "level": alert.level,
+        "direction": direction_of(alert.kind),
+        "repeat": bool(alert.repeat),
+        "note": alert.note,
+    }
+    symbol = ALERT_STATE["symbols"].get(alert.stock_code)
+    if symbol is None:
+        symbol = ALERT_STATE["symbols"][alert.stock_code] = SymbolRules()
+        if ALERT_WATCH_QUOTES and ALERT_STATE["started"]:
+            quote_stream.HUB.watch(alert.stock_code)
+    symbol.bucket(rule).add(rule["level"], rule["id"])
+    ALERT_STATE["rules"][rule["id"]] = rule
+
+def unindex_rule(alert_id: int):
+    rule = ALERT_STATE["rules"].pop(alert_id, None)
+    if rule is None:
+        return
+    symbol = ALERT_STATE["symbols"].get(rule["stock_code"])
+    if symbol is None:
+        return
+    symbol.bucket(rule).remove(rule["level"], alert_id)
+    _drop_symbol_if_empty(rule["stock_code"])
+
+def _drop_symbol_if_empty(code: str):
+    symbol = ALERT_STATE["symbols"].get(code)
+    if symbol is not None and not len(symbol):
+        del ALERT_STATE["symbols"][code]
+        if ALERT_WATCH_QUOTES and ALERT_STATE["started"]:
+            quote_stream.HUB.unwatch(code)
+
+# 2. Evaluation (hot path: called from quote/bar listeners)
+def on_price(code: str, price: float, source: str = "quote"):
+    symbol = ALERT_STATE["symbols"].get(code)
+    if symbol is None or price is None or price != price:
+        return []
+    stats = ALERT_STATE["stats"]
+    t0 = time.perf_counter()
+    fired = symbol.evaluate(float(price), source)
+    stats["evaluations"] += 1
+    stats["eval_seconds"] += time.perf_counter() - t0
+    if not fired:
+        return fired
+
+    now = datetime.now(timezone.utc)
+    for alert_id in fired:
+        rule = ALERT_STATE["rules"].get(alert_id)
+        if rule is None:
+            continue
+        if not rule["repeat"]:
+            ALERT_STATE["rules"].pop(alert_id, None)
+        ALERT_STATE["outbox"].append({**rule, "price": float(price), "source": source, "triggered_at": now})
+    stats["fired"] += len(fired)
+    _drop_symbol_if_empty(code)
+    _schedule_dispatch()
+    return fired
+
+@quote_stream.HUB.add_listener
+def on_quote(symbol: str, quote: dict):
+    on_price(symbol, quote.get("price"), "quote")
+
+@price_store.add_listener
+def on_price_update(series: price_store.PriceSeries, start: int):
+    # Only the latest bar matters; history rewrites do not re-fire old crossings
+    if start >= len(series) - 1 and len(series):
+        on_price(series.symbol, series.close[-1], "bar")
+
+# 3. Delivery
+class LogSink:
+    async def deliver(self, events):
+        for e in events:
+            logger.info(f"[INFO] Alert {e['id']} ({e['user_id']}): {e['stock_code']} {e['kind']} {e['value']} hit at {e['price']}")
+
+class WebhookSink:
+    def __init__(self, url: str):
+        self.url = url
+
+    async def deliver(self, events):
+        import httpx # deferred: only webhook delivery needs it
+
+        payload = [{**e, "triggered_at": e["triggered_at"].isoformat()} for e in events]
+        async with httpx.AsyncClient(timeout=5) as client:
+            with metrics.upstream("alert_webhook", "deliver") as call:
+                call.response(await client.post(self.url, json=payload))
+
+class WebSocketSink:
+    """
+    Pushes to clients subscribed to "alerts:<user id>" on /ws/quotes.
+    """
+    async def deliver(self, events):
+        for e in events:
+            message = {"type": "alert", "data": {**e, "triggered_at": e["triggered_at"].isoformat()}}
+            topic = f"{quote_stream.EVENT_PREFIX}{e['user_id']}"
+            quote_stream.HUB.broadcast(topic, message, key=f"{topic}:{e['id']}:{e['triggered_at'].timestamp()}")
+
+class QueueSink:
+    """
+    In-process consumers (tests, other services) read events from .queue.
+    """
+    def __init__(self, maxsize: int = 10_000):
+        self.queue = asyncio.Queue(maxsize)
+
+    async def deliver(self, events):
+        for e in events:
+            if self.queue.full():
+                self.queue.get_nowait() # Drop the oldest rather than block the dispatcher
+            self.queue.put_nowait(e)
+
+def add_sink(sink):
+    ALERT_STATE["sinks"].append(sink)
+    return sink
+
+def configure_sinks(spec: str = ALERT_SINKS):
+    for name in [n.strip() for n in spec.split(",") if n.strip()]:
+        if name == "log":
+            add_sink(LogSink())
+        elif name == "websocket":
+            add_sink(WebSocketSink())
+        elif name == "webhook" and ALERT_WEBHOOK_URL:
+            add_sink(WebhookSink(ALERT_WEBHOOK_URL))
+        elif name == "queue":
+            add_sink(QueueSink())
+
+def _schedule_dispatch():
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return # No loop (scripts): events stay in the outbox
+    task = ALERT_STATE["dispatch_task"]
+    if task is None or task.done():
+        ALERT_STATE["dispatch_task"] = loop.create_task(dispatch())
+
+async def dispatch():
+    await asyncio.sleep(0) # Batch events fired in the same tick
+    while ALERT_STATE["outbox"]:
+        events, ALERT_STATE["outbox"] = ALERT_STATE["outbox"], []
+        try:
+            async with database.AsyncSessionLocal() as db:
+                await crud.mark_alerts_triggered(db, [
+                    {"id": e["id"], "price": e["price"], "triggered_at": e["triggered_at"], "deactivate": not e["repeat"]}
+                    for e in events
+                ])
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to persist {len(events)} fired alerts: {e}")
+        for sink in ALERT_STATE["sinks"]:
+            try:
+                await sink.deliver(events)
+            except Exception as e:
+                logger.error(f"[ERROR] Alert sink {type(sink).__name__} failed: {e}")
+
+# 4. Lifecycle / API helpers
+async def start():
+    """
+    Load every active rule into the index and start watching their symbols.
+    """
+    if ALERT_STATE["started"]:
+        return
+    if not ALERT_STATE["sinks"]:
+        configure_sinks()
+    try:
+        async with database.AsyncSessionLocal() as db:
+            for alert in await crud.get_active_alerts(db):
+                index_rule(alert)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to load price alerts: {e}")
+    ALERT_STATE["started"] = True
+    if ALERT_WATCH_QUOTES:
+        for code in ALERT_STATE["symbols"]:
+            quote_stream.HUB.watch(code)
+    logger.info(f"[INFO] Alert engine started with {len(ALERT_STATE['rules'])} rules on {len(ALERT_STATE['symbols'])} symbols.")
+
+async def latest_price(code: str):
+    topic = quote_stream.HUB.topics.get(code)
+    if topic is not None and topic.latest:
+        return topic.latest.get("price")
+    series = price_store.get_series(code)
+    if series is None or not len(series):
+        import stock_data_provider as data_service
+
+        await data_service.get_stock_price(code, "day", None, None)
+        series = price_store.get_series(code)
+    if series is not None and len(series):
+        closes = series.close[~np.isnan(series.close)]
+        return float(closes[-1]) if len(closes) else None
+    return None
+
+async def create_alert(db, user_id: str, alert):
+    reference = alert.reference
+    if alert.kind in (ALERT_PCT_UP, ALERT_PCT_DOWN) and not reference:
+        reference = await latest_price(alert.stock_code)
+    level = resolve_level(alert.kind, alert.value, reference)
+    db_alert = await crud.create_alert(db, user_id, alert, level, reference)
+    index_rule(db_alert)
+    return db_alert
+
+async def delete_alert(db, user_id: str, alert_id: int):
+    deleted = await crud.delete_alert(db, user_id, alert_id)
+    if deleted:
+        unindex_rule(alert_id)
+    return deleted
+
+def get_stats():
+    stats = ALERT_STATE["stats"]
+    return {
+        "rules": len(ALERT_STATE["rules"]),
+        "symbols": len(ALERT_STATE["symbols"]),
+        "evaluations": stats["evaluations"],
+        "fired": stats["fired"],
+        "avg_eval_us": round(stats["eval_seconds"] / stats["evaluations"] * 1e6, 2) if stats["evaluations"] else None,
+        "pending": len(ALERT_STATE["outbox"]),
+        "sinks": [type(s).__name__ for s in ALERT_STATE["sinks"]],
+    }
@@ -0,0 +1,254 @@
+"""
+Cross-sectional analytics for a set of symbols (usually one watchlist).
+
+Closes from the price store are inner-joined on date into one matrix, log
+returns are taken per row, and running sums (sum r, r^T r) are kept next to
+it. Correlation, covariance, betas and portfolio volatility all come from
+those sums, so when a new bar arrives only the new rows are added (and the
+rows falling out of the window subtracted) instead of recomputing the matrix.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+import price_store
+import watchlist_service
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = {"KOSPI": "KS11", "KOSDAQ": "KQ11", "SP500": "US500", "NASDAQ": "IXIC"}
+DEFAULT_WINDOW = 250 # return observations (~1 trading year)
+MIN_OBSERVATIONS = 20
+MAX_MATRICES = 64
+REBUILD_EVERY = 250 # incremental updates before a full rebuild (float drift)
+LOAD_CONCURRENCY = 4
+TRADING_DAYS = 252
+
+ANALYTICS_CACHE = OrderedDict() # (symbols, window) -> ReturnsMatrix
+
+class ReturnsMatrix:
+    """
+    Aligned closes/returns for a fixed symbol tuple (benchmark last) over a rolling window.
+    """
+    def __init__(self, symbols: tuple, window: int):
+        self.symbols = symbols
+        self.window = window
+        self.dates = np.array([], dtype="datetime64[D]")
+        self.closes = np.empty((0, len(symbols)))
+        self.returns = np.empty((0, len(symbols)))
+        self.sum = np.zeros(len(symbols))
+        self.cross = np.zeros((len(symbols), len(symbols)))
+        self.versions = {}
+        self.dirty = {} # symbol -> first changed bar index since the last sync
+        self.updates = 0
+
+    def _series(self):
+        return [price_store.get_series(s) for s in self.symbols]
+
+    def rebuild(self):
+        series = self._series()
+        valid = [s.dates[~np.isnan(s.close)] for s in series]
+        common = valid[0]
+        for dates in valid[1:]:
+            common = np.intersect1d(common, dates, assume_unique=True)
+        common = common[-(self.window + 1):]
+
+        self.dates = common
+        self.closes = np.column_stack([s.close[np.searchsorted(s.dates, common)] for s in series]) if len(common) else np.empty((0, len(series)))
+        self.returns = np.diff(np.log(self.closes), axis=0)
+        self.sum = self.returns.sum(axis=0)
+        self.cross = self.returns.T @ self.returns
+        self.versions = {s.symbol: s.version for s in series}
+        self.dirty = {}
+        self.updates = 0
+
+    def _append(self, series):
+        """
+        Only bars after the last aligned date changed: add the new common dates.
+        """
+        last = self.dates[-1]
+        new = None
+        for s in series:
+            lo = np.searchsorted(s.dates, last, side="right")
+            dates = s.dates[lo:][~np.isnan(s.close[lo:])]
+            new = dates if new is None else np.intersect1d(new, dates, assume_unique=True)
+        if new is None or not len(new):
+            return
+
+        closes = np.column_stack([s.close[np.searchsorted(s.dates, new)] for s in series])
+        returns = np.diff(np.log(np.vstack([self.closes[-1:], closes])), axis=0)
+        self.sum += returns.sum(axis=0)
+        self.cross += returns.T @ returns
+
+        self.dates = np.concatenate([self.dates, new])
+        self.closes = np.vstack([self.closes, closes])
+        self.returns = np.vstack([self.returns, returns])
+
+        drop = len(self.returns) - self.window
+        if drop > 0:
+            old = self.returns[:drop]
+            self.sum -= old.sum(axis=0)
+            self.cross -= old.T @ old
+            self.returns = self.returns[drop:]
+            self.closes = self.closes[drop:]
+            self.dates = self.dates[drop:]
+        self.updates += 1
+
+    def sync(self):
+        """
+        Bring the matrix up to date with the price store (incremental when possible).
+        """
+        series = self._series()
+        if any(s.version != self.versions.get(s.symbol) for s in series):
+            appendable = len(self.dates) > 1 and self.updates < REBUILD_EVERY and all(
+                self.dirty.get(s.symbol, len(s)) > np.searchsorted(s.dates, self.dates[-1])
+                for s in series
+            )
+            if appendable:
+                self._append(series)
+                self.versions = {s.symbol: s.version for s in series}
+                self.dirty = {}
+            else:
+                self.rebuild()
+        return self
+
+    def stats(self):
+        """
+        Annualized covariance, per-symbol volatility and correlation from the running sums.
+        """
+        n = len(self.returns)
+        mean = self.sum / n
+        cov = (self.cross - n * np.outer(mean, mean)) / (n - 1) * TRADING_DAYS
+        vol = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(vol, vol)
+        return cov, vol, corr
+
+@price_store.add_listener
+def on_price_update(series: price_store.PriceSeries, start: int):
+    for matrix in ANALYTICS_CACHE.values():
+        if series.symbol in matrix.versions:
+            matrix.dirty[series.symbol] = min(start, matrix.dirty.get(series.symbol, start))
+
+def get_matrix(symbols: tuple, window: int = DEFAULT_WINDOW):
+    key = (symbols, window)
+    matrix = ANALYTICS_CACHE.get(key)
+    metrics.cache("analytics_matrix", matrix is not None)
+    if matrix is None:
+        matrix = ANALYTICS_CACHE[key] = ReturnsMatrix(symbols, window)
+        matrix.rebuild()
+        while len(ANALYTICS_CACHE) > MAX_MATRICES:
+            ANALYTICS_CACHE.popitem(last=False)
+    else:
+        ANALYTICS_CACHE.move_to_end(key)
+        matrix.sync()
+    return matrix
+
+def resolve_benchmark(codes, benchmark: str = None):
+    """
+    Benchmark name or symbol -> store symbol; defaults to KOSPI for mostly-KRX lists, else S&P 500.
+    """
+    if benchmark:
+        return BENCHMARKS.get(benchmark.upper(), benchmark)
+    krx = sum(1 for c in codes if c.isdigit() and len(c) == 6)
+    return BENCHMARKS["KOSPI"] if krx * 2 >= len(codes) else BENCHMARKS["SP500"]
+
+async def ensure_loaded(codes):
+    """
+    Fetch daily history for symbols the price store does not have yet.
+    """
+    import stock_data_provider as data_service
+
+    semaphore = asyncio.Semaphore(LOAD_CONCURRENCY)
+
+    async def load(code):
+        async with semaphore:
+            try:
+                await data_service.get_stock_price(code, "day", None, None)
+            except Exception as e:
+                logger.error(f"[ERROR] Analytics price load failed for {code}: {e}")
+
+    missing = [c for c in codes if not len(price_store.get_series(c) or ())]
+    await asyncio.gather(*(load(c) for c in missing))
+
+def _clean(value, digits=4):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, digits)
+
+def compute(codes, benchmark: str, window: int = DEFAULT_WINDOW, weights: dict = None):
+    """
+    Correlation/covariance, betas and portfolio stats for codes already in the price store.
+    """
+    available = [c for c in dict.fromkeys(codes) if c != benchmark and len(price_store.get_series(c) or ())]
+    missing = [c for c in codes if c not in available and c != benchmark]
+    has_benchmark = len(price_store.get_series(benchmark) or ()) > 0
+    symbols = tuple(available) + ((benchmark,) if has_benchmark else ())
+
+    result = {"symbols": available, "benchmark": benchmark if has_benchmark else None, "missing": missing}
+    if not available:
+        return {**result, "error": "No price data"}
+
+    matrix = get_matrix(symbols, window)
+    n = len(matrix.returns)
+    if n < MIN_OBSERVATIONS:
+        return {**result, "observations": n, "error": "Not enough overlapping history"}
+
+    cov, vol, corr = matrix.stats()
+    k = len(available)
+
+    w = np.array([float((weights or {}).get(c, 0 if weights else 1)) for c in available])
+    w = w / w.sum() if w.sum() else np.full(k, 1.0 / k)
+    port_var = w @ cov[:k, :k] @ w
+    port_vol = np.sqrt(max(port_var, 0.0))
+
+    result.update({
+        "names": {c: price_store.get_series(c).name for c in available},
+        "start": str(matrix.dates[0]),
+        "as_of": str(matrix.dates[-1]),
+        "observations": n,
+        "volatility": {c: _clean(vol[i]) for i, c in enumerate(available)},
+        "correlation": [[_clean(x) for x in row] for row in corr[:k, :k]],
+        "covariance": [[_clean(x, 6) for x in row] for row in cov[:k, :k]],
+        "portfolio": {
+            "weights": {c: _clean(w[i]) for i, c in enumerate(available)},
+            "volatility": _clean(port_vol),
+            # > 1 means the holdings offset each other
+            "diversification_ratio": _clean((w @ vol[:k]) / port_vol) if port_vol else None,
+        },
+    })
+    if has_benchmark:
+        b = len(symbols) - 1
+        betas = cov[:k, b] / cov[b, b] if cov[b, b] else np.full(k, np.nan)
+        result["beta"] = {c: _clean(betas[i]) for i, c in enumerate(available)}
+        result["benchmark_volatility"] = _clean(vol[b])
+        result["portfolio"]["beta"] = _clean(w @ betas)
+        result["portfolio"]["benchmark_correlation"] = _clean((w @ cov[:k, b]) / (port_vol * vol[b])) if port_vol and vol[b] else None
+    return result
+
+async def analyze_symbols(codes, benchmark: str = None, window: int = DEFAULT_WINDOW, weights: dict = None):
+    codes = [c.strip() for c in codes if c and c.strip()]
+    benchmark = resolve_benchmark(codes, benchmark)
+    await ensure_loaded(codes + [benchmark])
+    return compute(codes, benchmark, window, weights)
+
+async def analyze_watchlist(db, user_id: str, watchlist: str, benchmark: str = None, window: int = DEFAULT_WINDOW,
+                            weights: dict = None):
+    entry = await watchlist_service.load_user(db, user_id)
+    wl = entry["watchlists"].get(watchlist)
+    codes = [f.stock_code for f in wl["items"]] if wl else []
+    result = await analyze_symbols(codes, benchmark, window, weights)
+    return {"watchlist": watchlist, **result}
+
+def parse_weights(spec: str):
+    """
+    "005930:0.6,000660:0.4" -> {"005930": 0.6, "000660": 0.4}
+    """
+    weights = {}
+    for part in (spec or "").split(","):
+        code, _, value = part.partition(":")
+        if code.strip() and value.strip():
+            weights[code.strip()] = float(value)
+    return weights or None
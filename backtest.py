@@ -0,0 +1,327 @@
+"""
+Vectorized backtests over the local price store.
+
+A rule turns a close (and open) column into a 0/1 target position with
+NumPy ops only; the position is taken on the next bar, costs are charged on
+every position change, and the equity curve is one cumprod. No per-bar
+Python loop, so 10 years of daily bars takes a millisecond or two.
+
+Parameter sweeps ship the raw columns to the "cpu" process pool (executors)
+once per chunk of parameter combinations.
+"""
+import inspect
+import itertools
+import logging
+
+import numpy as np
+
+import executors
+import indicators
+import price_store
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = indicators.TRADING_DAYS
+DEFAULT_FEE_BPS = 1.5       # per side (brokerage + exchange)
+DEFAULT_SLIPPAGE_BPS = 5.0  # per side
+DEFAULT_CAPITAL = 10_000_000
+SWEEP_WORKERS = executors.get("cpu").max_workers # BACKTEST_WORKERS / EXECUTOR_CPU_WORKERS
+SWEEP_PARALLEL_MIN = 32     # smaller grids run inline: process start-up would dominate
+MAX_SWEEP_COMBINATIONS = 5000
+
+class BacktestError(ValueError):
+    pass
+
+# 1. Rules: (close, open, params) -> 0/1 position decided at each bar's close
+def _sma(x, window):
+    mean, _ = indicators.rolling_mean_std(x, int(window), 0)
+    return mean
+
+def _ema(x, window):
+    return indicators.ewm(x, 2.0 / (window + 1))
+
+def _hold(enter, exit):
+    """
+    Stateful long/flat position from entry/exit events without a loop:
+    mark events, forward-fill the last one.
+    """
+    events = np.full(len(enter), np.nan)
+    events[exit] = 0.0
+    events[enter] = 1.0 # entry wins when both fire on one bar
+    idx = np.where(~np.isnan(events), np.arange(len(events)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    held = events[idx]
+    held[np.isnan(held)] = 0.0
+    return held
+
+def rule_sma_cross(close, open_, fast=20, slow=60):
+    f, s = _sma(close, fast), _sma(close, slow)
+    with np.errstate(invalid="ignore"):
+        return (f > s).astype(np.float64)
+
+def rule_ema_cross(close, open_, fast=12, slow=26):
+    with np.errstate(invalid="ignore"):
+        return (_ema(close, fast) > _ema(close, slow)).astype(np.float64)
+
+def rule_macd_cross(close, open_, fast=12, slow=26, signal=9):
+    macd = _ema(close, fast) - _ema(close, slow)
+    return (macd > _ema(macd, signal)).astype(np.float64)
+
+def rule_rsi(close, open_, window=14, lower=30, upper=70):
+    # Mean reversion: buy oversold, sell overbought
+    rsi = indicators.rsi(close, window) # same values as /indicators' rsi_14
+    with np.errstate(invalid="ignore"):
+        return _hold(rsi < lower, rsi > upper)
+
+def rule_bollinger(close, open_, window=20, k=2.0):
+    # Buy a close below the lower band, sell back at the middle band
+    mid, std = indicators.rolling_mean_std(close, int(window), 0)
+    with np.errstate(invalid="ignore"):
+        return _hold(close < mid - k * std, close > mid)
+
+def rule_breakout(close, open_, window=20, exit_window=10):
+    # Donchian: buy a new N-day high, sell a new M-day low
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    window, exit_window = int(window), int(exit_window)
+    high = np.full(len(close), np.nan)
+    low = np.full(len(close), np.nan)
+    if len(close) > window:
+        high[window:] = sliding_window_view(close[:-1], window).max(axis=1)[-(len(close) - window):]
+    if len(close) > exit_window:
+        low[exit_window:] = sliding_window_view(close[:-1], exit_window).min(axis=1)[-(len(close) - exit_window):]
+    with np.errstate(invalid="ignore"):
+        return _hold(close > high, close < low)
+
+def rule_buy_hold(close, open_):
+    return np.ones(len(close))
+
+RULES = {
+    "sma_cross": rule_sma_cross,
+    "ema_cross": rule_ema_cross,
+    "macd_cross": rule_macd_cross,
+    "rsi": rule_rsi,
+    "bollinger": rule_bollinger,
+    "breakout": rule_breakout,
+    "buy_hold": rule_buy_hold,
+}
+
+WINDOW_PARAMS = ("fast", "slow", "signal", "window", "exit_window")
+
+def check_params(rule: str, fn, params: dict):
+    """
+    Client-supplied parameters: known names, numbers, windows >= 1 and fast < slow.
+    """
+    defaults = {name: p.default for name, p in inspect.signature(fn).parameters.items()
+                if p.default is not inspect.Parameter.empty}
+    for name, value in params.items():
+        if name not in defaults:
+            raise BacktestError(f"Invalid parameters for {rule}: unknown parameter {name!r} "
+                                f"(available: {', '.join(defaults) or 'none'})")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+            raise BacktestError(f"Invalid parameters for {rule}: {name} must be a number, got {value!r}")
+        if name in WINDOW_PARAMS and value < 1:
+            raise BacktestError(f"Invalid parameters for {rule}: {name} must be >= 1, got {value!r}")
+    merged = {**defaults, **params}
+    if "fast" in merged and "slow" in merged and merged["fast"] >= merged["slow"]:
+        raise BacktestError(f"Invalid parameters for {rule}: fast ({merged['fast']}) must be < slow ({merged['slow']})")
+
+# 2. Simulation
+def simulate(close, open_, rule: str, params: dict, fee_bps: float = DEFAULT_FEE_BPS,
+             slippage_bps: float = DEFAULT_SLIPPAGE_BPS):
+    """
+    Returns (position held over each bar, net daily returns, turnover per bar).
+    A signal at close t is traded at the next open (close when opens are missing)
+    and earns from that price on.
+    """
+    fn = RULES.get(rule)
+    if fn is None:
+        raise BacktestError(f"Unknown rule: {rule} (available: {', '.join(RULES)})")
+    check_params(rule, fn, params)
+    try:
+        signal = fn(close, open_, **params)
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        raise BacktestError(f"Invalid parameters for {rule}: {e}")
+
+    n = len(close)
+    target = np.zeros(n)
+    target[1:] = signal[:-1] # decided yesterday, executed today
+    prev_close = np.concatenate([[close[0]], close[:-1]])
+    entry = np.where(np.isnan(open_), prev_close, open_)
+
+    # Split each bar at the open: overnight leg at yesterday's position, intraday leg at today's
+    held_before = np.concatenate([[0.0], target[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        overnight = np.where(prev_close > 0, entry / prev_close - 1.0, 0.0)
+        intraday = np.where(entry > 0, close / entry - 1.0, 0.0)
+    gross = (1 + held_before * overnight) * (1 + target * intraday) - 1
+
+    turnover = np.abs(np.diff(target, prepend=0.0))
+    cost = turnover * (fee_bps + slippage_bps) / 10_000
+    return target, gross - cost, turnover
+
+def statistics(returns, position, turnover, close):
+    equity = np.cumprod(1 + returns)
+    n = len(returns)
+    years = n / TRADING_DAYS
+    total = equity[-1] - 1 if n else 0.0
+    vol = returns.std(ddof=1) * np.sqrt(TRADING_DAYS) if n > 1 else 0.0
+    mean = returns.mean() * TRADING_DAYS if n else 0.0
+    downside = returns[returns < 0]
+    down_vol = np.sqrt((downside ** 2).sum() / n) * np.sqrt(TRADING_DAYS) if n else 0.0
+    peak = np.maximum.accumulate(equity)
+
+    # Round trips: from the first held bar to the first flat bar after it (its overnight leg
+    # and exit cost belong to the trade); a trade still open ends at the last bar
+    prev = np.concatenate([[0.0], position[:-1]])
+    entries = np.flatnonzero((position > 0) & (prev == 0))
+    exits = np.flatnonzero((position == 0) & (prev > 0))
+    if len(exits) < len(entries):
+        exits = np.append(exits, n - 1)
+    log_eq = np.concatenate([[0.0], np.cumsum(np.log1p(returns))])
+    trade_returns = np.expm1(log_eq[exits + 1] - log_eq[entries]) if len(entries) else np.empty(0)
+
+    return {
+        "total_return": total,
+        "cagr": equity[-1] ** (1 / years) - 1 if years > 0 and equity[-1] > 0 else None,
+        "volatility": vol,
+        "sharpe": mean / vol if vol else None,
+        "sortino": mean / down_vol if down_vol else None,
+        "max_drawdown": (equity / peak - 1).min() if n else 0.0,
+        "trades": int(len(entries)),
+        "win_rate": float((trade_returns > 0).mean()) if len(trade_returns) else None,
+        "avg_trade_return": float(trade_returns.mean()) if len(trade_returns) else None,
+        "exposure": float(position.mean()) if n else 0.0,
+        "turnover": float(turnover.sum()),
+        "buy_hold_return": close[-1] / close[0] - 1 if n else 0.0,
+    }
+
+METRICS = ("total_return", "cagr", "volatility", "sharpe", "sortino", "max_drawdown", "trades", "win_rate",
+           "avg_trade_return", "exposure", "turnover", "buy_hold_return")
+
+def _round(stats: dict):
+    return {k: (None if v is None or not np.isfinite(v) else round(float(v), 4)) if not isinstance(v, int) else v
+            for k, v in stats.items()}
+
+def _columns(series: price_store.PriceSeries, start_date: str = None, end_date: str = None):
+    sl = series.window(start_date, end_date)
+    close = series.close[sl]
+    valid = ~np.isnan(close)
+    return series.dates[sl][valid], close[valid], series.open[sl][valid]
+
+def run(series: price_store.PriceSeries, rule: str, params: dict = None, start_date: str = None, end_date: str = None,
+        fee_bps: float = DEFAULT_FEE_BPS, slippage_bps: float = DEFAULT_SLIPPAGE_BPS,
+        initial_capital: float = DEFAULT_CAPITAL, curve: bool = True):
+    dates, close, open_ = _columns(series, start_date, end_date)
+    if len(close) < 2:
+        raise BacktestError(f"Not enough price history for {series.symbol}")
+
+    position, returns, turnover = simulate(close, open_, rule, params or {}, fee_bps, slippage_bps)
+    result = {
+        "symbol": series.symbol,
+        "name": series.name,
+        "rule": rule,
+        "params": params or {},
+        "start": str(dates[0]),
+        "end": str(dates[-1]),
+        "bars": int(len(close)),
+        "stats": _round(statistics(returns, position, turnover, close)),
+    }
+    if curve:
+        equity = initial_capital * np.cumprod(1 + returns)
+        result["equity"] = [{"date": d, "equity": round(e, 2), "position": int(p)}
+                            for d, e, p in zip(dates.astype(str).tolist(), equity.tolist(), position.tolist())]
+    return result
+
+# 3. Sweeps
+def expand_grid(grid: dict):
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if len(combos) > MAX_SWEEP_COMBINATIONS:
+        raise BacktestError(f"Grid has {len(combos)} combinations (max {MAX_SWEEP_COMBINATIONS})")
+    return combos
+
+def _sweep_chunk(close, open_, rule, combos, fee_bps, slippage_bps):
+    # Runs in a worker process: plain arrays in, plain dicts out
+    out = []
+    for params in combos:
+        try:
+            position, returns, turnover = simulate(close, open_, rule, params, fee_bps, slippage_bps)
+            out.append({"params": params, "stats": _round(statistics(returns, position, turnover, close))})
+        except BacktestError as e:
+            out.append({"params": params, "error": str(e)})
+    return out
+
+async def sweep(series: price_store.PriceSeries, rule: str, grid: dict, metric: str = "sharpe", top: int = 20,
+                start_date: str = None, end_date: str = None, fee_bps: float = DEFAULT_FEE_BPS,
+                slippage_bps: float = DEFAULT_SLIPPAGE_BPS):
+    if rule not in RULES:
+        raise BacktestError(f"Unknown rule: {rule} (available: {', '.join(RULES)})")
+    if metric not in METRICS:
+        raise BacktestError(f"Unknown metric: {metric} (available: {', '.join(METRICS)})")
+    combos = expand_grid(grid)
+    _, close, open_ = _columns(series, start_date, end_date)
+    if len(close) < 2:
+        raise BacktestError(f"Not enough price history for {series.symbol}")
+
+    if len(combos) < SWEEP_PARALLEL_MIN or SWEEP_WORKERS <= 1:
+        results = _sweep_chunk(close, open_, rule, combos, fee_bps, slippage_bps)
+    else:
+        size = -(-len(combos) // (SWEEP_WORKERS * 4))
+        chunks = [combos[i:i + size] for i in range(0, len(combos), size)]
+        # All chunks or none: an overlapping sweep is refused up front instead of
+        # failing half-way while its earlier chunks keep the workers busy
+        parts = await executors.run_many(
+            "cpu", _sweep_chunk, [(close, open_, rule, chunk, fee_bps, slippage_bps) for chunk in chunks]
+        )
+        results = [r for part in parts for r in part]
+
+    ranked = [r for r in results if "stats" in r and r["stats"].get(metric) is not None]
+    # max_drawdown is negative: "best" is the largest value for every metric
+    ranked.sort(key=lambda r: r["stats"][metric], reverse=True)
+    return {
+        "symbol": series.symbol,
+        "rule": rule,
+        "metric": metric,
+        "combinations": len(combos),
+        "results": ranked[:top],
+        "errors": [r for r in results if "error" in r][:10],
+    }
+
+# 4. Entry points (load history on demand)
+async def load_series(code: str, start_date: str = None):
+    series = price_store.get_series(code)
+    if series is None or not len(series) or (start_date and series.last_date and str(series.dates[0]) > start_date):
+        import stock_data_provider as data_service
+
+        await data_service.get_stock_price(code, "day", start_date, None)
+        series = price_store.get_series(code)
+    if series is None or not len(series):
+        raise BacktestError(f"No price data for {code}")
+    return series
+
+async def run_symbols(codes, rule: str, params: dict = None, start_date: str = None, end_date: str = None,
+                      fee_bps: float = DEFAULT_FEE_BPS, slippage_bps: float = DEFAULT_SLIPPAGE_BPS,
+                      initial_capital: float = DEFAULT_CAPITAL, curve: bool = True):
+    """
+    Same rule over several symbols; failures are reported per symbol.
+    """
+    results, errors = [], {}
+    for code in codes:
+        try:
+            series = await load_series(code, start_date)
+            results.append(run(series, rule, params, start_date, end_date, fee_bps, slippage_bps, initial_capital, curve))
+        except BacktestError as e:
+            if len(codes) == 1:
+                raise
+            errors[code] = str(e)
+
+    summary = None
+    if len(results) > 1:
+        keys = ("total_return", "cagr", "sharpe", "max_drawdown", "buy_hold_return")
+        summary = {
+            f"avg_{k}": round(float(np.mean(vals)), 4) if vals else None
+            for k in keys
+            for vals in [[r["stats"][k] for r in results if r["stats"][k] is not None]]
+        }
+    return {"rule": rule, "results": results, "summary": summary, "errors": errors}
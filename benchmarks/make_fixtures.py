@@ -0,0 +1,87 @@
+"""
+(Re)generate the replay fixtures in benchmarks/fixtures/.
+
+Each file has the exact shape of the upstream response it stands in for, with
+deterministic synthetic content so the benchmarks are reproducible offline.
+A real capture saved under the same name is replayed instead; the
+hankyung list page is the recorded sample in the repo root.
+
+    python benchmarks/make_fixtures.py
+"""
+import json
+import os
+import random
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LISTINGS = 2600 # roughly the size of the real KRX master list
+SYLLABLES = ["삼성", "현대", "엘지", "에스케이", "한화", "롯데", "신한", "카카오", "네이버", "포스코",
+             "대한", "동양", "한국", "미래", "대우", "제일", "코리아", "글로벌", "바이오", "테크"]
+SUFFIXES = ["전자", "화학", "중공업", "건설", "증권", "제약", "바이오", "에너지", "홀딩스", "반도체", "물산", "생명"]
+
+def listings():
+    rnd = random.Random(7)
+    seen = set()
+    out = []
+    code = 100
+    while len(out) < LISTINGS:
+        name = rnd.choice(SYLLABLES) + rnd.choice(SUFFIXES) + (rnd.choice(["", "", "우", "2우B"]))
+        if name in seen:
+            name += str(len(out))
+        seen.add(name)
+        code += rnd.randint(1, 300)
+        out.append((name, f"{code:06d}"))
+    return out
+
+def krx_master_list():
+    # kind.krx.co.kr corpList download: an HTML table (EUC-KR) with 회사명/종목코드 among other columns
+    rows = "".join(
+        f"<tr><td>{name}</td><td>유가증권</td><td>{int(code)}</td><td>기타 제조업</td><td>제품</td>"
+        f"<td>2000-01-04</td><td>12월</td><td>홍길동</td><td>http://example.co.kr</td><td>서울특별시</td></tr>"
+        for name, code in listings()
+    )
+    header = "".join(f"<th>{h}</th>" for h in ["회사명", "시장구분", "종목코드", "업종", "주요제품", "상장일", "결산월", "대표자명", "홈페이지", "지역"])
+    return f"<table><tr>{header}</tr>{rows}</table>"
+
+def yahoo_search():
+    return {"quotes": [
+        {"symbol": "AAPL", "shortname": "Apple Inc.", "exchange": "NMS", "quoteType": "EQUITY"},
+        {"symbol": "AMZN", "shortname": "Amazon.com, Inc.", "exchange": "NMS", "quoteType": "EQUITY"},
+        {"symbol": "SPY", "shortname": "SPDR S&P 500", "exchange": "PCX", "quoteType": "ETF"},
+        {"symbol": "^GSPC", "shortname": "S&P 500", "exchange": "SNP", "quoteType": "INDEX"},
+    ], "news": []}
+
+def openai_briefing():
+    content = json.dumps({
+        "summary": "미 국채 금리 하락과 기술주 강세로 위험 선호가 회복되는 흐름입니다.",
+        "sentiment": "Bullish",
+        "key_points": ["나스닥 선물 강세", "달러 약세", "VIX 하락"],
+    }, ensure_ascii=False)
+    return {
+        "id": "chatcmpl-bench", "object": "chat.completion", "created": 1700000000, "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": 420, "completion_tokens": 90, "total_tokens": 510},
+    }
+
+def thinkpool_nuxt():
+    rnd = random.Random(11)
+    items = ",".join(f'{{issn:{100 + i},is_str:"{rnd.choice(SYLLABLES)}{rnd.choice(SUFFIXES)}",source:b}}' for i in range(60))
+    return (
+        "<html><head></head><body><div id=\"__nuxt\"></div><script>"
+        f"window.__NUXT__=(function(a,b){{return {{data:[{{issue_list:[{items}]}}]}}}}(null,\"tp\"));"
+        "</script></body></html>"
+    )
+
+def main():
+    os.makedirs(FIXTURES, exist_ok=True)
+    with open(os.path.join(FIXTURES, "krx_corp_list.html"), "wb") as f:
+        f.write(krx_master_list().encode("euc-kr"))
+    for name, payload in (("yahoo_search.json", yahoo_search()), ("openai_briefing.json", openai_briefing())):
+        with open(os.path.join(FIXTURES, name), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+    with open(os.path.join(FIXTURES, "thinkpool_nuxt.html"), "w", encoding="utf-8") as f:
+        f.write(thinkpool_nuxt())
+    print(f"Fixtures written to {FIXTURES}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Offline load benchmarks: the real app, in process, against stub upstreams.
+
+Every external service (KRX master list, data.go.kr, FDR, Yahoo, Hankyung,
+ThinkPool, OpenAI) is served from benchmarks/fixtures by stub_server, so the
+numbers measure our own parsing, caching and concurrency, not the network.
+Each scenario runs `--requests` calls through `--concurrency` workers
+against main.app (httpx.ASGITransport) and reports throughput, p50/p99 and
+the average response size on the wire (the client accepts gzip). The
+serialize_* micro-benchmarks time fast_json against FastAPI's default
+encoder on recorded price and report payloads and show their compressed sizes.
+
+    python -m benchmarks.run                 # compare with baselines.json
+    python -m benchmarks.run --save          # record new baselines
+    python -m benchmarks.run --latency-ms 30 # model upstream round trips
+
+Exits 1 when a scenario's p50, p99, throughput or bytes is more than
+--tolerance worse than its baseline. Baselines are machine-specific: re-record them when
+the hardware changes, not when the code gets slower.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.make_fixtures import listings
+from benchmarks.stub_server import FIXTURES, StubServer
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+def configure_env(stub_url: str):
+    # Must run before main (and the services it imports) read their settings
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='bench-')}/bench.db"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["DATA_GO_KR_API_KEY"] = "bench"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = f"{stub_url}/openai/v1"
+    os.environ["GEMINI_API_KEY"] = ""
+    os.environ["MCP_HTTP"] = "0"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+def point_upstreams_at(stub_url: str):
+    """
+    Redirect every upstream URL constant to the stub; swap FDR/yfinance for a CSV replay.
+    """
+    import data_providers
+    import index_service
+    import report_service
+    import stock_data_provider
+    import thinkpool_service
+
+    stock_data_provider.KRX_LIST_URL = f"{stub_url}/krx/corpList.do?method=download&searchType=13"
+    stock_data_provider.YAHOO_SEARCH_URL = f"{stub_url}/yahoo/search"
+    stock_data_provider.PUBLIC_DATA_URL = f"{stub_url}/datago/getStockPriceInfo"
+    report_service.HANKYUNG_LIST_URL = f"{stub_url}/hankyung/analysis/list"
+    thinkpool_service.THINKPOOL_URL = f"{stub_url}/thinkpool/issue"
+    for source in index_service.SOURCES:
+        if isinstance(source, index_service.YahooSparkSource):
+            source.URL = f"{stub_url}/yahoo/spark"
+
+    class ReplayFdrProvider(data_providers.FdrProvider):
+        # FinanceDataReader replaced by the same frame, served as CSV
+        def fetch(self, code, start_date=None, end_date=None):
+            import pandas as pd
+
+            query = f"start={start_date or ''}&end={end_date or ''}"
+            with data_providers.metrics.upstream("fdr", "daily_bars") as call:
+                df = pd.read_csv(f"{stub_url}/fdr/{code}.csv?{query}", parse_dates=["Date"], index_col="Date")
+                call.status = "ok" if not df.empty else "empty"
+            return data_providers.frame_to_bars(df) if not df.empty else None
+
+    data_providers.ROUTER.providers = [
+        p for p in data_providers.ROUTER.providers if p.name not in ("fdr", "yfinance")
+    ] + [ReplayFdrProvider()]
+
+class Scenario:
+    def __init__(self, name: str, paths):
+        self.name = name
+        self.paths = paths # callable(i) -> request path
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    wire_bytes = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors, wire_bytes
+        for i in counter:
+            started = time.perf_counter()
+            res = await client.get(scenario.paths(i))
+            latencies.append(time.perf_counter() - started)
+            wire_bytes += res.num_bytes_downloaded
+            if res.status_code != 200:
+                errors += 1
+
+    # First call on its own: it pays the cold path (master list download, imports)
+    started = time.perf_counter()
+    res = await client.get(scenario.paths(-1))
+    cold = time.perf_counter() - started
+    if res.status_code != 200:
+        raise RuntimeError(f"{scenario.name}: {res.status_code} {res.text[:200]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "cold_ms": round(cold * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "rps": round(requests / wall, 1),
+        "bytes": wire_bytes // max(1, requests),
+    }
+
+def percentile(sorted_values, pct: float):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+def bench_nuxt_parse(iterations: int = 200):
+    """
+    Micro-benchmark: ThinkPool __NUXT__ extraction on the recorded page (no HTTP).
+    """
+    import thinkpool_service
+
+    with open(os.path.join(FIXTURES, "thinkpool_nuxt.html"), encoding="utf-8") as f:
+        content = f.read()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        thinkpool_service._extract_nuxt_data(content)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "requests": iterations,
+        "concurrency": 1,
+        "errors": 0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "rps": round(iterations / sum(latencies), 1),
+    }
+
+def bench_serialization(payload, iterations: int = 200):
+    """
+    Micro-benchmark: fast_json.dumps vs jsonable_encoder + json.dumps on one payload,
+    with the raw, gzip and (if installed) brotli sizes of the body.
+    """
+    import compression
+    import fast_json
+
+    def timed(fn):
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            fn(payload)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return latencies
+
+    fast, stdlib = timed(fast_json.dumps), timed(fast_json.dumps_stdlib)
+    body = fast_json.dumps(payload)
+    result = {
+        "requests": iterations,
+        "concurrency": 1,
+        "errors": 0,
+        "p50_ms": round(percentile(fast, 50) * 1000, 3),
+        "p99_ms": round(percentile(fast, 99) * 1000, 3),
+        "rps": round(iterations / sum(fast), 1),
+        "stdlib_p50_ms": round(percentile(stdlib, 50) * 1000, 3),
+        "bytes": len(body),
+        "gzip_bytes": len(compression.compress(body, "gzip")),
+    }
+    if compression.brotli is not None:
+        result["br_bytes"] = len(compression.compress(body, "br"))
+    return result
+
+def scenarios():
+    codes = [code for _, code in listings()]
+    names = [name for name, _ in listings()]
+    return [
+        # Korean name prefix (KRX master list scan) plus a Yahoo search
+        Scenario("search_stock", lambda i: f"/api/search?q={names[i % len(names)][:2]}"),
+        # A different symbol per request: provider routing, data.go.kr parse, price_store merge
+        Scenario("get_stock_price", lambda i: f"/api/stock/{codes[i % len(codes)]}/price"
+                                              "?start_date=2025-10-01&end_date=2026-10-16"),
+        Scenario("reports", lambda i: "/api/reports?source=hankyung"),
+        Scenario("dashboard", lambda i: "/api/dashboard"),
+    ]
+
+async def run_all(args):
+    import httpx
+
+    import main
+
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for scenario in scenarios():
+                if args.only and scenario.name not in args.only:
+                    continue
+                results[scenario.name] = await run_scenario(client, scenario, args.requests, args.concurrency)
+            # Payloads as the handlers return them (primitive JSON), for the serializer comparison
+            code = listings()[0][1]
+            for name, path in (("serialize_price", f"/api/stock/{code}/price?start_date=2025-01-01"),
+                               ("serialize_reports", "/api/reports?source=hankyung")):
+                if not args.only or name in args.only:
+                    res = await client.get(path, headers={"Accept-Encoding": "identity"})
+                    results[name] = bench_serialization(res.json())
+    if not args.only or "nuxt_parse" in args.only:
+        results["nuxt_parse"] = bench_nuxt_parse()
+    return results
+
+def compare(results: dict, baselines: dict, tolerance: float):
+    """
+    List of regression messages (empty when everything is within tolerance).
+    """
+    failures = []
+    for name, result in results.items():
+        base = baselines.get(name)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if base.get(key) and result[key] > base[key] * (1 + tolerance):
+                failures.append(f"{name}: {key} {result[key]} > baseline {base[key]} (+{tolerance:.0%})")
+        if base.get("rps") and result["rps"] < base["rps"] / (1 + tolerance):
+            failures.append(f"{name}: rps {result['rps']} < baseline {base['rps']} (-{tolerance:.0%})")
+        if base.get("bytes") and result.get("bytes", 0) > base["bytes"] * (1 + tolerance):
+            failures.append(f"{name}: {result['bytes']} bytes > baseline {base['bytes']} (+{tolerance:.0%})")
+        if result["errors"] > base.get("errors", 0):
+            failures.append(f"{name}: {result['errors']} errors (baseline {base.get('errors', 0)})")
+    return failures
+
+def print_table(results: dict, baselines: dict):
+    print(f"{'scenario':<18}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'cold ms':>10}{'bytes':>9}{'errors':>8}   baseline p50/p99")
+    for name, r in results.items():
+        base = baselines.get(name) or {}
+        ref = f"{base.get('p50_ms', '-')}/{base.get('p99_ms', '-')}"
+        print(f"{name:<18}{r['rps']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r.get('cold_ms', '-'):>10}"
+              f"{r.get('bytes', '-'):>9}{r['errors']:>8}   {ref}")
+    for name, r in results.items():
+        if "stdlib_p50_ms" in r:
+            print(f"{name}: encode {r['p50_ms']}ms vs {r['stdlib_p50_ms']}ms default, "
+                  f"{r['bytes']} bytes raw / {r['gzip_bytes']} gzip / {r.get('br_bytes', '-')} br")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks against stub upstreams")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every stub response")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown before failing (0.5 = 50%%)")
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--save", action="store_true", help="Write results to baselines.json")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(FIXTURES, "krx_corp_list.html")):
+        from benchmarks import make_fixtures
+        make_fixtures.main()
+
+    stub = StubServer(latency_ms=args.latency_ms).start()
+    configure_env(stub.url)
+    point_upstreams_at(stub.url)
+    try:
+        results = asyncio.run(run_all(args))
+    finally:
+        stub.stop()
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+    print_table(results, baselines)
+    print(f"stub hits: {stub.hits}")
+
+    if args.save:
+        baselines.update(results)
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {BASELINES}")
+        return 0
+
+    failures = compare(results, baselines, args.tolerance)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Local stand-in for every upstream the app talks to, replaying benchmarks/fixtures.
+
+Routes (all on one port):
+    GET  /krx/corpList.do                  KRX master list (EUC-KR HTML)
+    GET  /datago/getStockPriceInfo         data.go.kr daily prices (JSON, per likeSrtnCd)
+    GET  /fdr/<code>.csv                   FDR-style OHLCV frame
+    GET  /yahoo/search                     Yahoo symbol search
+    GET  /yahoo/spark                      Yahoo spark batch (global indices)
+    GET  /hankyung/analysis/list           Hankyung consensus list page (recorded sample)
+    GET  /thinkpool/issue                  ThinkPool NUXT page
+    POST /openai/v1/chat/completions       recorded LLM response
+
+Price bars are a deterministic random walk per code, so no fixture is needed
+per symbol. latency_ms adds a fixed delay to every response to model the WAN.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(BENCH_DIR, "fixtures")
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+
+def _read(name: str, root: str = FIXTURES):
+    with open(os.path.join(root, name), "rb") as f:
+        return f.read()
+
+def random_walk(code: str, days: int = 400):
+    """
+    (dates, open, high, low, close, volume) for the last `days` weekdays.
+    """
+    seed = zlib.crc32(code.encode())
+    rnd = np.random.default_rng(seed)
+    end = datetime(2026, 10, 16)
+    dates = []
+    day = end
+    while len(dates) < days:
+        if day.weekday() < 5:
+            dates.append(day)
+        day -= timedelta(days=1)
+    dates.reverse()
+    base = 5000 + seed % 200000
+    close = np.round(base * np.exp(np.cumsum(rnd.normal(0, 0.015, days))))
+    open_ = np.round(close * (1 + rnd.normal(0, 0.004, days)))
+    high = np.maximum(open_, close) * (1 + rnd.uniform(0, 0.01, days))
+    low = np.minimum(open_, close) * (1 - rnd.uniform(0, 0.01, days))
+    volume = rnd.integers(50_000, 5_000_000, days)
+    return dates, open_, np.round(high), np.round(low), close, volume
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = "BenchStub/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        delay = self.server.latency_ms
+        if delay:
+            time.sleep(delay / 1000)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.hits[urlparse(self.path).path.split("/")[1]] += 1
+
+    def _json(self, payload):
+        self._send(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path
+        if path == "/krx/corpList.do":
+            return self._send(200, self.server.cache("krx_corp_list.html"), "application/vnd.ms-excel")
+        if path == "/datago/getStockPriceInfo":
+            return self._json(self._datago(q))
+        if path.startswith("/fdr/") and path.endswith(".csv"):
+            return self._send(200, self._fdr_csv(path[5:-4], q), "text/csv")
+        if path == "/yahoo/search":
+            return self._send(200, self.server.cache("yahoo_search.json"), "application/json")
+        if path == "/yahoo/spark":
+            return self._json(self._spark(q))
+        if path == "/hankyung/analysis/list":
+            return self._send(200, self.server.cache("hankyung_sample.html", REPO_ROOT), "text/html; charset=utf-8")
+        if path == "/thinkpool/issue":
+            return self._send(200, self.server.cache("thinkpool_nuxt.html"), "text/html; charset=utf-8")
+        self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path == "/openai/v1/chat/completions":
+            return self._send(200, self.server.cache("openai_briefing.json"), "application/json")
+        self._send(404, b"not found", "text/plain")
+
+    @staticmethod
+    def _window(dates, q, begin_key, end_key):
+        begin = q.get(begin_key, "").replace("-", "")
+        end = q.get(end_key, "").replace("-", "")
+        keys = [d.strftime("%Y%m%d") for d in dates]
+        return [i for i, k in enumerate(keys) if (not begin or k >= begin) and (not end or k <= end)]
+
+    def _datago(self, q):
+        code = q.get("likeSrtnCd", "000000")
+        dates, o, h, l, c, v = random_walk(code)
+        rows = self._window(dates, q, "beginBasDt", "endBasDt")[-int(q.get("numOfRows", 1000)):]
+        items = [{
+            "basDt": dates[i].strftime("%Y%m%d"), "srtnCd": code, "itmsNm": f"BENCH{code}",
+            "clpr": str(int(c[i])), "mkp": str(int(o[i])), "hipr": str(int(h[i])), "lopr": str(int(l[i])),
+            "trqu": str(int(v[i])),
+        } for i in reversed(rows)] # the portal returns newest first
+        return {"response": {"header": {"resultCode": "00", "resultMsg": "NORMAL SERVICE."},
+                             "body": {"numOfRows": len(items), "pageNo": 1, "totalCount": len(items),
+                                      "items": {"item": items}}}}
+
+    def _fdr_csv(self, code, q):
+        dates, o, h, l, c, v = random_walk(code)
+        rows = self._window(dates, q, "start", "end")
+        lines = ["Date,Open,High,Low,Close,Volume"]
+        lines += [f"{dates[i]:%Y-%m-%d},{o[i]:.2f},{h[i]:.2f},{l[i]:.2f},{c[i]:.2f},{int(v[i])}" for i in rows]
+        return ("\n".join(lines) + "\n").encode()
+
+    def _spark(self, q):
+        out = {}
+        for symbol in q.get("symbols", "").split(","):
+            dates, *_, c, _ = random_walk(symbol, 5)
+            seed = int(hashlib.md5(symbol.encode()).hexdigest()[:6], 16)
+            scale = (1 + seed % 500) / c[-1]
+            n = 1 if q.get("range") == "1d" else 5
+            out[symbol] = {
+                "symbol": symbol,
+                "timestamp": [int(d.timestamp()) for d in dates[-n:]],
+                "close": [round(float(x * scale), 4) for x in c[-n:]],
+            }
+        return out
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: float = 0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency_ms = latency_ms
+        self.hits = {k: 0 for k in ("krx", "datago", "fdr", "yahoo", "hankyung", "thinkpool", "openai")}
+        self._files = {}
+        self._thread = None
+
+    def cache(self, name: str, root: str = FIXTURES):
+        key = (root, name)
+        if key not in self._files:
+            self._files[key] = _read(name, root)
+        return self._files[key]
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="bench-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the benchmark fixtures")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency_ms)
+    print(f"Stub upstreams on {server.url}")
+    server.serve_forever()
@@ -0,0 +1,99 @@
+"""
+Response compression: brotli (when installed) or gzip, above COMPRESS_MIN_BYTES.
+
+CompressionMiddleware (pure ASGI) compresses complete JSON/text bodies for
+clients that send Accept-Encoding. Streaming responses (CSV export, SSE) and
+bodies that already carry a Content-Encoding pass through: http_cache sets
+its own, compressing each cached body once per encoding instead of per hit.
+"""
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import metrics
+
+try:
+    import brotli
+except ImportError: # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5")) # 11 is several times slower for a few % smaller
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+def negotiate(accept_encoding: str):
+    """
+    "br", "gzip" or None for an Accept-Encoding header (q=0 means refused).
+    """
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def record(encoding: str, raw: int, wire: int):
+    metrics.COMPRESSION_BYTES.inc((encoding, "raw"), raw)
+    metrics.COMPRESSION_BYTES.inc((encoding, "wire"), wire)
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        pending = {"start": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether it is worth compressing
+                pending["start"] = message
+                return
+            start, pending["start"] = pending["start"], None
+            if start is None:
+                return await send(message)
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            if (message.get("more_body") or "content-encoding" in headers
+                    or not compressible(headers.get("content-type", ""))):
+                await send(start)
+                return await send(message)
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                compressed = compress(body, encoding)
+                record(encoding, len(body), len(compressed))
+                body = compressed
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
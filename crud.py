@@ -1,69 +1,303 @@
-from sqlalchemy.orm import Session
-from models import Favorite, FavoriteKR, FavoriteUS
+from sqlalchemy import select, delete, update
+from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Favorite, PriceAlert, QuoteSnapshot, Watchlist, MARKETS, MARKET_KR, MARKET_US
 import schemas
 
-# Generic/Old
-def get_favorites(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Favorite).offset(skip).limit(limit).all()
+# Exchange names brokerage exports and clients put where a market goes
+MARKET_ALIASES = {
+    "KOSPI": MARKET_KR, "KOSDAQ": MARKET_KR, "KONEX": MARKET_KR, "KRX": MARKET_KR, "KOREA": MARKET_KR,
+    "코스피": MARKET_KR, "코스닥": MARKET_KR, "코넥스": MARKET_KR, "국내": MARKET_KR, "한국": MARKET_KR,
+    "NYSE": MARKET_US, "NASDAQ": MARKET_US, "AMEX": MARKET_US, "USA": MARKET_US,
+    "나스닥": MARKET_US, "뉴욕": MARKET_US, "해외": MARKET_US, "미국": MARKET_US,
+}
 
-def create_favorite(db: Session, favorite: schemas.FavoriteCreate):
-    existing = db.query(Favorite).filter(Favorite.stock_code == favorite.stock_code).first()
-    if existing:
-        return existing
-    db_favorite = Favorite(stock_code=favorite.stock_code, stock_name=favorite.stock_name)
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
-    return db_favorite
+class InvalidMarketError(ValueError):
+    pass
+
+def infer_market(stock_code: str) -> str:
+    # Same rule the price provider uses: 6-digit numeric codes are KRX listings
+    return MARKET_KR if stock_code.isdigit() and len(stock_code) == 6 else MARKET_US
+
+def resolve_market(market: str = None, stock_code: str = None) -> str:
+    """
+    One of MARKETS for a market or exchange name; inferred from stock_code when empty.
+    """
+    if not market or not str(market).strip():
+        return infer_market(stock_code)
+    name = str(market).strip().upper()
+    resolved = MARKET_ALIASES.get(name, name)
+    if resolved not in MARKETS:
+        raise InvalidMarketError(f"Unknown market {market!r} (expected {' or '.join(MARKETS)})")
+    return resolved
+
+def build_upsert(dialect_name: str, rows: list, update_columns=None, model=Favorite,
+                 conflict_columns=("watchlist_id", "market", "stock_code")):
+    """
+    Dialect-specific multi-row INSERT (favorites table by default).
+    update_columns=None ignores conflicting rows, otherwise those columns are overwritten.
+    conflict_columns is the unique key SQLite should resolve conflicts on.
+    """
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(model).values(rows)
+        if update_columns:
+            return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+        return stmt.prefix_with("IGNORE")
+
+    from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model).values(rows)
+    if update_columns:
+        return stmt.on_conflict_do_update(
+            index_elements=list(conflict_columns),
+            set_={c: stmt.excluded[c] for c in update_columns}
+        )
+    return stmt.on_conflict_do_nothing(index_elements=list(conflict_columns))
 
-def delete_favorite_by_code(db: Session, stock_code: str):
-    db_favorite = db.query(Favorite).filter(Favorite.stock_code == stock_code).first()
-    if db_favorite:
-        db.delete(db_favorite)
-        db.commit()
-        return True
-    return False
+# Watchlists
+async def get_watchlists(db: AsyncSession, user_id: str):
+    result = await db.execute(select(Watchlist).where(Watchlist.user_id == user_id).order_by(Watchlist.id))
+    return result.scalars().all()
 
-# KR
-def get_favorites_kr(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(FavoriteKR).offset(skip).limit(limit).all()
+async def get_watchlist(db: AsyncSession, user_id: str, name: str):
+    result = await db.execute(select(Watchlist).where(Watchlist.user_id == user_id, Watchlist.name == name))
+    return result.scalars().first()
 
-def create_favorite_kr(db: Session, favorite: schemas.FavoriteCreate):
-    existing = db.query(FavoriteKR).filter(FavoriteKR.stock_code == favorite.stock_code).first()
+async def get_or_create_watchlist(db: AsyncSession, user_id: str, name: str):
+    existing = await get_watchlist(db, user_id, name)
     if existing:
         return existing
-    db_favorite = FavoriteKR(stock_code=favorite.stock_code, stock_name=favorite.stock_name)
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
-    return db_favorite
 
-def delete_favorite_kr(db: Session, stock_code: str):
-    db_favorite = db.query(FavoriteKR).filter(FavoriteKR.stock_code == stock_code).first()
-    if db_favorite:
-        db.delete(db_favorite)
-        db.commit()
-        return True
-    return False
+    watchlist = Watchlist(user_id=user_id, name=name)
+    db.add(watchlist)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return await get_watchlist(db, user_id, name)
+    await db.refresh(watchlist)
+    return watchlist
+
+async def delete_watchlist(db: AsyncSession, user_id: str, name: str):
+    watchlist = await get_watchlist(db, user_id, name)
+    if not watchlist:
+        return False
+    # Explicit child delete: SQLite does not enforce ON DELETE CASCADE by default
+    await db.execute(delete(Favorite).where(Favorite.watchlist_id == watchlist.id))
+    await db.execute(delete(Watchlist).where(Watchlist.id == watchlist.id))
+    await db.commit()
+    return True
+
+async def get_user_favorites(db: AsyncSession, user_id: str):
+    """
+    Every favorite of one user across all watchlists (cache fill query).
+    """
+    result = await db.execute(select(Favorite).where(Favorite.user_id == user_id).order_by(Favorite.id))
+    return result.scalars().all()
 
-# US
-def get_favorites_us(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(FavoriteUS).offset(skip).limit(limit).all()
+# Favorites
+async def get_favorites(db: AsyncSession, watchlist_id: int, market: str = None, after_id: int = None,
+                        limit: int = 100, skip: int = 0):
+    """
+    Keyset-paginated read: pass the last id of the previous page as after_id.
+    skip is only honoured when no cursor is given (legacy offset clients).
+    """
+    query = select(Favorite).where(Favorite.watchlist_id == watchlist_id)
+    if market:
+        query = query.where(Favorite.market == market)
+    if after_id is not None:
+        query = query.where(Favorite.id > after_id)
+    elif skip:
+        query = query.offset(skip)
+    query = query.order_by(Favorite.id).limit(limit)
 
-def create_favorite_us(db: Session, favorite: schemas.FavoriteCreate):
-    existing = db.query(FavoriteUS).filter(FavoriteUS.stock_code == favorite.stock_code).first()
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def get_favorite(db: AsyncSession, watchlist_id: int, market: str, stock_code: str):
+    result = await db.execute(
+        select(Favorite).where(
+            Favorite.watchlist_id == watchlist_id,
+            Favorite.market == market,
+            Favorite.stock_code == stock_code
+        )
+    )
+    return result.scalars().first()
+
+async def create_favorite(db: AsyncSession, watchlist: Watchlist, favorite: schemas.FavoriteCreate, market: str = None):
+    market = resolve_market(market or favorite.market, favorite.stock_code)
+    existing = await get_favorite(db, watchlist.id, market, favorite.stock_code)
     if existing:
         return existing
-    db_favorite = FavoriteUS(stock_code=favorite.stock_code, stock_name=favorite.stock_name)
+
+    db_favorite = Favorite(
+        user_id=watchlist.user_id,
+        watchlist_id=watchlist.id,
+        market=market,
+        stock_code=favorite.stock_code,
+        stock_name=favorite.stock_name
+    )
     db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Lost a race against a concurrent insert of the same (market, code)
+        await db.rollback()
+        return await get_favorite(db, watchlist.id, market, favorite.stock_code)
+    await db.refresh(db_favorite)
     return db_favorite
 
-def delete_favorite_us(db: Session, stock_code: str):
-    db_favorite = db.query(FavoriteUS).filter(FavoriteUS.stock_code == stock_code).first()
-    if db_favorite:
-        db.delete(db_favorite)
-        db.commit()
-        return True
-    return False
+async def delete_favorite(db: AsyncSession, watchlist_id: int, stock_code: str, market: str = None):
+    stmt = delete(Favorite).where(Favorite.watchlist_id == watchlist_id, Favorite.stock_code == stock_code)
+    if market:
+        stmt = stmt.where(Favorite.market == market)
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount > 0
+
+# Bulk
+UPSERT_CHUNK_SIZE = 1000
+
+def normalize_favorites(favorites, market: str = None):
+    """
+    FavoriteCreate list -> insert rows, market resolved and de-duplicated (last one wins).
+    """
+    rows = {}
+    for fav in favorites:
+        m = resolve_market(fav.market or market, fav.stock_code)
+        rows[(m, fav.stock_code)] = {"market": m, "stock_code": fav.stock_code, "stock_name": fav.stock_name}
+    return list(rows.values())
+
+def _codes_by_market(keys, market: str = None):
+    grouped = defaultdict(set)
+    for key in keys:
+        m = resolve_market(key.market or market, key.stock_code)
+        grouped[m].add(key.stock_code)
+    return grouped
+
+async def bulk_update_favorites(db: AsyncSession, watchlist: Watchlist, add=(), remove=(), replace: bool = False,
+                                market: str = None):
+    """
+    Add/remove/replace many favorites of one watchlist in ONE transaction.
+    Returns (rows upserted, rows removed).
+    """
+    market = resolve_market(market) if market else None
+    rows = normalize_favorites(add, market)
+    for row in rows:
+        row["user_id"] = watchlist.user_id
+        row["watchlist_id"] = watchlist.id
+    removed = 0
+
+    try:
+        if replace:
+            keep = defaultdict(set)
+            for r in rows:
+                keep[r["market"]].add(r["stock_code"])
+            scope = [market] if market else list(MARKETS)
+            for m in scope:
+                stmt = delete(Favorite).where(Favorite.watchlist_id == watchlist.id, Favorite.market == m)
+                if keep.get(m):
+                    stmt = stmt.where(Favorite.stock_code.not_in(keep[m]))
+                removed += (await db.execute(stmt)).rowcount
+
+        for m, codes in _codes_by_market(remove, market).items():
+            stmt = delete(Favorite).where(
+                Favorite.watchlist_id == watchlist.id, Favorite.market == m, Favorite.stock_code.in_(codes)
+            )
+            removed += (await db.execute(stmt)).rowcount
+
+        dialect = db.bind.dialect.name
+        for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            await db.execute(build_upsert(dialect, rows[i:i + UPSERT_CHUNK_SIZE], update_columns=["stock_name"]))
+
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return len(rows), removed
+
+async def iter_favorites(db: AsyncSession, watchlist_id: int, market: str = None, batch_size: int = 500):
+    """
+    Stream a whole watchlist in keyset-ordered batches (constant memory).
+    """
+    after_id = None
+    while True:
+        batch = await get_favorites(db, watchlist_id, market, after_id=after_id, limit=batch_size)
+        if not batch:
+            return
+        for fav in batch:
+            yield fav
+        if len(batch) < batch_size:
+            return
+        after_id = batch[-1].id
+
+# Quote snapshots
+async def get_watchlist_snapshot(db: AsyncSession, watchlist_id: int):
+    """
+    Favorites of one watchlist LEFT JOIN their latest quote snapshot (single query).
+    """
+    query = (
+        select(Favorite, QuoteSnapshot)
+        .outerjoin(QuoteSnapshot, (QuoteSnapshot.market == Favorite.market) & (QuoteSnapshot.stock_code == Favorite.stock_code))
+        .where(Favorite.watchlist_id == watchlist_id)
+        .order_by(Favorite.id)
+    )
+    result = await db.execute(query)
+    return result.all()
+
+async def upsert_quote_snapshots(db: AsyncSession, rows: list):
+    if not rows:
+        return
+    update_columns = ["as_of", "last_close", "prev_close", "change", "pct_change", "sparkline", "updated_at"]
+    stmt = build_upsert(db.bind.dialect.name, rows, update_columns, model=QuoteSnapshot,
+                        conflict_columns=("market", "stock_code"))
+    await db.execute(stmt)
+    await db.commit()
+
+# Price alerts
+async def get_alerts(db: AsyncSession, user_id: str, active_only: bool = False):
+    query = select(PriceAlert).where(PriceAlert.user_id == user_id)
+    if active_only:
+        query = query.where(PriceAlert.active.is_(True))
+    result = await db.execute(query.order_by(PriceAlert.id))
+    return result.scalars().all()
+
+async def get_active_alerts(db: AsyncSession):
+    result = await db.execute(select(PriceAlert).where(PriceAlert.active.is_(True)))
+    return result.scalars().all()
+
+async def create_alert(db: AsyncSession, user_id: str, alert: schemas.AlertCreate, level: float, reference: float = None):
+    db_alert = PriceAlert(
+        user_id=user_id,
+        market=resolve_market(alert.market, alert.stock_code),
+        stock_code=alert.stock_code,
+        kind=alert.kind,
+        value=alert.value,
+        reference=reference,
+        level=level,
+        repeat=alert.repeat,
+        active=True,
+        note=alert.note
+    )
+    db.add(db_alert)
+    await db.commit()
+    await db.refresh(db_alert)
+    return db_alert
+
+async def delete_alert(db: AsyncSession, user_id: str, alert_id: int):
+    result = await db.execute(delete(PriceAlert).where(PriceAlert.id == alert_id, PriceAlert.user_id == user_id))
+    await db.commit()
+    return result.rowcount > 0
+
+async def mark_alerts_triggered(db: AsyncSession, events: list):
+    """
+    events: [{"id", "price", "triggered_at", "deactivate"}, ...] written in one transaction.
+    """
+    for event in events:
+        values = {"triggered_at": event["triggered_at"], "triggered_price": event["price"]}
+        if event["deactivate"]:
+            values["active"] = False
+        await db.execute(update(PriceAlert).where(PriceAlert.id == event["id"]).values(**values))
+    await db.commit()
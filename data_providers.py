@@ -0,0 +1,272 @@
+"""
+Daily price provider registry and health-based router.
+
+Each provider declares the markets and bar fields it covers. For a request
+the router takes the providers that cover it, drops the ones whose circuit
+breaker is open, and tries the rest best-first: preferred (lower priority
+value) sources first unless their latency EWMA or recent errors say
+otherwise. A provider that keeps failing is skipped without waiting out its
+timeout until its cool-down expires; then a single trial request decides
+whether it is back.
+
+New sources plug in with register(); get_stock_price does not change.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+import executors
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "8"))
+FAILURE_THRESHOLD = 3        # consecutive failures that open the circuit
+COOLDOWN_SECONDS = 30.0      # first open period; doubles while trials keep failing
+MAX_COOLDOWN_SECONDS = 600.0
+EWMA_ALPHA = 0.2
+PRIORITY_PENALTY_MS = 500.0  # latency a better-priority provider is allowed before losing its turn
+ERROR_PENALTY = 4.0          # score multiplier per unit of recent error rate
+
+ALL_FIELDS = ("open", "high", "low", "close", "volume")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class ProviderHealth:
+    def __init__(self):
+        self.state = CLOSED
+        self.latency_ms = None # EWMA of successful calls
+        self.error_rate = 0.0  # EWMA of failures (0..1)
+        self.consecutive_failures = 0
+        self.cooldown = COOLDOWN_SECONDS
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.empty = 0
+        self.last_error = None
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        # The half-open trial ended without a verdict (cancelled, or our own pool was full): allow another
+        self.trial_in_flight = False
+
+    def record_success(self, elapsed_ms: float):
+        self.calls += 1
+        self.successes += 1
+        self.latency_ms = elapsed_ms if self.latency_ms is None else (1 - EWMA_ALPHA) * self.latency_ms + EWMA_ALPHA * elapsed_ms
+        self.error_rate *= (1 - EWMA_ALPHA)
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+        self.state = CLOSED
+        self.cooldown = COOLDOWN_SECONDS
+
+    def record_empty(self, elapsed_ms: float):
+        # Reachable but nothing for this symbol: not a health problem
+        self.calls += 1
+        self.empty += 1
+        self.trial_in_flight = False
+        if self.state == HALF_OPEN:
+            self.state = CLOSED
+
+    def record_failure(self, error: str):
+        self.calls += 1
+        self.failures += 1
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA
+        self.consecutive_failures += 1
+        self.last_error = error
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN_SECONDS)
+            self._open()
+        elif self.consecutive_failures >= FAILURE_THRESHOLD:
+            self._open()
+        self.trial_in_flight = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def score(self, priority: int):
+        latency = self.latency_ms if self.latency_ms is not None else 0.0
+        return (latency + priority * PRIORITY_PENALTY_MS) * (1 + ERROR_PENALTY * self.error_rate)
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "empty": self.empty,
+            "last_error": self.last_error,
+            "retry_in": round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1) if self.state == OPEN else None,
+        }
+
+class Provider:
+    """
+    Base class: fetch() is blocking and returns bars ({"date": [...], field: [...]}
+    or a list of dicts) or None when the source has nothing for the symbol.
+    Failures raise.
+    """
+    name = "base"
+    markets = ()
+    fields = ALL_FIELDS
+    priority = 10
+    adjusted = True # bars already adjusted for splits/rights issues (see adjustments)
+
+    def available(self):
+        return True
+
+    def fetch(self, code: str, start_date: str = None, end_date: str = None):
+        raise NotImplementedError
+
+def frame_to_bars(df, date_col: str = None):
+    """
+    OHLCV DataFrame (FDR / yfinance) -> column bars for price_store.merge_bars.
+    """
+    import pandas as pd
+
+    if date_col is None:
+        df = df.reset_index()
+        date_col = "Date" if "Date" in df.columns else ("index" if "index" in df.columns else df.columns[0])
+    bars = {"date": pd.to_datetime(df[date_col]).dt.strftime("%Y-%m-%d").to_numpy()}
+    for field in ALL_FIELDS:
+        col = field.capitalize()
+        if col in df.columns:
+            values = df[col]
+            if isinstance(values, pd.DataFrame): # yfinance multi-index columns
+                values = values.iloc[:, 0]
+            bars[field] = pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64")
+    return bars
+
+def _bar_count(bars):
+    if bars is None:
+        return 0
+    return len(bars["date"]) if isinstance(bars, dict) else len(bars)
+
+class PublicDataProvider(Provider):
+    """
+    data.go.kr stock price service (KRX only, needs DATA_GO_KR_API_KEY).
+    """
+    name = "data_go_kr"
+    markets = ("KR",)
+    priority = 0
+    adjusted = False
+
+    def available(self):
+        return bool(os.getenv("DATA_GO_KR_API_KEY"))
+
+    def fetch(self, code, start_date=None, end_date=None):
+        import stock_data_provider as data_service
+
+        start_date = start_date or (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
+        end_date = end_date or datetime.now().strftime("%Y-%m-%d")
+        return data_service.fetch_public_data(code, start_date, end_date, raise_errors=True)
+
+class FdrProvider(Provider):
+    name = "fdr"
+    markets = ("KR", "US")
+    priority = 1
+
+    def fetch(self, code, start_date=None, end_date=None):
+        import FinanceDataReader as fdr
+
+        with metrics.upstream("fdr", "daily_bars") as call:
+            df = fdr.DataReader(code, start_date or "2023-01-01", end_date or datetime.now().strftime("%Y-%m-%d"))
+            call.status = "ok" if df is not None and not df.empty else "empty"
+        return frame_to_bars(df) if df is not None and not df.empty else None
+
+class YFinanceProvider(Provider):
+    name = "yfinance"
+    markets = ("KR", "US")
+    priority = 2
+
+    def fetch(self, code, start_date=None, end_date=None):
+        import yfinance as yf
+
+        symbol = f"{code}.KS" if code.isdigit() and len(code) == 6 else code
+        end = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d") if end_date else None
+        with metrics.upstream("yfinance", "daily_bars") as call:
+            df = yf.download(symbol, start=start_date or "2023-01-01", end=end, interval="1d",
+                             auto_adjust=False, progress=False, threads=False)
+            call.status = "ok" if df is not None and not df.empty else "empty"
+        return frame_to_bars(df) if df is not None and not df.empty else None
+
+class ProviderRouter:
+    def __init__(self):
+        self.providers = []
+        self.health = {}
+
+    def register(self, provider: Provider):
+        self.providers.append(provider)
+        self.health[provider.name] = ProviderHealth()
+        return provider
+
+    def candidates(self, market: str, fields=("close",)):
+        """
+        Providers covering market/fields, best first (circuit state is checked per call).
+        """
+        eligible = [
+            p for p in self.providers
+            if market in p.markets and set(fields) <= set(p.fields) and p.available()
+        ]
+        return sorted(eligible, key=lambda p: self.health[p.name].score(p.priority))
+
+    async def fetch(self, code: str, market: str, start_date: str = None, end_date: str = None, fields=("close",)):
+        """
+        Returns (bars, provider); (None, None) when every provider failed or had nothing.
+        """
+        for provider in self.candidates(market, fields):
+            health = self.health[provider.name]
+            if not health.allow():
+                continue
+            started = time.perf_counter()
+            try:
+                bars = await asyncio.wait_for(
+                    executors.run("network", provider.fetch, code, start_date, end_date), PROVIDER_TIMEOUT
+                )
+            except (executors.PoolSaturatedError, asyncio.CancelledError):
+                # Our capacity / the caller went away: says nothing about the provider's health
+                health.release_trial()
+                raise
+            except Exception as e:
+                error = metrics.error_text(e) # no URLs/API keys in stats or logs
+                health.record_failure(error)
+                logger.warning(f"[WARN] Provider {provider.name} failed for {code}: {error}")
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if not _bar_count(bars):
+                health.record_empty(elapsed_ms)
+                continue
+            health.record_success(elapsed_ms)
+            return bars, provider
+        return None, None
+
+    def stats(self):
+        return {
+            p.name: {"markets": list(p.markets), "priority": p.priority, "adjusted": p.adjusted, "available": p.available(),
+                     **self.health[p.name].to_dict()}
+            for p in self.providers
+        }
+
+ROUTER = ProviderRouter()
+ROUTER.register(PublicDataProvider())
+ROUTER.register(FdrProvider())
+ROUTER.register(YFinanceProvider())
+
+def register(provider: Provider):
+    return ROUTER.register(provider)
@@ -0,0 +1,151 @@
+"""
+Named, bounded executors per workload, instead of the loop's one default pool.
+
+    network  threads   short upstream API calls (price providers, index bars)
+    scrape   threads   slow pages and bulk downloads (reports, ThinkPool, listings)
+    cpu      processes CPU-bound parsing and backtest sweeps (no GIL contention with the loop)
+    llm      threads   OpenAI/Gemini SDK calls (blocking, seconds each)
+    browser  threads   Selenium sessions (each one drives a Chrome process)
+
+`await executors.run("network", fn, *args)` runs fn on the pool. A pool
+accepts max_workers running plus max_queue waiting calls; beyond that it
+raises PoolSaturatedError (the API answers 503) instead of letting a slow
+scrape pile up in front of price fetches. `run_many` submits a batch as one
+unit (all reserved up front, the rest cancelled on failure). Sizes come from
+EXECUTOR_<NAME>_WORKERS / EXECUTOR_<NAME>_QUEUE. Pools start on first use
+and shutdown() stops them with the app.
+
+Thread pools charge their time to the calling request (profiling.AccountingExecutor).
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+class PoolSaturatedError(RuntimeError):
+    pass
+
+def _size(name: str, setting: str, default: int):
+    return max(1, int(os.getenv(f"EXECUTOR_{name.upper()}_{setting}", str(default))))
+
+class BoundedPool:
+    def __init__(self, name: str, kind: str, workers: int, queue: int):
+        self.name = name
+        self.kind = kind # "thread" or "process"
+        self.max_workers = _size(name, "WORKERS", workers)
+        self.max_queue = _size(name, "QUEUE", queue)
+        self.executor = None
+        self.in_flight = 0 # running + queued; only touched on the loop thread
+        self.completed = 0
+        self.rejected = 0
+
+    def _executor(self):
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self.executor = profiling.AccountingExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self.executor
+
+    def _publish(self):
+        metrics.EXECUTOR_ACTIVE.set((self.name,), min(self.in_flight, self.max_workers))
+        metrics.EXECUTOR_QUEUED.set((self.name,), max(0, self.in_flight - self.max_workers))
+
+    def _reserve(self, n: int):
+        if self.in_flight + n > self.max_workers + self.max_queue:
+            self.rejected += 1
+            metrics.EXECUTOR_REJECTED.inc((self.name,))
+            raise PoolSaturatedError(f"{self.name} pool saturated ({self.in_flight} calls in flight)")
+
+    def _submit(self, loop, fn, args):
+        started = time.perf_counter()
+        future = self._executor().submit(fn, *args)
+        self.in_flight += 1
+
+        def done(_):
+            # Released when the worker finishes (or the call is cancelled before it starts),
+            # not when the caller stops waiting (wait_for timeouts)
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._finished, started)
+
+        future.add_done_callback(done)
+        return future
+
+    async def run(self, fn, *args):
+        self._reserve(1)
+        future = self._submit(asyncio.get_running_loop(), fn, args)
+        self._publish()
+        return await asyncio.wrap_future(future)
+
+    async def run_many(self, fn, calls):
+        """
+        fn(*args) for every args in calls, as one unit: capacity for all of them is
+        reserved up front (PoolSaturatedError before anything is submitted), and when
+        one fails or the caller stops waiting, the calls not started yet are cancelled.
+        """
+        calls = list(calls)
+        self._reserve(len(calls))
+        loop = asyncio.get_running_loop()
+        futures = [self._submit(loop, fn, args) for args in calls]
+        self._publish()
+        try:
+            return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _finished(self, started: float):
+        self.in_flight -= 1
+        self.completed += 1
+        self._publish()
+        metrics.EXECUTOR_SECONDS.observe((self.name,), time.perf_counter() - started)
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self.in_flight, self.max_workers),
+            "queued": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "started": self.executor is not None,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+_CPU_DEFAULT = int(os.getenv("BACKTEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+POOLS = {
+    "network": BoundedPool("network", "thread", 16, 64),
+    "scrape": BoundedPool("scrape", "thread", 4, 16),
+    "cpu": BoundedPool("cpu", "process", _CPU_DEFAULT, _CPU_DEFAULT * 4),
+    "llm": BoundedPool("llm", "thread", 8, 32),
+    "browser": BoundedPool("browser", "thread", 1, 2),
+}
+
+def get(name: str) -> BoundedPool:
+    return POOLS[name]
+
+async def run(pool: str, fn, *args):
+    return await POOLS[pool].run(fn, *args)
+
+async def run_many(pool: str, fn, calls):
+    return await POOLS[pool].run_many(fn, calls)
+
+def stats():
+    return {name: pool.stats() for name, pool in POOLS.items()}
+
+def shutdown():
+    for pool in POOLS.values():
+        pool.shutdown()
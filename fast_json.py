@@ -0,0 +1,37 @@
+"""
+JSON rendering for API responses: orjson when installed, stdlib json otherwise.
+
+Payloads that are already primitive (dicts/lists of str, numbers, None, as the
+price, report and dashboard handlers build them) and numpy values go straight
+to orjson, skipping FastAPI's jsonable_encoder walk; anything orjson rejects
+(pydantic models, Decimal, sets) is encoded by jsonable_encoder first.
+FastJSONResponse is the app's default response class; http_cache renders
+with dumps() directly.
+"""
+import json
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError: # optional: falls back to the stdlib encoder
+    orjson = None
+
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+def dumps_stdlib(data) -> bytes:
+    # What FastAPI's JSONResponse produces
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def dumps(data) -> bytes:
+    if orjson is None:
+        return dumps_stdlib(data)
+    try:
+        return orjson.dumps(data, option=ORJSON_OPTIONS)
+    except TypeError: # orjson.JSONEncodeError
+        return orjson.dumps(jsonable_encoder(data), option=ORJSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
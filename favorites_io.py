@@ -0,0 +1,115 @@
+"""
+Favorites import/export (CSV / JSON).
+
+Imports accept brokerage-style exports: header names are matched against a
+small alias table (English and Korean), extra columns are ignored.
+Exports are streamed in keyset batches so large lists never sit in memory.
+"""
+import csv
+import io
+import json
+
+import crud
+import database
+import schemas
+
+# Accepted header names -> field
+COLUMN_ALIASES = {
+    "stock_code": "stock_code", "code": "stock_code", "symbol": "stock_code", "ticker": "stock_code", "종목코드": "stock_code",
+    "stock_name": "stock_name", "name": "stock_name", "종목명": "stock_name", "회사명": "stock_name",
+    "market": "market", "시장": "market",
+}
+
+EXPORT_FIELDS = ["market", "stock_code", "stock_name", "created_at"]
+
+class ImportFormatError(ValueError):
+    pass
+
+def _to_favorite(record: dict):
+    fields = {}
+    for key, value in record.items():
+        field = COLUMN_ALIASES.get(str(key).strip().lower()) or COLUMN_ALIASES.get(str(key).strip())
+        if field and value not in (None, ""):
+            fields[field] = str(value).strip()
+
+    code = fields.get("stock_code")
+    if not code:
+        return None
+    # KRX codes lose their leading zeros in spreadsheet exports
+    if code.isdigit() and len(code) < 6:
+        code = code.zfill(6)
+    try:
+        # KOSPI / 코스닥 / NASDAQ columns become KR / US; empty is inferred from the code later
+        market = crud.resolve_market(fields["market"], code) if fields.get("market") else None
+    except crud.InvalidMarketError as e:
+        raise ImportFormatError(f"{code}: {e}")
+    return schemas.FavoriteCreate(
+        stock_code=code,
+        stock_name=fields.get("stock_name", code),
+        market=market
+    )
+
+def parse_import(body: bytes, fmt: str):
+    """
+    Parse an uploaded CSV/JSON watchlist into FavoriteCreate items.
+    """
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        try:
+            text = body.decode("cp949") # Korean brokerage exports (superset of EUC-KR)
+        except UnicodeDecodeError:
+            raise ImportFormatError("File is neither UTF-8 nor CP949/EUC-KR text")
+
+    if fmt == "json":
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"Invalid JSON: {e}")
+        if isinstance(payload, dict):
+            payload = payload.get("items") or payload.get("favorites") or []
+        if not isinstance(payload, list):
+            raise ImportFormatError("JSON import must be a list of objects")
+        records = [r if isinstance(r, dict) else {"stock_code": r} for r in payload]
+    elif fmt == "csv":
+        records = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ImportFormatError(f"Unsupported format: {fmt}")
+
+    favorites = [f for f in (_to_favorite(r) for r in records) if f]
+    if records and not favorites:
+        raise ImportFormatError("No stock code column found")
+    return favorites
+
+def _export_row(fav):
+    return {
+        "market": fav.market,
+        "stock_code": fav.stock_code,
+        "stock_name": fav.stock_name,
+        "created_at": fav.created_at.isoformat() if fav.created_at else None,
+    }
+
+async def stream_export(fmt: str, watchlist_id: int, market: str = None):
+    """
+    Async generator of CSV/JSON chunks. Opens its own session because the
+    response body is produced after the request dependencies have exited.
+    """
+    async with database.AsyncSessionLocal() as db:
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            async for fav in crud.iter_favorites(db, watchlist_id, market):
+                writer.writerow(_export_row(fav))
+                if buf.tell() > 8192:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+        else:
+            yield "["
+            first = True
+            async for fav in crud.iter_favorites(db, watchlist_id, market):
+                yield ("" if first else ",") + json.dumps(_export_row(fav), ensure_ascii=False)
+                first = False
+            yield "]"
@@ -0,0 +1,181 @@
+"""
+Conditional GETs and a rendered-response cache for the polled endpoints.
+
+`await http_cache.respond(request, "price", key, produce, version=...)`
+serves the payload of `produce()` as JSON with an ETag and the
+Cache-Control policy of its endpoint (POLICIES). Two kinds of entries:
+
+- versioned (price, indicators, screener): `version()` returns the version
+  of the data behind the payload (PriceSeries.version, universe load time),
+  or None when the handler has to go upstream. While it is known the ETag is
+  derived from it, so a matching If-None-Match is answered 304 without
+  running the handler and an unchanged payload is re-sent without re-serializing.
+- timed (reports, dashboard): the rendered body is reused for `ttl` seconds
+  and the ETag is a hash of the body.
+
+Rendered bodies live in an LRU of HTTP_CACHE_ENTRIES keys; concurrent misses
+on one key share a single render (one scrape / LLM call, not one per poller).
+Bodies are rendered with fast_json and compressed once per Accept-Encoding
+(compression.negotiate); compressed variants get their own ETag suffix.
+"""
+import asyncio
+import collections
+import hashlib
+import os
+import secrets
+import time
+
+from fastapi.responses import Response
+
+import compression
+import fast_json
+import metrics
+
+HTTP_CACHE = os.getenv("HTTP_CACHE", "1") == "1"
+HTTP_CACHE_ENTRIES = int(os.getenv("HTTP_CACHE_ENTRIES", "256"))
+
+# Version counters restart with the process; keeps their ETags from colliding across restarts
+BOOT_ID = secrets.token_hex(4)
+
+POLICIES = {
+    "price": {"max_age": 60, "ttl": 0},
+    "price_history": {"max_age": 3600, "ttl": 0}, # end_date in the past: only corporate actions change it
+    "indicators": {"max_age": 60, "ttl": 0},
+    "screener": {"max_age": 300, "ttl": 0},
+    "reports": {"max_age": 300, "ttl": 300},
+    "dashboard": {"max_age": 30, "ttl": 30},
+}
+
+# key -> {"etag", "body", "encoded": {encoding: bytes}, "version", "expires"}, least recently used first
+ENTRIES = collections.OrderedDict()
+# version ETag -> rendered body size; outlives ENTRIES so a 304 for an evicted
+# entry picks the same encoding (and ETag suffix) as a cached one
+BODY_SIZES = collections.OrderedDict()
+INFLIGHT = {} # key -> task rendering that key
+
+def render(data) -> bytes:
+    return fast_json.dumps(data)
+
+def version_etag(key: str, version) -> str:
+    return '"' + hashlib.sha1(f"{BOOT_ID}|{key}|{version!r}".encode()).hexdigest()[:24] + '"'
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:24] + '"'
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+def _base_etag(tag: str) -> str:
+    tag = tag.strip().removeprefix("W/")
+    for encoding in ("gzip", "br"):
+        if tag.endswith(f'-{encoding}"'):
+            return tag[:-len(encoding) - 2] + '"'
+    return tag
+
+def etag_matches(header: str, etag: str) -> bool:
+    # Any encoding of the same payload matches
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_base_etag(tag) == etag for tag in header.split(","))
+
+def choose_encoding(request, size: int):
+    if size < compression.COMPRESS_MIN_BYTES:
+        return None
+    return compression.negotiate(request.headers.get("accept-encoding"))
+
+def cache_control(name: str) -> str:
+    return f"public, max-age={POLICIES[name]['max_age']}"
+
+def _lookup(key: str, version):
+    entry = ENTRIES.get(key)
+    if entry is None:
+        return None
+    if entry["version"] is not None:
+        valid = version is not None and entry["version"] == version
+    else:
+        valid = entry["expires"] > time.time()
+    if not valid:
+        del ENTRIES[key]
+        return None
+    ENTRIES.move_to_end(key)
+    return entry
+
+async def _render(key: str, produce, version, ttl: float):
+    body = render(await produce())
+    current = version() if version is not None else None
+    entry = {
+        "etag": version_etag(key, current) if current is not None else body_etag(body),
+        "body": body,
+        "encoded": {},
+        "version": current,
+        "expires": time.time() + ttl,
+    }
+    if current is not None:
+        BODY_SIZES[entry["etag"]] = len(body)
+        BODY_SIZES.move_to_end(entry["etag"])
+        while len(BODY_SIZES) > HTTP_CACHE_ENTRIES * 16:
+            BODY_SIZES.popitem(last=False)
+    if current is not None or ttl:
+        ENTRIES[key] = entry
+        ENTRIES.move_to_end(key)
+        while len(ENTRIES) > HTTP_CACHE_ENTRIES:
+            ENTRIES.popitem(last=False)
+    return entry
+
+def _response(request, entry, name: str):
+    body = entry["body"]
+    encoding = choose_encoding(request, len(body))
+    headers = {"ETag": encoded_etag(entry["etag"], encoding), "Cache-Control": cache_control(name), "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        encoded = entry["encoded"].get(encoding)
+        if encoded is None:
+            encoded = entry["encoded"][encoding] = compression.compress(body, encoding)
+        compression.record(encoding, len(body), len(encoded))
+        headers["Content-Encoding"] = encoding
+        body = encoded
+    return Response(body, media_type="application/json", headers=headers)
+
+async def respond(request, name: str, key: str, produce, version=None):
+    """
+    name: POLICIES entry; key: endpoint plus every parameter that shapes the payload;
+    produce: async () -> payload; version: () -> data version or None (versioned endpoints).
+    """
+    policy = POLICIES[name]
+    if not HTTP_CACHE:
+        return _response(request, await _render(key, produce, None, 0), name)
+
+    current = version() if version is not None else None
+    entry = _lookup(key, current)
+    if entry is None and current is not None:
+        # Evicted, but the client holds this version: still no need to run the handler
+        etag = version_etag(key, current)
+        size = BODY_SIZES.get(etag)
+        if size is not None and etag_matches(request.headers.get("if-none-match"), etag):
+            metrics.cache("http_response", True)
+            encoding = choose_encoding(request, size)
+            headers = {"ETag": encoded_etag(etag, encoding), "Cache-Control": cache_control(name), "Vary": "Accept-Encoding"}
+            return Response(status_code=304, headers=headers)
+
+    metrics.cache("http_response", entry is not None)
+    if entry is None:
+        task = INFLIGHT.get(key)
+        if task is None:
+            task = asyncio.ensure_future(_render(key, produce, version, policy["ttl"]))
+            INFLIGHT[key] = task
+            task.add_done_callback(lambda _: INFLIGHT.pop(key, None))
+        # Shielded: a poller that disconnects does not cancel the render the others wait on
+        entry = await asyncio.shield(task)
+    return _response(request, entry, name)
+
+def stats():
+    return {
+        "enabled": HTTP_CACHE,
+        "entries": len(ENTRIES),
+        "max_entries": HTTP_CACHE_ENTRIES,
+        "bytes": sum(len(e["body"]) + sum(map(len, e["encoded"].values())) for e in ENTRIES.values()),
+        "rendering": len(INFLIGHT),
+    }
@@ -0,0 +1,214 @@
+"""
+Global index / macro quotes for the dashboard.
+
+Every key keeps a rolling two-bar window (previous close, latest close) in
+memory. The first fetch seeds the windows with a few days of history; later
+refreshes ask only for the latest bar and either revise it (same date) or
+roll the window (new date). Sources are plugins: Yahoo's spark endpoint
+serves every symbol in one batched request, FDR is the per-symbol fallback
+for whatever Yahoo missed, and the mock source covers keys with no free feed.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import executors
+import metrics
+
+logger = logging.getLogger(__name__)
+
+INDEX_SYMBOLS = {
+    "US_10Y": "^TNX",
+    "DXY": "DX-Y.NYB",
+    "USD_KRW": "KRW=X",
+    "VIX": "^VIX",
+    "BTC": "BTC-USD",
+    "ES_F": "ES=F",
+    "NQ_F": "NQ=F",
+    "WTI": "CL=F",
+    "NVDA": "NVDA",
+    "TSLA": "TSLA",
+    "FearGreed": "MOCK_FG",
+    "KoreanCDS": "MOCK_CDS",
+}
+
+INDEX_REFRESH_TTL = float(os.getenv("INDEX_REFRESH_TTL", "60")) # seconds a refresh is reused for
+
+INDEX_STATE = {
+    "windows": {},      # key -> deque([(date, close), ...], maxlen=2)
+    "refreshed_at": 0.0,
+    "lock": None,
+}
+
+class MockIndexSource:
+    """
+    Keys with no free real-time feed (static values until a real source is plugged in).
+    """
+    name = "mock"
+    VALUES = {
+        "MOCK_FG": (48, 45),      # CNN Fear & Greed: prev, latest
+        "MOCK_CDS": (32.0, 32.5), # Korea 5Y CDS (bp)
+    }
+
+    def handles(self, symbol: str):
+        return symbol in self.VALUES
+
+    async def fetch(self, symbols, latest_only: bool):
+        today = datetime.now().strftime("%Y-%m-%d")
+        yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        return {s: [(yesterday, self.VALUES[s][0]), (today, self.VALUES[s][1])] for s in symbols}
+
+class YahooSparkSource:
+    """
+    One request for many symbols: /v8/finance/spark returns daily closes per symbol.
+    """
+    name = "yahoo"
+    URL = "https://query1.finance.yahoo.com/v8/finance/spark"
+    BATCH_SIZE = 20 # spark's per-request symbol limit
+
+    def __init__(self):
+        self.client = None
+
+    def handles(self, symbol: str):
+        return not symbol.startswith("MOCK_")
+
+    @staticmethod
+    def _bars(payload: dict):
+        timestamps = payload.get("timestamp") or []
+        closes = payload.get("close") or []
+        if not closes and payload.get("indicators"):
+            closes = payload["indicators"]["quote"][0].get("close") or []
+        return [
+            (datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d"), float(c))
+            for ts, c in zip(timestamps, closes) if c is not None
+        ]
+
+    async def fetch(self, symbols, latest_only: bool):
+        if self.client is None:
+            import httpx # deferred: ~0.1s at import, first poll is soon enough
+
+            self.client = httpx.AsyncClient(timeout=5, headers={"User-Agent": "Mozilla/5.0"})
+        result = {}
+        for i in range(0, len(symbols), self.BATCH_SIZE):
+            batch = symbols[i:i + self.BATCH_SIZE]
+            with metrics.upstream("yahoo", "spark") as call:
+                res = call.response(await self.client.get(self.URL, params={
+                    "symbols": ",".join(batch), "range": "1d" if latest_only else "5d", "interval": "1d",
+                }))
+                res.raise_for_status()
+            data = res.json()
+            # Two response shapes are in the wild: {symbol: {...}} and {"spark": {"result": [...]}}
+            if "spark" in data:
+                items = {r["symbol"]: r["response"][0] for r in data["spark"].get("result") or [] if r.get("response")}
+            else:
+                items = data
+            for symbol in batch:
+                bars = self._bars(items.get(symbol) or {})
+                if bars:
+                    result[symbol] = bars
+        return result
+
+class FdrIndexSource:
+    """
+    Per-symbol FinanceDataReader fallback (one executor call per symbol).
+    """
+    name = "fdr"
+
+    def handles(self, symbol: str):
+        return not symbol.startswith("MOCK_")
+
+    async def fetch(self, symbols, latest_only: bool):
+        import FinanceDataReader as fdr
+
+        days = 4 if latest_only else 10
+        start = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+        def read(symbol):
+            with metrics.upstream("fdr", "index_bars"):
+                df = fdr.DataReader(symbol, start)
+            return [(idx.strftime("%Y-%m-%d"), float(c)) for idx, c in zip(df.index, df["Close"]) if c == c]
+
+        results = await asyncio.gather(*(executors.run("network", read, s) for s in symbols), return_exceptions=True)
+        out = {}
+        for symbol, bars in zip(symbols, results):
+            if isinstance(bars, Exception):
+                logger.error(f"[ERROR] FDR index fetch failed for {symbol}: {bars}")
+            elif bars:
+                out[symbol] = bars[-1:] if latest_only else bars
+        return out
+
+# Tried in order; a symbol goes to the first source that handles it and falls through on failure
+SOURCES = [MockIndexSource(), YahooSparkSource(), FdrIndexSource()]
+
+def register_source(source, first: bool = False):
+    SOURCES.insert(0, source) if first else SOURCES.append(source)
+    return source
+
+def _merge(key: str, bars):
+    """
+    Roll or revise the two-bar window with bars (oldest first).
+    """
+    window = INDEX_STATE["windows"].setdefault(key, deque(maxlen=2))
+    for date, close in bars:
+        if window and window[-1][0] == date:
+            window[-1] = (date, close)
+        elif not window or date > window[-1][0]:
+            window.append((date, close))
+
+def _quote(window):
+    value = window[-1][1]
+    prev = window[0][1] if len(window) > 1 else value
+    change = value - prev
+    return {
+        "value": float(value),
+        "prev": float(prev),
+        "change": float(change),
+        "pct_change": float(change / prev * 100) if prev else 0.0,
+    }
+
+async def refresh(keys=None):
+    """
+    Fetch latest bars for keys (all by default); unseeded keys get a short history instead.
+    """
+    keys = list(keys or INDEX_SYMBOLS)
+    windows = INDEX_STATE["windows"]
+    pending = {INDEX_SYMBOLS[k]: k for k in keys}
+
+    for source in SOURCES:
+        if not pending:
+            break
+        for latest_only in (True, False):
+            symbols = [s for s, k in pending.items() if source.handles(s) and (len(windows.get(k, ())) == 2) == latest_only]
+            if not symbols:
+                continue
+            try:
+                fetched = await source.fetch(symbols, latest_only)
+            except Exception as e:
+                logger.error(f"[ERROR] Index source {source.name} failed for {len(symbols)} symbols: {e}")
+                continue
+            for symbol, bars in fetched.items():
+                if symbol in pending:
+                    _merge(pending.pop(symbol), bars)
+
+    if pending:
+        logger.warning(f"[WARN] No index data for: {', '.join(pending.values())}")
+    INDEX_STATE["refreshed_at"] = time.time()
+
+async def get_indices():
+    """
+    {key: {"value", "prev", "change", "pct_change"}}; refreshes at most once per INDEX_REFRESH_TTL.
+    """
+    if INDEX_STATE["lock"] is None:
+        INDEX_STATE["lock"] = asyncio.Lock()
+    stale = time.time() - INDEX_STATE["refreshed_at"] >= INDEX_REFRESH_TTL
+    metrics.cache("indices", not stale)
+    if stale:
+        async with INDEX_STATE["lock"]:
+            # Concurrent callers wait for the one refresh instead of starting their own
+            if time.time() - INDEX_STATE["refreshed_at"] >= INDEX_REFRESH_TTL:
+                await refresh()
+    windows = INDEX_STATE["windows"]
+    return {key: _quote(windows[key]) for key in INDEX_SYMBOLS if windows.get(key)}
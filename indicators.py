@@ -0,0 +1,266 @@
+"""
+Technical indicator engine over the local price store.
+
+All indicators are computed with NumPy over the cached OHLCV columns.
+Recursive indicators (EMA, MACD, RSI, ATR, running max) are resumable: a
+computation can start at any bar index by seeding from the outputs stored
+for the previous bar, and rolling ones (SMA, Bollinger, volatility) only
+look back one window. A full computation is simply "resume from bar 0",
+and an appended bar costs O(window) instead of O(history).
+"""
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import price_store
+
+logger = logging.getLogger(__name__)
+
+SMA_WINDOWS = (5, 20, 60, 120)
+EMA_WINDOWS = (12, 26)
+MACD_PARAMS = (12, 26, 9)
+RSI_WINDOW = 14
+BOLLINGER_WINDOW = 20
+BOLLINGER_K = 2.0
+ATR_WINDOW = 14
+VOLATILITY_WINDOW = 20
+TRADING_DAYS = 252
+
+# Longest look-back of the rolling indicators (+1 for the previous close)
+LOOKBACK = max(max(SMA_WINDOWS), BOLLINGER_WINDOW, VOLATILITY_WINDOW + 1) + 1
+
+# Chunk length for the closed-form EMA; keeps (1 - alpha) ** -k well inside float64 range
+_EWM_BLOCK = 128
+
+INDICATOR_CACHE = {} # symbol -> IndicatorState
+
+def ewm(x: np.ndarray, alpha: float, init: float = np.nan):
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t-1], vectorized per block.
+    init is y[-1]; NaN seeds the recursion with y[0] = x[0].
+    """
+    if len(x) == 0:
+        return np.empty(0)
+    if np.isnan(init):
+        out = np.empty(len(x))
+        out[0] = x[0]
+        out[1:] = _ewm_from(x[1:], alpha, x[0])
+        return out
+    return _ewm_from(x, alpha, init)
+
+def _ewm_from(x: np.ndarray, alpha: float, prev: float):
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return x.astype(np.float64)
+    out = np.empty(len(x))
+    for lo in range(0, len(x), _EWM_BLOCK):
+        block = x[lo:lo + _EWM_BLOCK]
+        p = decay ** np.arange(len(block)) # decay^i
+        # y_i = decay^(i+1) * prev + alpha * decay^i * sum_{j<=i} x_j * decay^-j
+        y = decay * p * prev + alpha * p * np.cumsum(block / p)
+        out[lo:lo + len(block)] = y
+        prev = y[-1]
+    return out
+
+def rsi_averages(diff: np.ndarray, window: int, first: int, init_gain: float = np.nan, init_loss: float = np.nan):
+    """
+    Wilder averages of gains/losses over price changes diff; diff[:first] has
+    no change behind it (the series' first bar) and stays NaN.
+    """
+    gain = np.full(len(diff), np.nan)
+    loss = np.full(len(diff), np.nan)
+    gain[first:] = ewm(np.clip(diff[first:], 0, None), 1.0 / window, init_gain)
+    loss[first:] = ewm(np.clip(-diff[first:], 0, None), 1.0 / window, init_loss)
+    return gain, loss
+
+def rsi_from_averages(gain: np.ndarray, loss: np.ndarray):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    rsi[(gain == 0) & (loss == 0)] = 50.0
+    return rsi
+
+def rsi(close: np.ndarray, window: int = RSI_WINDOW):
+    """
+    RSI of a whole close series: the rsi_14 column of get_indicators, for any window.
+    """
+    if len(close) == 0:
+        return np.empty(0)
+    gain, loss = rsi_averages(np.diff(close, prepend=close[0]), window, 1)
+    out = rsi_from_averages(gain, loss)
+    out[:int(window)] = np.nan # Warm-up
+    return out
+
+def rolling_mean_std(x: np.ndarray, window: int, start: int):
+    """
+    Rolling mean/std for output indices [start, len(x)); earlier values come
+    only from the window that precedes start.
+    """
+    n = len(x)
+    count = n - start
+    mean = np.full(count, np.nan)
+    std = np.full(count, np.nan)
+    first_full = max(start, window - 1)
+    if first_full < n:
+        windows = sliding_window_view(x[first_full - window + 1:], window)
+        offset = first_full - start
+        mean[offset:] = windows.mean(axis=1)
+        std[offset:] = windows.std(axis=1, ddof=1)
+    return mean, std
+
+def _ffill(x: np.ndarray):
+    """
+    Forward-fill NaN gaps (leading NaNs take the first valid value).
+    """
+    mask = np.isnan(x)
+    if not mask.any() or mask.all():
+        return x
+    idx = np.where(~mask, np.arange(len(x)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    idx[:np.argmax(~mask)] = np.argmax(~mask)
+    return x[idx]
+
+class IndicatorState:
+    """
+    Output (and intermediate) arrays for one symbol, aligned with its price series.
+    """
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.length = 0
+        self.version = -1
+        self.arrays = {}
+
+    def _tail(self, key: str, start: int):
+        arr = self.arrays.get(key)
+        return arr[start - 1] if arr is not None and start > 0 else np.nan
+
+    def update(self, series: price_store.PriceSeries, start: int = 0):
+        """
+        Recompute bars[start:] only, seeding recursions from bar start-1.
+        """
+        start = min(start, self.length)
+        # Only bars[base:] are read: one rolling window before start is all the history needed
+        base = max(0, start - LOOKBACK)
+        close = _ffill(series.close[base:])
+        high = np.where(np.isnan(series.high[base:]), close, series.high[base:])
+        low = np.where(np.isnan(series.low[base:]), close, series.low[base:])
+        n = len(close)
+        rel = start - base # start, relative to the slice
+        new = {}
+        seg = close[rel:]
+
+        for w in SMA_WINDOWS:
+            new[f"sma_{w}"], _ = rolling_mean_std(close, w, rel)
+
+        fast, slow, signal = MACD_PARAMS
+        for w in sorted(set(EMA_WINDOWS) | {fast, slow}):
+            new[f"ema_{w}"] = ewm(seg, 2.0 / (w + 1), self._tail(f"ema_{w}", start))
+
+        new["macd"] = new[f"ema_{fast}"] - new[f"ema_{slow}"]
+        new["macd_signal"] = ewm(new["macd"], 2.0 / (signal + 1), self._tail("macd_signal", start))
+        new["macd_hist"] = new["macd"] - new["macd_signal"]
+
+        # RSI (Wilder smoothing of gains/losses). The first bar has no change: the
+        # averages start at bar 1, as pandas' ewm(alpha=1/n, adjust=False) over close.diff()
+        prev_close = close[rel - 1] if rel > 0 else close[0]
+        diff = np.diff(np.concatenate([[prev_close], seg]))
+        gain, loss = rsi_averages(diff, RSI_WINDOW, 1 if rel == 0 else 0,
+                                  self._tail("_avg_gain", start), self._tail("_avg_loss", start))
+        new["_avg_gain"], new["_avg_loss"] = gain, loss
+        new[f"rsi_{RSI_WINDOW}"] = rsi_from_averages(gain, loss)
+        if start < RSI_WINDOW:
+            new[f"rsi_{RSI_WINDOW}"][:RSI_WINDOW - start] = np.nan # Warm-up
+
+        # Bollinger bands
+        mid, std = rolling_mean_std(close, BOLLINGER_WINDOW, rel)
+        new["bb_mid"] = mid
+        new["bb_upper"] = mid + BOLLINGER_K * std
+        new["bb_lower"] = mid - BOLLINGER_K * std
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new["bb_pctb"] = (seg - new["bb_lower"]) / (new["bb_upper"] - new["bb_lower"])
+
+        # ATR (Wilder)
+        prev_closes = np.concatenate([[prev_close], seg[:-1]])
+        true_range = np.maximum.reduce([
+            high[rel:] - low[rel:],
+            np.abs(high[rel:] - prev_closes),
+            np.abs(low[rel:] - prev_closes),
+        ])
+        new[f"atr_{ATR_WINDOW}"] = ewm(true_range, 1.0 / ATR_WINDOW, self._tail(f"atr_{ATR_WINDOW}", start))
+
+        # Annualized volatility of daily log returns
+        log_ret = np.full(n, np.nan)
+        log_ret[1:] = np.log(close[1:] / close[:-1])
+        lo = max(rel, 1)
+        _, vol = rolling_mean_std(log_ret[1:], VOLATILITY_WINDOW, lo - 1)
+        vol_seg = np.full(n - rel, np.nan)
+        vol_seg[lo - rel:] = vol * np.sqrt(TRADING_DAYS)
+        new[f"volatility_{VOLATILITY_WINDOW}"] = vol_seg
+
+        # Drawdown from the running peak
+        peak_seed = self._tail("_peak", start)
+        peak = np.maximum.accumulate(seg)
+        if not np.isnan(peak_seed):
+            peak = np.maximum(peak, peak_seed)
+        new["_peak"] = peak
+        new["drawdown"] = seg / peak - 1.0
+        mdd_seed = self._tail("max_drawdown", start)
+        mdd = np.minimum.accumulate(new["drawdown"])
+        new["max_drawdown"] = mdd if np.isnan(mdd_seed) else np.minimum(mdd, mdd_seed)
+
+        for key, values in new.items():
+            kept = self.arrays[key][:start] if key in self.arrays and start > 0 else np.empty(0)
+            self.arrays[key] = np.concatenate([kept, values])
+
+        self.length = len(series)
+        self.version = series.version
+        return self
+
+    def latest(self):
+        return {k: _clean(v[-1]) for k, v in self.arrays.items() if not k.startswith("_") and len(v)}
+
+    def tail(self, points: int):
+        return {k: [_clean(x) for x in v[-points:].tolist()] for k, v in self.arrays.items() if not k.startswith("_")}
+
+def _clean(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, 4)
+
+def get_state(symbol: str):
+    """
+    Indicator state for a symbol already in the price store (computed on first use).
+    """
+    series = price_store.get_series(symbol)
+    if series is None or not len(series):
+        return None
+    state = INDICATOR_CACHE.get(symbol)
+    if state is None:
+        state = INDICATOR_CACHE[symbol] = IndicatorState(symbol).update(series, 0)
+    elif state.version != series.version:
+        # Missed an update (e.g. listener error): recompute from scratch
+        state.update(series, 0)
+    return state
+
+@price_store.add_listener
+def on_price_update(series: price_store.PriceSeries, start: int):
+    # Only symbols someone asked for are tracked; others are computed lazily in get_state()
+    state = INDICATOR_CACHE.get(series.symbol)
+    if state is not None:
+        state.update(series, start)
+
+def summarize(symbol: str, points: int = 0):
+    state = get_state(symbol)
+    if state is None:
+        return None
+    series = price_store.get_series(symbol)
+    result = {
+        "symbol": symbol,
+        "name": series.name,
+        "as_of": series.last_date,
+        "close": _clean(series.close[-1]),
+        "latest": state.latest(),
+    }
+    if points:
+        result["dates"] = series.dates[-points:].astype(str).tolist()
+        result["series"] = state.tail(points)
+    return result
@@ -0,0 +1,147 @@
+"""
+Event-loop lag and blocking-call detector.
+
+A heartbeat callback on the loop re-arms itself every LOOP_LAG_INTERVAL_MS
+and records how late it ran (event_loop_lag_seconds). A watcher thread
+checks the heartbeat; once the loop has been stuck for longer than
+LOOP_BLOCK_THRESHOLD_MS it samples the loop thread's stack until the loop
+moves again. Each stall is charged to the endpoint whose task held the loop
+(profiling.route_of) and to the innermost frame of our own code in the most
+common sample, e.g. stock_data_provider.py:load_krx_data.
+
+Offenders are aggregated per (route, frame) for /api/admin/loop and counted
+in /metrics (event_loop_blocks_total, event_loop_blocked_seconds_total).
+"""
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+import metrics
+import profiling
+
+logger = logging.getLogger(__name__)
+
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "1") == "1"
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+RECENT_BLOCKS = 50
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WATCHDOG_STATE = {
+    "loop": None,
+    "loop_thread": None,
+    "handle": None,   # heartbeat TimerHandle
+    "thread": None,
+    "stop": None,
+    "beat": 0.0,      # monotonic time of the last heartbeat
+    "episode": None,  # stall in progress (filled by the watcher thread)
+    "max_lag": 0.0,
+}
+
+# (route, frame) -> {"count", "total_s", "max_s", "last_at", "stack"}
+OFFENDERS = {}
+RECENT = collections.deque(maxlen=RECENT_BLOCKS)
+
+def _beat():
+    state = WATCHDOG_STATE
+    now = time.monotonic()
+    lag = max(0.0, now - state["beat"] - LOOP_LAG_INTERVAL_MS / 1000)
+    state["beat"] = now
+    state["max_lag"] = max(state["max_lag"], lag)
+    metrics.LOOP_LAG_SECONDS.observe((), lag)
+    episode, state["episode"] = state["episode"], None
+    if episode is not None and lag * 1000 >= LOOP_BLOCK_THRESHOLD_MS:
+        _record(episode, lag)
+    state["handle"] = state["loop"].call_later(LOOP_LAG_INTERVAL_MS / 1000, _beat)
+
+def _app_frame(stack):
+    # Innermost frame in our own modules: the blocking call site, not the library doing the I/O
+    for filename, label in reversed(stack):
+        if filename.startswith(APP_DIR) and "site-packages" not in filename and not filename.endswith("profiling.py"):
+            return label
+    return stack[-1][1] if stack else "?"
+
+def _sample(episode):
+    frame = sys._current_frames().get(WATCHDOG_STATE["loop_thread"])
+    stack = []
+    while frame is not None:
+        stack.append((frame.f_code.co_filename, profiling.frame_label(frame.f_code)))
+        frame = frame.f_back
+    stack.reverse()
+    episode["samples"][tuple(stack)] += 1
+
+def _record(episode, lag: float):
+    stack = list(episode["samples"].most_common(1)[0][0]) if episode["samples"] else []
+    route = episode["route"] or "background"
+    frame = _app_frame(stack)
+    entry = OFFENDERS.setdefault((route, frame), {"count": 0, "total_s": 0.0, "max_s": 0.0, "last_at": 0.0, "stack": ""})
+    entry["count"] += 1
+    entry["total_s"] += lag
+    entry["max_s"] = max(entry["max_s"], lag)
+    entry["last_at"] = time.time()
+    entry["stack"] = ";".join(label for _, label in stack)
+    RECENT.append({"at": entry["last_at"], "route": route, "frame": frame, "ms": round(lag * 1000, 1), "task": episode["task"]})
+    metrics.LOOP_BLOCKS.inc((route,))
+    metrics.LOOP_BLOCKED_SECONDS.inc((route,), lag)
+    logger.warning(f"[WARN] Event loop blocked {lag * 1000:.0f}ms in {frame} ({route})")
+
+def _watch(stop: threading.Event):
+    threshold = LOOP_BLOCK_THRESHOLD_MS / 1000
+    check = min(threshold / 4, LOOP_LAG_INTERVAL_MS / 1000)
+    loop = WATCHDOG_STATE["loop"]
+    while not stop.wait(check):
+        stalled = time.monotonic() - WATCHDOG_STATE["beat"] - LOOP_LAG_INTERVAL_MS / 1000
+        if stalled < threshold:
+            continue
+        episode = WATCHDOG_STATE["episode"]
+        if episode is None:
+            task = asyncio.current_task(loop)
+            episode = {
+                "route": profiling.route_of(task),
+                "task": task.get_name() if task is not None else None,
+                "samples": collections.Counter(),
+            }
+            WATCHDOG_STATE["episode"] = episode
+        _sample(episode)
+
+def start(loop):
+    """
+    Called from the app's lifespan, on the loop thread.
+    """
+    if not LOOP_WATCHDOG or WATCHDOG_STATE["thread"] is not None:
+        return
+    WATCHDOG_STATE.update(loop=loop, loop_thread=threading.get_ident(), beat=time.monotonic(), episode=None)
+    WATCHDOG_STATE["handle"] = loop.call_later(LOOP_LAG_INTERVAL_MS / 1000, _beat)
+    stop = threading.Event()
+    thread = threading.Thread(target=_watch, args=(stop,), name="loop-watchdog", daemon=True)
+    WATCHDOG_STATE.update(thread=thread, stop=stop)
+    thread.start()
+
+def stop():
+    if WATCHDOG_STATE["thread"] is None:
+        return
+    WATCHDOG_STATE["stop"].set()
+    WATCHDOG_STATE["thread"].join(timeout=1)
+    if WATCHDOG_STATE["handle"] is not None:
+        WATCHDOG_STATE["handle"].cancel()
+    WATCHDOG_STATE.update(thread=None, stop=None, handle=None)
+
+def report(top: int = 20):
+    offenders = sorted(OFFENDERS.items(), key=lambda kv: kv[1]["total_s"], reverse=True)[:top]
+    return {
+        "enabled": WATCHDOG_STATE["thread"] is not None,
+        "interval_ms": LOOP_LAG_INTERVAL_MS,
+        "threshold_ms": LOOP_BLOCK_THRESHOLD_MS,
+        "max_lag_ms": round(WATCHDOG_STATE["max_lag"] * 1000, 1),
+        "offenders": [{
+            "route": route, "frame": frame, "count": e["count"],
+            "total_ms": round(e["total_s"] * 1000, 1), "max_ms": round(e["max_s"] * 1000, 1),
+            "last_at": e["last_at"], "stack": e["stack"],
+        } for (route, frame), e in offenders],
+        "recent": list(reversed(RECENT)),
+    }
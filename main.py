@@ -1,33 +1,104 @@
-from fastapi import FastAPI, Depends, HTTPException, Body
+import time
+import startup_report
+_imports_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, Body, Header, Request, Response, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
-import uvicorn
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from datetime import datetime
+import asyncio
 import os
 from dotenv import load_dotenv
 import crud, models, schemas, database
+import favorites_io
+import watchlist_service
+import snapshot_service
+import price_features
+import screener
+import analytics
+import backtest
+import quote_stream
+import alerts
+import data_providers
+import adjustments
 
 # IMPORT NEW PROVIDER EXPLICITLY
 import stock_data_provider as data_service
 import ai_service
 import report_service
 import thinkpool_service
+import mcp_http
+import metrics
+import profiling
+import loop_watchdog
+import executors
+import http_cache
+import fast_json
+import compression
 
 load_dotenv()
 
-try:
-    models.Base.metadata.create_all(bind=database.engine)
-except Exception as e:
-    print(f"Warning: Database connection failed during startup. DB features will be unavailable. Error: {e}")
+startup_report.mark("main_imports", _imports_started)
+
+DB_INIT_TIMEOUT = float(os.getenv("DB_INIT_TIMEOUT", "10"))
+
+async def init_background():
+    """
+    Startup work that may wait on the network (DB): runs after the server is up.
+    """
+    with startup_report.phase("db_init"):
+        try:
+            await asyncio.wait_for(database.create_tables(models.Base.metadata), DB_INIT_TIMEOUT)
+        except Exception as e:
+            print(f"Warning: Database connection failed during startup. DB features will be unavailable. Error: {e!r}")
+    with startup_report.phase("alerts_start"):
+        await alerts.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    profiling.install(asyncio.get_running_loop())
+    loop_watchdog.start(asyncio.get_running_loop())
+    init_task = asyncio.get_running_loop().create_task(init_background())
+    yield
+    init_task.cancel()
+    loop_watchdog.stop()
+    await mcp_http.shutdown()
+    # Release pooled DB connections on shutdown/reload
+    await database.async_engine.dispose()
+    executors.shutdown()
+    await quote_stream.HUB.shutdown()
+
+app = FastAPI(title="Stock Search AI (NEW SERVER)", description="Stock Search with AI Analysis", lifespan=lifespan,
+              default_response_class=fast_json.FastJSONResponse)
 
-app = FastAPI(title="Stock Search AI (NEW SERVER)", description="Stock Search with AI Analysis")
+# MCP over HTTP in this process (agents share its warm caches); loaded on the first agent request.
+# MCP_HTTP=0 disables it.
+if os.getenv("MCP_HTTP", "1") == "1" and mcp_http.available():
+    mcp_http.mount(app, "/mcp")
 
 # CORS Setup
 origins = [
     "*", # Allow all origins for local network sharing
 ]
 
+@app.exception_handler(executors.PoolSaturatedError)
+async def pool_saturated(request: Request, exc: executors.PoolSaturatedError):
+    # A workload's executor is full: shed load rather than queue without bound
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(crud.InvalidMarketError)
+async def invalid_market(request: Request, exc: crud.InvalidMarketError):
+    # Raised wherever a favorite/alert market is resolved (single add, bulk, import)
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -40,67 +111,173 @@ app.add_middleware(
 def read_root():
     return {"message": "Welcome to Stock Search AI API (Verified New Server)"}
 
+@app.get("/metrics")
+def prometheus_metrics():
+    # Request latency per route, upstream latency/status/bytes, cache hit/miss (Prometheus text format)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
 # Database Dependency
-def get_db():
-    db = database.SessionLocal()
+get_db = database.get_async_db
+
+# Current user
+# There is no login yet: the caller (frontend or an auth proxy) names the user
+# in X-User-Id. Without it everything falls back to the shared household user.
+def get_user_id(x_user_id: Optional[str] = Header(None)) -> str:
+    user_id = (x_user_id or "").strip()[:64]
+    return user_id or models.DEFAULT_USER_ID
+
+# Admin endpoints need X-Admin-Token matching ADMIN_TOKEN (disabled when it is unset)
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+# Watchlists
+@app.get("/api/watchlists", response_model=List[schemas.Watchlist])
+async def read_watchlists(include_items: bool = True, user_id: str = Depends(get_user_id),
+                          db: AsyncSession = Depends(get_db)):
+    # Dashboard load path: served from the per-user cache after the first call
+    return await watchlist_service.list_watchlists(db, user_id, include_items)
+
+@app.post("/api/watchlists", response_model=schemas.Watchlist)
+async def create_watchlist(request: schemas.WatchlistCreate, user_id: str = Depends(get_user_id),
+                           db: AsyncSession = Depends(get_db)):
+    watchlist = await watchlist_service.create_watchlist(db, user_id, request.name)
+    return {"id": watchlist.id, "name": watchlist.name, "created_at": watchlist.created_at}
+
+@app.delete("/api/watchlists/{name}")
+async def delete_watchlist(name: str, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    success = await watchlist_service.delete_watchlist(db, user_id, name)
+    if not success:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    return {"status": "success"}
+
+@app.get("/api/watchlist/snapshot")
+async def read_watchlist_snapshot(watchlist: str = models.DEFAULT_WATCHLIST, user_id: str = Depends(get_user_id),
+                                  db: AsyncSession = Depends(get_db)):
+    # Favorites + last close/change/sparkline in one query; symbols without data yet are listed in "pending"
+    return await snapshot_service.get_watchlist_snapshot(db, user_id, watchlist)
+
+@app.get("/api/watchlist/analytics")
+async def read_watchlist_analytics(watchlist: str = models.DEFAULT_WATCHLIST, benchmark: Optional[str] = None,
+                                   window: int = analytics.DEFAULT_WINDOW, weights: Optional[str] = None,
+                                   user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    # Correlation/covariance, beta vs benchmark (KOSPI, KOSDAQ, SP500, NASDAQ or a symbol) and portfolio volatility
     try:
-        yield db
-    finally:
-        db.close()
+        parsed_weights = analytics.parse_weights(weights)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="weights must look like '005930:0.6,000660:0.4'")
+    return await analytics.analyze_watchlist(db, user_id, watchlist, benchmark, window, parsed_weights)
 
 # Favorites Endpoints
-# Favorites Endpoints
+def set_next_cursor(response: Response, rows, limit: int):
+    # Full page -> there may be more rows; clients pass this back as after_id
+    if rows and len(rows) == limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+
+async def read_favorites_page(response: Response, user_id: str, db: AsyncSession, watchlist: str, market: Optional[str],
+                              after_id: Optional[int], skip: int, limit: int):
+    rows = await watchlist_service.list_favorites(db, user_id, watchlist, market, after_id=after_id, limit=limit, skip=skip)
+    set_next_cursor(response, rows, limit)
+    return rows
+
+async def remove_favorite_or_404(user_id: str, db: AsyncSession, stock_code: str, watchlist: str, market: Optional[str]):
+    success = await watchlist_service.remove_favorite(db, user_id, stock_code, watchlist, market)
+    if not success:
+        raise HTTPException(status_code=404, detail="Favorite not found")
+    return {"status": "success"}
+
+@app.get("/api/favorites", response_model=List[schemas.Favorite])
+async def read_favorites_all(response: Response, watchlist: str = models.DEFAULT_WATCHLIST, market: Optional[str] = None,
+                             after_id: Optional[int] = None, skip: int = 0, limit: int = 100,
+                             user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await read_favorites_page(response, user_id, db, watchlist, market, after_id, skip, limit)
+
+@app.post("/api/favorites", response_model=schemas.Favorite)
+async def add_favorite(favorite: schemas.FavoriteCreate, watchlist: str = models.DEFAULT_WATCHLIST,
+                       user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await watchlist_service.add_favorite(db, user_id, favorite, watchlist)
+
+# Bulk (one transaction per request)
+@app.post("/api/favorites/bulk", response_model=schemas.FavoriteBulkResult)
+async def bulk_favorites(request: schemas.FavoriteBulkRequest, watchlist: str = models.DEFAULT_WATCHLIST,
+                         user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    upserted, removed = await watchlist_service.bulk_update(
+        db, user_id, watchlist, request.add, request.remove, request.replace, request.market
+    )
+    return {"upserted": upserted, "removed": removed}
+
+@app.post("/api/favorites/import", response_model=schemas.FavoriteBulkResult)
+async def import_favorites(request: Request, format: Optional[str] = None, mode: Literal["merge", "replace"] = "merge",
+                           market: Optional[str] = None, watchlist: str = models.DEFAULT_WATCHLIST,
+                           user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    fmt = format or ("json" if "json" in request.headers.get("content-type", "") else "csv")
+    try:
+        favorites = favorites_io.parse_import(await request.body(), fmt)
+    except favorites_io.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upserted, removed = await watchlist_service.bulk_update(
+        db, user_id, watchlist, add=favorites, replace=(mode == "replace"), market=market
+    )
+    return {"upserted": upserted, "removed": removed}
+
+@app.get("/api/favorites/export")
+async def export_favorites(format: str = "csv", market: Optional[str] = None, watchlist: str = models.DEFAULT_WATCHLIST,
+                           user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    if format not in ("csv", "json"):
+        raise HTTPException(status_code=400, detail="format must be csv or json")
+    watchlist_id = await watchlist_service.get_watchlist_id(db, user_id, watchlist)
+    if watchlist_id is None:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/json"
+    return StreamingResponse(
+        favorites_io.stream_export(format, watchlist_id, market.upper() if market else None),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=favorites.{format}"}
+    )
+
 # KR
 @app.post("/api/favorites/kr", response_model=schemas.Favorite)
-def add_favorite_kr(favorite: schemas.FavoriteCreate, db: Session = Depends(get_db)):
-    return crud.create_favorite_kr(db=db, favorite=favorite)
+async def add_favorite_kr(favorite: schemas.FavoriteCreate, watchlist: str = models.DEFAULT_WATCHLIST,
+                          user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await watchlist_service.add_favorite(db, user_id, favorite, watchlist, models.MARKET_KR)
 
 @app.get("/api/favorites/kr", response_model=List[schemas.Favorite])
-def read_favorites_kr(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_favorites_kr(db, skip=skip, limit=limit)
+async def read_favorites_kr(response: Response, watchlist: str = models.DEFAULT_WATCHLIST, after_id: Optional[int] = None,
+                            skip: int = 0, limit: int = 100,
+                            user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await read_favorites_page(response, user_id, db, watchlist, models.MARKET_KR, after_id, skip, limit)
 
 @app.delete("/api/favorites/kr/{stock_code}")
-def delete_favorite_kr(stock_code: str, db: Session = Depends(get_db)):
-    success = crud.delete_favorite_kr(db, stock_code=stock_code)
-    if not success:
-        raise HTTPException(status_code=404, detail="Favorite not found")
-    return {"status": "success"}
+async def delete_favorite_kr(stock_code: str, watchlist: str = models.DEFAULT_WATCHLIST,
+                             user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await remove_favorite_or_404(user_id, db, stock_code, watchlist, models.MARKET_KR)
 
 # US
 @app.post("/api/favorites/us", response_model=schemas.Favorite)
-def add_favorite_us(favorite: schemas.FavoriteCreate, db: Session = Depends(get_db)):
-    return crud.create_favorite_us(db=db, favorite=favorite)
+async def add_favorite_us(favorite: schemas.FavoriteCreate, watchlist: str = models.DEFAULT_WATCHLIST,
+                          user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await watchlist_service.add_favorite(db, user_id, favorite, watchlist, models.MARKET_US)
 
 @app.get("/api/favorites/us", response_model=List[schemas.Favorite])
-def read_favorites_us(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_favorites_us(db, skip=skip, limit=limit)
+async def read_favorites_us(response: Response, watchlist: str = models.DEFAULT_WATCHLIST, after_id: Optional[int] = None,
+                            skip: int = 0, limit: int = 100,
+                            user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await read_favorites_page(response, user_id, db, watchlist, models.MARKET_US, after_id, skip, limit)
 
 @app.delete("/api/favorites/us/{stock_code}")
-def delete_favorite_us(stock_code: str, db: Session = Depends(get_db)):
-    success = crud.delete_favorite_us(db, stock_code=stock_code)
-    if not success:
-        raise HTTPException(status_code=404, detail="Favorite not found")
-    return {"status": "success"}
+async def delete_favorite_us(stock_code: str, watchlist: str = models.DEFAULT_WATCHLIST,
+                             user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await remove_favorite_or_404(user_id, db, stock_code, watchlist, models.MARKET_US)
 
 # Legacy support
-@app.get("/api/favorites", response_model=List[schemas.Favorite])
-def read_favorites_all(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    kr = crud.get_favorites_kr(db, skip, limit)
-    us = crud.get_favorites_us(db, skip, limit)
-    return kr + us
-
 @app.delete("/api/favorites/code/{stock_code}")
-def delete_favorite_by_code(stock_code: str, db: Session = Depends(get_db)):
-    success = crud.delete_favorite_kr(db, stock_code)
-    if not success:
-        success = crud.delete_favorite_us(db, stock_code)
-    if not success:
-        raise HTTPException(status_code=404, detail="Favorite not found")
-    return {"status": "success"}
+async def delete_favorite_by_code(stock_code: str, watchlist: str = models.DEFAULT_WATCHLIST,
+                                  user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await remove_favorite_or_404(user_id, db, stock_code, watchlist, None)
 
 # Stock & AI Endpoints
 class AnalysisRequest(BaseModel):
@@ -112,13 +289,145 @@ class ChatRequest(BaseModel):
     history: List[dict] = []
     context: dict = {}
 
+class BacktestRequest(BaseModel):
+    stock_code: Optional[str] = None
+    watchlist: Optional[str] = None # run over every favorite of this watchlist instead
+    rule: str = "sma_cross"
+    params: dict = {}
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    fee_bps: float = backtest.DEFAULT_FEE_BPS
+    slippage_bps: float = backtest.DEFAULT_SLIPPAGE_BPS
+    initial_capital: float = backtest.DEFAULT_CAPITAL
+    curve: bool = True
+
+class BacktestSweepRequest(BaseModel):
+    stock_code: str
+    rule: str = "sma_cross"
+    grid: Dict[str, List[float]]
+    metric: str = "sharpe"
+    top: int = 20
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    fee_bps: float = backtest.DEFAULT_FEE_BPS
+    slippage_bps: float = backtest.DEFAULT_SLIPPAGE_BPS
+
 @app.get("/api/search")
 async def search_stocks(q: str):
     return await data_service.search_stock(q)
 
+@app.get("/api/screener")
+async def screen_market(request: Request, filter: Optional[str] = None, sort: Optional[str] = None, limit: int = 50,
+                        offset: int = 0, fields: Optional[str] = None):
+    # e.g. filter="pbr < 1 and market == 'KOSPI'", sort="momentum_20d desc", fields="code,name,pbr"
+    async def produce():
+        try:
+            return await screener.screen(filter, sort, limit, offset, fields.split(",") if fields else None)
+        except screener.ScreenerError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except screener.UniverseUnavailableError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    key = f"screener:{filter}:{sort}:{limit}:{offset}:{fields}"
+    return await http_cache.respond(request, "screener", key, produce, version=screener.universe_version)
+
+@app.get("/api/screener/fields")
+async def screener_fields():
+    return {"fields": screener.list_fields()}
+
 @app.get("/api/stock/{code}/price")
-async def get_price(code: str, timeframe: str = "day", start_date: str = None, end_date: str = None):
-    return await data_service.get_stock_price(code, timeframe, start_date, end_date)
+async def get_price(request: Request, code: str, timeframe: str = "day", start_date: str = None, end_date: str = None,
+                    adjusted: bool = True):
+    # adjusted=false serves raw (unadjusted) closes
+    past = end_date is not None and end_date < datetime.now().strftime("%Y-%m-%d")
+    return await http_cache.respond(
+        request, "price_history" if past else "price", f"price:{code}:{timeframe}:{start_date}:{end_date}:{adjusted}",
+        lambda: data_service.get_stock_price(code, timeframe, start_date, end_date, adjusted),
+        version=lambda: data_service.price_version(code, start_date),
+    )
+
+@app.get("/api/stock/{code}/adjustments")
+async def get_adjustments(code: str):
+    # Corporate-action factor table (recorded or inferred from raw vs adjusted bars)
+    return {"symbol": code, "events": adjustments.get_events(code)}
+
+class CorporateActionRequest(BaseModel):
+    ex_date: str # YYYY-MM-DD, first trading day at the new price
+    factor: float # price multiplier for bars before ex_date, e.g. 0.02 for a 1:50 split
+    kind: str = "split"
+
+@app.post("/api/admin/stock/{code}/adjustments", dependencies=[Depends(require_admin)])
+async def record_adjustment(code: str, request: CorporateActionRequest):
+    # Known action the gap detection missed or got wrong (rights issues stay inside the price limit)
+    try:
+        events = adjustments.record_action(code, request.ex_date, request.factor, request.kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"symbol": code, "events": events}
+
+@app.get("/api/admin/startup", dependencies=[Depends(require_admin)])
+async def startup_stats(imports: bool = False):
+    # imports=true re-imports main in a child interpreter for a per-package -X importtime breakdown
+    result = startup_report.report()
+    if imports:
+        result["imports"] = await executors.run("scrape", startup_report.import_breakdown, "main")
+    return result
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(seconds: float = 10, interval_ms: Optional[float] = None, format: str = "folded"):
+    # Samples every thread for `seconds`; format=folded feeds flamegraph.pl/speedscope, format=json summarizes
+    try:
+        sampler = await profiling.profile_process(seconds, interval_ms)
+    except profiling.ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except profiling.ProfilingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "json":
+        return sampler.summary()
+    return Response(sampler.folded(), media_type="text/plain")
+
+@app.get("/api/admin/profile/requests", dependencies=[Depends(require_admin)])
+async def list_request_profiles():
+    # Requests sent with X-Profile: 1 (and the admin token), newest first
+    return profiling.list_request_profiles()
+
+@app.get("/api/admin/profile/requests/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_request_profile(profile_id: int, format: str = "folded"):
+    entry = profiling.get_request_profile(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return {**{k: v for k, v in entry.items() if k != "sampler"}, **entry["sampler"].summary()}
+    return Response(entry["sampler"].folded(), media_type="text/plain")
+
+@app.get("/api/admin/loop", dependencies=[Depends(require_admin)])
+async def loop_stats(top: int = 20):
+    # Event-loop stalls above LOOP_BLOCK_THRESHOLD_MS, by endpoint and blocking frame
+    return loop_watchdog.report(top)
+
+@app.get("/api/executors/stats")
+async def executor_stats():
+    # Running/queued/rejected calls per named executor (network, scrape, cpu, browser)
+    return executors.stats()
+
+@app.get("/api/http-cache/stats")
+async def http_cache_stats():
+    # Rendered responses held for conditional GETs (price, indicators, screener, reports, dashboard)
+    return http_cache.stats()
+
+@app.get("/api/providers/stats")
+async def provider_stats():
+    # Circuit state, latency EWMA and error rate per price provider
+    return data_providers.ROUTER.stats()
+
+@app.get("/api/stock/{code}/indicators")
+async def get_indicators(request: Request, code: str, points: int = 0):
+    # points > 0 also returns the last N values of every indicator series
+    return await http_cache.respond(
+        request, "indicators", f"indicators:{code}:{points}",
+        lambda: data_service.get_indicators(code, points),
+        version=lambda: data_service.indicators_version(code),
+    )
 
 @app.get("/api/stock/{code}/financials")
 async def get_financials(code: str):
@@ -128,7 +437,9 @@ async def get_financials(code: str):
 async def analyze_stock(request: AnalysisRequest):
     prices = await data_service.get_stock_price(request.stock_code, "day", None, None)
     financials = await data_service.get_financials(request.stock_code)
-    analysis = await ai_service.analyze_stock(request.stock_name, prices, financials)
+    # Features come from the price store the fetch above just filled (cached per symbol/last bar)
+    features = price_features.get_features(request.stock_code)
+    analysis = await ai_service.analyze_stock(request.stock_name, prices.get("data", []), financials, features)
     return {"analysis": analysis}
 
 @app.post("/api/chat")
@@ -136,22 +447,92 @@ async def chat(request: ChatRequest):
     response = await ai_service.chat_with_agent(request.message, request.history, request.context)
     return {"response": response}
 
+@app.post("/api/backtest")
+async def run_backtest(request: BacktestRequest, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    if request.watchlist:
+        entry = await watchlist_service.load_user(db, user_id)
+        wl = entry["watchlists"].get(request.watchlist)
+        codes = [f.stock_code for f in wl["items"]] if wl else []
+    elif request.stock_code:
+        codes = [request.stock_code]
+    else:
+        raise HTTPException(status_code=400, detail="stock_code or watchlist is required")
+    try:
+        return await backtest.run_symbols(
+            codes, request.rule, request.params, request.start_date, request.end_date,
+            request.fee_bps, request.slippage_bps, request.initial_capital, request.curve
+        )
+    except backtest.BacktestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/backtest/sweep")
+async def run_backtest_sweep(request: BacktestSweepRequest):
+    # grid: {"fast": [5, 10, 20], "slow": [60, 120]} -> every combination, ranked by metric
+    try:
+        series = await backtest.load_series(request.stock_code, request.start_date)
+        return await backtest.sweep(
+            series, request.rule, request.grid, request.metric, request.top,
+            request.start_date, request.end_date, request.fee_bps, request.slippage_bps
+        )
+    except backtest.BacktestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Price Alerts
+@app.get("/api/alerts", response_model=List[schemas.Alert])
+async def read_alerts(active_only: bool = False, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    return await crud.get_alerts(db, user_id, active_only)
+
+@app.post("/api/alerts", response_model=schemas.Alert)
+async def create_alert(alert: schemas.AlertCreate, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    if alert.kind not in models.ALERT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(models.ALERT_KINDS)}")
+    try:
+        return await alerts.create_alert(db, user_id, alert)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/api/alerts/{alert_id}")
+async def delete_alert(alert_id: int, user_id: str = Depends(get_user_id), db: AsyncSession = Depends(get_db)):
+    if not await alerts.delete_alert(db, user_id, alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"message": "Alert deleted"}
+
+@app.get("/api/alerts/stats")
+async def alert_stats():
+    return alerts.get_stats()
+
+@app.websocket("/ws/quotes")
+async def quotes_socket(websocket: WebSocket, user_id: str = Depends(get_user_id)):
+    # Subscribe with {"action": "subscribe", "symbols": ["005930", "VIX"]}; see quote_stream for the protocol
+    await quote_stream.HUB.serve(websocket, user_id)
+
+@app.get("/api/stream/stats")
+async def quote_stream_stats():
+    return quote_stream.HUB.get_stats()
+
 @app.get("/api/dashboard")
-async def get_dashboard_data():
-    # 1. Fetch Data
-    indices = await data_service.get_global_market_indices()
-    
-    # 2. Generate Briefing via AI
-    briefing = await ai_service.generate_market_briefing(indices)
-    
-    return {
-        "indices": indices,
-        "briefing": briefing
-    }
+async def get_dashboard_data(request: Request):
+    async def produce():
+        # 1. Fetch Data
+        indices = await data_service.get_global_market_indices()
+
+        # 2. Generate Briefing via AI
+        briefing = await ai_service.generate_market_briefing(indices)
+
+        return {
+            "indices": indices,
+            "briefing": briefing
+        }
+
+    # Rendered once per HTTP cache TTL, however many dashboards are polling
+    return await http_cache.respond(request, "dashboard", "dashboard", produce)
 
 @app.get("/api/reports")
-async def get_reports(source: str = "hankyung", start_date: str = None, end_date: str = None):
-    return await report_service.get_research_reports(source, start_date, end_date)
+async def get_reports(request: Request, source: str = "hankyung", start_date: str = None, end_date: str = None):
+    return await http_cache.respond(
+        request, "reports", f"reports:{source}:{start_date}:{end_date}",
+        lambda: report_service.get_research_reports(source, start_date, end_date),
+    )
 
 @app.get("/api/issue/ai")
 async def get_ai_issues():
@@ -160,4 +541,6 @@ async def get_ai_issues():
 
 if __name__ == "__main__":
     print("STARTING NEW SERVER...")
+    import uvicorn
+
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
@@ -0,0 +1,75 @@
+"""
+MCP over HTTP inside the FastAPI app, loaded on first use.
+
+The MCP SDK and mcp_server's imports take a few hundred ms, so /mcp
+(streamable HTTP) and /mcp-sse (legacy SSE) are placeholders until the first
+agent request. That request imports mcp_server and starts its session
+manager in a background task, which runs until shutdown().
+"""
+import asyncio
+import importlib.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+MCP_STATE = {
+    "apps": None, # {"http": ASGI app, "sse": ASGI app} once loaded
+    "lock": None,
+    "task": None, # session manager task
+    "stop": None,
+}
+
+def available():
+    return importlib.util.find_spec("mcp") is not None
+
+async def _load():
+    if MCP_STATE["apps"] is not None:
+        return MCP_STATE["apps"]
+    if MCP_STATE["lock"] is None:
+        MCP_STATE["lock"] = asyncio.Lock()
+    async with MCP_STATE["lock"]:
+        if MCP_STATE["apps"] is not None:
+            return MCP_STATE["apps"]
+        import mcp_server
+
+        server = mcp_server.mcp
+        server.settings.streamable_http_path = "/" # the mount supplies the /mcp prefix
+        apps = {"http": server.streamable_http_app(), "sse": server.sse_app()}
+        ready, stop = asyncio.Event(), asyncio.Event()
+
+        async def run_sessions():
+            # The session manager's task group must be entered and left in one task
+            async with server.session_manager.run():
+                ready.set()
+                await stop.wait()
+
+        task = asyncio.get_running_loop().create_task(run_sessions())
+        waiter = asyncio.ensure_future(ready.wait())
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        if not ready.is_set():
+            waiter.cancel()
+            task.result() # re-raise the startup failure
+        MCP_STATE.update(apps=apps, task=task, stop=stop)
+        logger.info("[INFO] MCP HTTP transport loaded.")
+        return apps
+
+class LazyMCPApp:
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    async def __call__(self, scope, receive, send):
+        apps = await _load()
+        await apps[self.kind](scope, receive, send)
+
+def mount(app, path: str = "/mcp"):
+    app.mount(path, LazyMCPApp("http"))
+    app.mount(f"{path}-sse", LazyMCPApp("sse"))
+
+async def shutdown():
+    if MCP_STATE["task"] is None:
+        return
+    MCP_STATE["stop"].set()
+    try:
+        await asyncio.wait_for(MCP_STATE["task"], 5)
+    except Exception as e:
+        logger.warning(f"[WARN] MCP session manager did not stop cleanly: {e}")
@@ -1,4 +1,5 @@
 from mcp.server.fastmcp import FastMCP
+import argparse
 import asyncio
 import json
 import sys
@@ -11,13 +12,19 @@ sys.stdout = sys.stderr
 
 import stock_data_provider as data_service
 import ai_service
+import screener
 
 # Restore stdout for MCP communication
 sys.stdout = original_stdout
 # --- STDOUT GUARD END ---
 
+# HTTP transports: with the default localhost host, requests must come from localhost
+# (DNS-rebinding protection); set MCP_HOST=0.0.0.0 to serve agents on the LAN.
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.getenv("MCP_PORT", "8002"))
+
 # Initialize FastMCP Server
-mcp = FastMCP("StockDataMCP")
+mcp = FastMCP("StockDataMCP", host=MCP_HOST, port=MCP_PORT)
 
 # 1. Search Tool
 @mcp.tool()
@@ -40,26 +47,74 @@ async def get_stock_price(code: str, days: int = 5) -> str:
         code: Stock code (e.g., '005930', 'TSLA')
         days: Number of recent days to fetch (default: 5)
     """
-    # Calculate start date based on days? 
-    # For simplicity, we just fetch 'day' timeframe and slice the last N items
-    data = await data_service.get_stock_price(code, "day", None, None)
-    
-    # Handle response structure
-    if isinstance(data, dict) and "data" in data:
-        prices = data["data"][-days:]
-        name = data.get("name", code)
-        return f"Stock: {name}\nPrices: {json.dumps(prices, ensure_ascii=False)}"
-    elif isinstance(data, list):
-        prices = data[-days:]
-        return f"Stock: {code}\nPrices: {json.dumps(prices, ensure_ascii=False)}"
-    
-    return "Failed to fetch price data."
-
-# 3. Financials Tool
+    # Only the requested range is fetched, and recently cached bars are reused
+    data = await data_service.get_recent_prices(code, days)
+    if not data["data"]:
+        return "Failed to fetch price data."
+    return f"Stock: {data['name']}\nPrices: {json.dumps(data['data'], ensure_ascii=False)}"
+
+MAX_BATCH_CODES = 50
+BATCH_CONCURRENCY = 8
+
+def _split_codes(codes: str):
+    out = []
+    for c in codes.split(","):
+        c = c.strip()
+        if c and c not in out:
+            out.append(c)
+    return out[:MAX_BATCH_CODES]
+
+async def _gather(codes, fn):
+    # Bounded fan-out so a large batch does not open dozens of upstream requests at once
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(code):
+        async with sem:
+            try:
+                return code, await fn(code)
+            except Exception as e:
+                return code, {"error": str(e)}
+
+    return dict(await asyncio.gather(*(one(c) for c in codes)))
+
+@mcp.tool()
+async def get_stock_prices(codes: str, days: int = 5) -> str:
+    """
+    Recent price history for several stocks in one call.
+    Args:
+        codes: Comma-separated stock codes (e.g., '005930,000660,AAPL'), up to 50
+        days: Number of recent days per stock (default: 5)
+    """
+    result = await _gather(_split_codes(codes), lambda c: data_service.get_recent_prices(c, days))
+    return json.dumps(result, ensure_ascii=False)
+
+# 3. Indicators Tool
+@mcp.tool()
+async def get_indicators(code: str, points: int = 0) -> str:
+    """
+    Get technical indicators (SMA/EMA, RSI, MACD, Bollinger, ATR, volatility, drawdown).
+    Args:
+        code: Stock code (e.g., '005930', 'TSLA')
+        points: Also return the last N values of each indicator (default: 0 = latest only)
+    """
+    result = await data_service.get_indicators(code, points)
+    return json.dumps(result, ensure_ascii=False)
+
+@mcp.tool()
+async def get_indicators_batch(codes: str) -> str:
+    """
+    Latest technical indicators for several stocks in one call.
+    Args:
+        codes: Comma-separated stock codes (e.g., '005930,000660,AAPL'), up to 50
+    """
+    result = await _gather(_split_codes(codes), lambda c: data_service.get_indicators(c, 0))
+    return json.dumps(result, ensure_ascii=False)
+
+# 4. Financials Tool
 @mcp.tool()
 async def get_financials(code: str) -> str:
     """
-    Get key financial indicators (P/E, P/B, Dividend Yield, etc.)
+    Get key financial indicators (P/E, P/B, EPS, BPS, Dividend Yield, Market Cap) for Korean stocks.
     Args:
         code: Stock code
     """
@@ -68,7 +123,7 @@ async def get_financials(code: str) -> str:
         return "Financial data not available."
     return json.dumps(financials, ensure_ascii=False)
 
-# 4. Market Briefing Tool
+# 5. Market Briefing Tool
 @mcp.tool()
 async def get_market_briefing() -> str:
     """
@@ -79,6 +134,56 @@ async def get_market_briefing() -> str:
     briefing = await ai_service.generate_market_briefing(indices)
     return json.dumps(briefing, ensure_ascii=False)
 
+# 6. Portfolio Analytics Tool
+@mcp.tool()
+async def get_portfolio_analytics(codes: str = "", watchlist: str = "", benchmark: str = "", window: int = 250) -> str:
+    """
+    How a set of stocks moves together: correlation/covariance matrix, beta vs a benchmark, and portfolio volatility.
+    Args:
+        codes: Comma-separated stock codes (e.g., '005930,000660,AAPL')
+        watchlist: Use the stocks of this watchlist instead of codes (e.g., 'default')
+        benchmark: KOSPI, KOSDAQ, SP500, NASDAQ or a symbol (default: chosen from the stocks' market)
+        window: Number of daily returns to use (default: 250)
+    """
+    # Pulls in SQLAlchemy; only this tool needs it, so stdio launches skip it
+    import analytics
+    import database
+    import models
+
+    if watchlist:
+        async with database.AsyncSessionLocal() as db:
+            result = await analytics.analyze_watchlist(db, models.DEFAULT_USER_ID, watchlist, benchmark or None, window)
+    else:
+        result = await analytics.analyze_symbols(codes.split(","), benchmark or None, window)
+    return json.dumps(result, ensure_ascii=False)
+
+# 7. Screener Tool
+@mcp.tool()
+async def screen_stocks(filter: str = "", sort: str = "", limit: int = 20, fields: str = "") -> str:
+    """
+    Screen all Korean listings in one call (latest market snapshot).
+    Args:
+        filter: Expression over fields, e.g. 'per < 10 and pbr < 1 and market_cap > 1e12'
+        sort: Comma-separated fields, '-' prefix for descending (e.g., '-momentum_20d,per')
+        limit: Rows to return (default: 20, max 500)
+        fields: Comma-separated fields to include (default: code, name, price, valuation, momentum)
+    """
+    try:
+        result = await screener.screen(filter or None, sort or None, limit, 0, [f.strip() for f in fields.split(",") if f.strip()] or None)
+    except (screener.ScreenerError, screener.UniverseUnavailableError) as e:
+        return f"Screener error: {e}"
+    return json.dumps(result, ensure_ascii=False)
+
 if __name__ == "__main__":
-    # Run via stdio for local agent connection
-    mcp.run(transport='stdio')
+    parser = argparse.ArgumentParser(description="Stock data MCP server")
+    parser.add_argument("--transport", choices=["stdio", "http", "sse"], default="stdio",
+                        help="stdio for a per-agent process; http/sse for one long-lived server shared by many agents")
+    parser.add_argument("--port", type=int, default=MCP_PORT)
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        # Run via stdio for local agent connection
+        mcp.run(transport='stdio')
+    else:
+        mcp.settings.port = args.port
+        mcp.run(transport="streamable-http" if args.transport == "http" else "sse")
@@ -0,0 +1,236 @@
+"""
+In-process metrics in Prometheus text format, plus a structured trace log.
+
+- Request timing: MetricsMiddleware labels every request by route template.
+- Upstream calls: `with metrics.upstream("data_go_kr", "daily_bars") as call:`
+  times the block and counts it by upstream/operation/status; set
+  call.status / call.bytes inside the block. Exceptions count as "error".
+- Caches: metrics.cache("price_store", hit) counts hits and misses.
+- Trace log: every upstream call and request becomes one JSON line on the
+  "trace" logger (debug level; TRACE_LOG=<path> writes them to a file).
+
+Label values are expected to be low-cardinality (route templates, provider
+names), never raw symbols or URLs.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+
+trace_logger = logging.getLogger("trace")
+
+TRACE_LOG = os.getenv("TRACE_LOG")
+if TRACE_LOG:
+    _handler = logging.FileHandler(TRACE_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    trace_logger.addHandler(_handler)
+    trace_logger.setLevel(logging.DEBUG)
+    trace_logger.propagate = False
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock() # upstream calls also finish on executor threads
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, label_values: tuple, amount: float = 1.0):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(value)}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels: tuple):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def set(self, label_values: tuple, value: float):
+        with _lock:
+            self.values[label_values] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {} # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label_values: tuple, value: float):
+        with _lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self.values.items()):
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                running += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(state[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {running}")
+        return lines
+
+def _num(value: float):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _labels(names, values):
+    if not names:
+        return ""
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values)) + "}"
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "API request latency.", ("method", "route", "status"))
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Latency of calls to external services.", ("upstream", "operation", "status"))
+UPSTREAM_BYTES = Counter("upstream_response_bytes_total", "Bytes received from external services.", ("upstream", "operation"))
+CACHE_EVENTS = Counter("cache_requests_total", "Cache lookups by result.", ("cache", "result"))
+REQUEST_LOOP_SECONDS = Counter("http_request_loop_seconds_total", "Time requests spent running on the event loop.", ("route",))
+REQUEST_EXECUTOR_SECONDS = Counter("http_request_executor_seconds_total", "Time requests spent in executor threads.", ("route",))
+
+LOOP_LAG_SECONDS = Histogram("event_loop_lag_seconds", "How late the event loop ran a periodic heartbeat.", ())
+LOOP_BLOCKS = Counter("event_loop_blocks_total", "Event loop stalls above the watchdog threshold.", ("route",))
+LOOP_BLOCKED_SECONDS = Counter("event_loop_blocked_seconds_total", "Time the event loop was stalled, by endpoint holding it.", ("route",))
+EXECUTOR_ACTIVE = Gauge("executor_active_workers", "Calls running on each named executor.", ("pool",))
+EXECUTOR_QUEUED = Gauge("executor_queue_depth", "Calls waiting for a worker on each named executor.", ("pool",))
+EXECUTOR_REJECTED = Counter("executor_rejections_total", "Calls refused because the executor was saturated.", ("pool",))
+EXECUTOR_SECONDS = Histogram("executor_call_duration_seconds", "Executor call latency, queueing included.", ("pool",))
+COMPRESSION_BYTES = Counter("http_compression_bytes_total", "Response bytes before (raw) and after (wire) compression.", ("encoding", "stage"))
+DB_CONNECT_ERRORS = Counter("db_connect_errors_total", "Database connection attempts that failed.", ("upstream",))
+
+REGISTRY = [REQUEST_SECONDS, UPSTREAM_SECONDS, UPSTREAM_BYTES, CACHE_EVENTS, REQUEST_LOOP_SECONDS, REQUEST_EXECUTOR_SECONDS,
+            LOOP_LAG_SECONDS, LOOP_BLOCKS, LOOP_BLOCKED_SECONDS,
+            EXECUTOR_ACTIVE, EXECUTOR_QUEUED, EXECUTOR_REJECTED, EXECUTOR_SECONDS, COMPRESSION_BYTES, DB_CONNECT_ERRORS]
+
+_QUERY_STRING = re.compile(r"\?[^\s'\")]*")
+
+def error_text(exc):
+    # Exception texts from requests/urllib3 embed the full URL, API keys included
+    return f"{type(exc).__name__}: {_QUERY_STRING.sub('?...', str(exc))[:300]}"
+
+def trace(event: str, **fields):
+    if trace_logger.isEnabledFor(logging.DEBUG):
+        trace_logger.debug(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, ensure_ascii=False, default=str))
+
+class upstream:
+    """
+    Context manager timing one external call (sync or async code alike).
+    """
+    __slots__ = ("name", "operation", "status", "bytes", "started")
+
+    def __init__(self, name: str, operation: str):
+        self.name = name
+        self.operation = operation
+        self.status = "ok"
+        self.bytes = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def response(self, res):
+        """
+        Take status and size from a requests/httpx response; returns it unchanged.
+        """
+        self.status = res.status_code
+        self.bytes = len(res.content)
+        return res
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        if exc_type is not None and (self.status == "ok" or (isinstance(self.status, int) and self.status < 400)):
+            self.status = "error"
+        UPSTREAM_SECONDS.observe((self.name, self.operation, str(self.status)), elapsed)
+        if self.bytes:
+            UPSTREAM_BYTES.inc((self.name, self.operation), self.bytes)
+        trace("upstream", upstream=self.name, operation=self.operation, status=self.status,
+              ms=round(elapsed * 1000, 1), bytes=self.bytes, error=error_text(exc) if exc is not None else None)
+        return False
+
+def instrument_engine(engine, name: str = "db"):
+    """
+    Time every statement on a (sync) SQLAlchemy engine; async engines pass .sync_engine.
+    """
+    from sqlalchemy import event
+
+    def started(conn):
+        return conn.info.setdefault("metrics_started", [])
+
+    def record(conn, statement, status):
+        stack = started(conn)
+        if not stack:
+            return
+        elapsed = time.perf_counter() - stack.pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else "?"
+        UPSTREAM_SECONDS.observe((name, operation, status), elapsed)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        started(conn).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        record(conn, statement, "ok")
+
+    @event.listens_for(engine, "handle_error")
+    def failed(context):
+        if context.connection is None:
+            # The connect itself failed: no statement was timed; the original error propagates
+            DB_CONNECT_ERRORS.inc((name,))
+            return
+        record(context.connection, context.statement, "error")
+
+def cache(name: str, hit: bool):
+    CACHE_EVENTS.inc((name, "hit" if hit else "miss"))
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (works for streaming responses; websockets pass through).
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # Template (/api/stock/{code}/price), not the raw path, to keep label cardinality bounded
+            path = getattr(route, "path", None) or ("/mcp" if scope["path"].startswith("/mcp") else "unmatched")
+            REQUEST_SECONDS.observe((scope["method"], path, str(status["code"])), elapsed)
+            trace("request", method=scope["method"], route=path, status=status["code"], ms=round(elapsed * 1000, 1))
@@ -1,47 +1,158 @@
+"""
+Online migration: legacy favorites tables -> unified stock_favorites table.
+
+Copies `favorites`, `favorites_kr`, `favorites_us` (and a pre-watchlist
+`stock_favorites`, renamed to `stock_favorites_v1` first) into the default
+user's default watchlist of `stock_favorites` in small id-ordered batches,
+one short transaction per batch, so the API can keep serving (it only
+reads/writes the unified table). Inserts ignore rows
+that already exist, which makes the tool idempotent and safe to re-run or
+resume after an interruption.
+
+Usage:
+    python migrate_favorites.py [--batch-size 500] [--sleep 0.05] [--drop-legacy]
+"""
+import argparse
+import time
+
+from sqlalchemy import inspect, select, text
+
 from database import SessionLocal, engine
 import models
-from sqlalchemy import text
+from crud import build_upsert, infer_market
+
+# Legacy table -> fixed market (None = take it from the row / infer from the code)
+LEGACY_SOURCES = [
+    (models.FavoriteV1, None),
+    (models.FavoriteKR, models.MARKET_KR),
+    (models.FavoriteUS, models.MARKET_US),
+    (models.LegacyFavorite, None),
+]
+
+def row_market(model, row, market):
+    if market:
+        return market
+    if hasattr(model, "market"):
+        return row.market
+    return infer_market(row.stock_code)
+
+def upgrade_single_user_table():
+    """
+    A stock_favorites created before watchlists existed has no watchlist_id.
+    Move it aside so the new table can be created and it is copied like any legacy table.
+    """
+    inspector = inspect(engine)
+    if "stock_favorites" not in inspector.get_table_names():
+        return
+    columns = {c["name"] for c in inspector.get_columns("stock_favorites")}
+    if "watchlist_id" in columns:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE stock_favorites RENAME TO {models.FavoriteV1.__tablename__}"))
+    print(f"Renamed pre-watchlist stock_favorites to {models.FavoriteV1.__tablename__}.")
+
+def copy_table(db, model, market, watchlist, batch_size: int, pause: float):
+    """
+    Copy one legacy table in id order. Returns (rows read, rows inserted).
+    """
+    dialect = engine.dialect.name
+    last_id = 0
+    read = inserted = 0
+
+    while True:
+        columns = [model.id, model.stock_code, model.stock_name, model.created_at]
+        if hasattr(model, "market"):
+            columns.append(model.market)
+        batch = db.execute(
+            select(*columns)
+            .where(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+
+        rows = [{
+            "user_id": watchlist.user_id,
+            "watchlist_id": watchlist.id,
+            "market": row_market(model, r, market),
+            "stock_code": r.stock_code,
+            "stock_name": r.stock_name,
+            "created_at": r.created_at,
+        } for r in batch]
+
+        result = db.execute(build_upsert(dialect, rows))
+        db.commit()
 
-def migrate_favorites():
-    # Ensure tables exist
-    models.Base.metadata.create_all(bind=engine)
-    
+        read += len(batch)
+        inserted += max(result.rowcount, 0)
+        last_id = batch[-1].id
+        print(f"  {model.__tablename__}: copied up to id {last_id} ({read} rows read)")
+
+        if pause:
+            time.sleep(pause) # Leave room for live traffic between batches
+
+    return read, inserted
+
+def verify(db, sources, watchlist):
+    """
+    Every legacy (market, code) pair must exist in the target watchlist.
+    The target pairs are loaded once and each legacy table is diffed in memory.
+    """
+    target = set(db.execute(
+        select(models.Favorite.market, models.Favorite.stock_code)
+        .where(models.Favorite.watchlist_id == watchlist.id)
+    ).tuples())
+    missing = 0
+    for model, market in sources:
+        columns = [model.stock_code, model.market] if hasattr(model, "market") else [model.stock_code]
+        for r in db.execute(select(*columns)).all():
+            key = (row_market(model, r, market), r.stock_code)
+            if key not in target:
+                missing += 1
+                print(f"  MISSING: {model.__tablename__} {key[0]}:{key[1]}")
+    return missing == 0
+
+def get_default_watchlist(db):
+    query = select(models.Watchlist).where(
+        models.Watchlist.user_id == models.DEFAULT_USER_ID,
+        models.Watchlist.name == models.DEFAULT_WATCHLIST
+    )
+    watchlist = db.execute(query).scalars().first()
+    if not watchlist:
+        watchlist = models.Watchlist(user_id=models.DEFAULT_USER_ID, name=models.DEFAULT_WATCHLIST)
+        db.add(watchlist)
+        db.commit()
+        db.refresh(watchlist)
+    return watchlist
+
+def migrate_favorites(batch_size: int = 500, pause: float = 0.05, drop_legacy: bool = False):
+    upgrade_single_user_table()
+    # Creates watchlists / stock_favorites (and their indexes) if they do not exist yet
+    models.Base.metadata.create_all(bind=engine, tables=[models.Watchlist.__table__, models.Favorite.__table__])
+
+    existing_tables = set(inspect(engine).get_table_names())
     db = SessionLocal()
     try:
-        # Get all existing favorites
-        favorites = db.query(models.Favorite).all()
-        print(f"Found {len(favorites)} existing favorites to migrate.")
-
-        migrated_kr = 0
-        migrated_us = 0
-
-        for fav in favorites:
-            # Check if it's KR (digits only) or US
-            if fav.stock_code.isdigit():
-                # Check if already exists in KR table
-                existing = db.query(models.FavoriteKR).filter(models.FavoriteKR.stock_code == fav.stock_code).first()
-                if not existing:
-                    new_fav = models.FavoriteKR(
-                        stock_code=fav.stock_code,
-                        stock_name=fav.stock_name
-                    )
-                    db.add(new_fav)
-                    migrated_kr += 1
-            else:
-                # Check if already exists in US table
-                existing = db.query(models.FavoriteUS).filter(models.FavoriteUS.stock_code == fav.stock_code).first()
-                if not existing:
-                    new_fav = models.FavoriteUS(
-                        stock_code=fav.stock_code,
-                        stock_name=fav.stock_name
-                    )
-                    db.add(new_fav)
-                    migrated_us += 1
-        
-        db.commit()
-        print(f"Migration Complete.")
-        print(f"Migrated to KR: {migrated_kr}")
-        print(f"Migrated to US: {migrated_us}")
+        watchlist = get_default_watchlist(db)
+        for model, market in LEGACY_SOURCES:
+            if model.__tablename__ not in existing_tables:
+                print(f"Skipping {model.__tablename__} (table not found).")
+                continue
+            read, inserted = copy_table(db, model, market, watchlist, batch_size, pause)
+            print(f"{model.__tablename__}: {read} read, {inserted} inserted.")
+
+        sources = [(m, market) for m, market in LEGACY_SOURCES if m.__tablename__ in existing_tables]
+        ok = verify(db, sources, watchlist)
+        print("Verification passed." if ok else "Verification FAILED. Legacy tables kept.")
+
+        if ok and drop_legacy:
+            for model, _ in sources:
+                db.execute(text(f"DROP TABLE {model.__tablename__}"))
+                print(f"Dropped {model.__tablename__}.")
+            db.commit()
+
+        print("Migration Complete.")
 
     except Exception as e:
         print(f"Error during migration: {e}")
@@ -50,4 +161,10 @@ def migrate_favorites():
         db.close()
 
 if __name__ == "__main__":
-    migrate_favorites()
+    parser = argparse.ArgumentParser(description="Migrate legacy favorites tables into stock_favorites.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--sleep", type=float, default=0.05, help="Pause between batches (seconds)")
+    parser.add_argument("--drop-legacy", action="store_true", help="Drop legacy tables after a successful verify")
+    args = parser.parse_args()
+
+    migrate_favorites(args.batch_size, args.sleep, args.drop_legacy)
@@ -1,8 +1,105 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
+from sqlalchemy.ext.declarative import declarative_base
 from database import Base
 
+MARKET_KR = "KR"
+MARKET_US = "US"
+MARKETS = (MARKET_KR, MARKET_US)
+
+DEFAULT_USER_ID = "default"
+DEFAULT_WATCHLIST = "default"
+
+class Watchlist(Base):
+    """
+    Named list of favorites owned by one user.
+    """
+    __tablename__ = "watchlists"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False)
+    name = Column(String(100), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_watchlists_user_name"),
+    )
+
 class Favorite(Base):
+    """
+    Unified favorites table. One row per (watchlist, market, stock_code).
+    """
+    __tablename__ = "stock_favorites"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False, index=True)
+    watchlist_id = Column(Integer, ForeignKey("watchlists.id", ondelete="CASCADE"), nullable=False)
+    market = Column(String(2), nullable=False)
+    stock_code = Column(String(20), nullable=False)
+    stock_name = Column(String(100), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("watchlist_id", "market", "stock_code", name="uq_stock_favorites_wl_market_code"),
+        # Covering index for keyset reads: WHERE watchlist_id = ? AND market = ? AND id > ? ORDER BY id
+        Index("ix_stock_favorites_wl_market_id_cover", "watchlist_id", "market", "id", "stock_code", "stock_name", "created_at"),
+    )
+
+class QuoteSnapshot(Base):
+    """
+    Latest close / change / sparkline per symbol, maintained incrementally
+    from the price store so the watchlist snapshot is one JOIN.
+    """
+    __tablename__ = "quote_snapshots"
+
+    market = Column(String(2), primary_key=True)
+    stock_code = Column(String(20), primary_key=True)
+    as_of = Column(String(10), nullable=False) # Last bar date, YYYY-MM-DD
+    last_close = Column(Float, nullable=False)
+    prev_close = Column(Float)
+    change = Column(Float)
+    pct_change = Column(Float)
+    sparkline = Column(Text) # JSON list of recent closes, oldest first
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+ALERT_ABOVE = "above"
+ALERT_BELOW = "below"
+ALERT_PCT_UP = "pct_up"
+ALERT_PCT_DOWN = "pct_down"
+ALERT_KINDS = (ALERT_ABOVE, ALERT_BELOW, ALERT_PCT_UP, ALERT_PCT_DOWN)
+
+class PriceAlert(Base):
+    """
+    User price rule. Percentage rules are stored with their reference price
+    and the absolute level they translate to, so every rule is a threshold.
+    """
+    __tablename__ = "price_alerts"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False, index=True)
+    market = Column(String(2), nullable=False)
+    stock_code = Column(String(20), nullable=False)
+    kind = Column(String(16), nullable=False)  # ALERT_KINDS
+    value = Column(Float, nullable=False)      # Price level, or percent for pct_* rules
+    reference = Column(Float)                  # Base price of pct_* rules
+    level = Column(Float, nullable=False)      # Absolute trigger price
+    repeat = Column(Boolean, nullable=False, default=False) # Re-fire on every new crossing
+    active = Column(Boolean, nullable=False, default=True)
+    note = Column(String(200))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    triggered_at = Column(DateTime(timezone=True))
+    triggered_price = Column(Float)
+
+    __table_args__ = (
+        # Engine start-up: every active rule
+        Index("ix_price_alerts_active_code", "active", "stock_code"),
+    )
+
+# Legacy tables (read only, kept for migrate_favorites.py).
+# Separate metadata so Base.metadata.create_all() never recreates them.
+LegacyBase = declarative_base()
+
+class LegacyFavorite(LegacyBase):
     __tablename__ = "favorites"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -10,7 +107,7 @@ class Favorite(Base):
     stock_name = Column(String(100), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-class FavoriteKR(Base):
+class FavoriteKR(LegacyBase):
     __tablename__ = "favorites_kr"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -18,10 +115,23 @@ class FavoriteKR(Base):
     stock_name = Column(String(100), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-class FavoriteUS(Base):
+class FavoriteUS(LegacyBase):
     __tablename__ = "favorites_us"
 
     id = Column(Integer, primary_key=True, index=True)
     stock_code = Column(String(20), index=True, nullable=False)
     stock_name = Column(String(100), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class FavoriteV1(LegacyBase):
+    """
+    Single-user unified table (before watchlists). migrate_favorites.py
+    renames an old stock_favorites to this name and copies it over.
+    """
+    __tablename__ = "stock_favorites_v1"
+
+    id = Column(Integer, primary_key=True)
+    market = Column(String(2), nullable=False)
+    stock_code = Column(String(20), nullable=False)
+    stock_name = Column(String(100), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,158 @@
+"""
+Compact numeric summary of a price series for LLM prompts.
+
+Instead of pasting raw closes (or dict reprs) into prompts, a series is
+reduced to a fixed set of features: multi-horizon returns, volatility,
+trend slope, distance from 52-week extremes, drawdown and indicator states.
+Results are cached per (symbol, last bar date).
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+import indicators
+import metrics
+import price_store
+
+RETURN_HORIZONS = (1, 5, 20, 60, 120, 250)
+TREND_WINDOWS = (20, 60)
+YEAR_BARS = 250
+FEATURE_CACHE_SIZE = 2048
+
+FEATURE_CACHE = OrderedDict() # (symbol, last_date) -> (series version, features)
+
+def _pct(a, b):
+    return None if b is None or a is None or b == 0 or np.isnan(a) or np.isnan(b) else round((a / b - 1) * 100, 2)
+
+def _round(value, digits=2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+def trend(close: np.ndarray, window: int):
+    """
+    Least-squares slope of log price over the last `window` bars.
+    Returns (annualized slope %, r^2).
+    """
+    y = np.log(close[-window:])
+    if len(y) < window or np.isnan(y).any():
+        return None, None
+    x = np.arange(window, dtype=np.float64)
+    x -= x.mean()
+    y_c = y - y.mean()
+    slope = (x @ y_c) / (x @ x)
+    ss_tot = y_c @ y_c
+    r2 = 1.0 - ((y_c - slope * x) @ (y_c - slope * x)) / ss_tot if ss_tot > 0 else 0.0
+    return round((np.exp(slope * indicators.TRADING_DAYS) - 1) * 100, 1), round(float(r2), 2)
+
+def extract(series: price_store.PriceSeries):
+    """
+    Fixed-size feature dict for a price series (NumPy, no per-bar Python loops).
+    """
+    close = series.close[~np.isnan(series.close)]
+    if len(close) < 2:
+        return None
+    last = close[-1]
+    if price_store.get_series(series.symbol) is series:
+        # Shared incremental state: only bars changed since the last update are recomputed
+        state = indicators.get_state(series.symbol)
+    else:
+        state = indicators.IndicatorState(series.symbol).update(series, 0) # ad-hoc series (chat context)
+    latest = state.latest()
+
+    returns = {f"{h}d": _pct(last, close[-h - 1]) if len(close) > h else None for h in RETURN_HORIZONS}
+
+    log_ret = np.diff(np.log(close))
+    vol = {}
+    for w in (20, 60):
+        vol[f"{w}d"] = _round(log_ret[-w:].std(ddof=1) * np.sqrt(indicators.TRADING_DAYS) * 100, 1) if len(log_ret) >= w else None
+
+    trends = {}
+    for w in TREND_WINDOWS:
+        slope, r2 = trend(close, w)
+        trends[f"{w}d"] = {"slope_pct_yr": slope, "r2": r2}
+
+    year = close[-YEAR_BARS:]
+    peak = np.maximum.accumulate(year)
+
+    rsi = latest.get(f"rsi_{indicators.RSI_WINDOW}")
+    macd_hist = latest.get("macd_hist")
+    hist = state.arrays["macd_hist"]
+    crossed = len(hist) > 1 and np.sign(hist[-1]) != np.sign(hist[-2])
+    atr = latest.get(f"atr_{indicators.ATR_WINDOW}")
+
+    return {
+        "as_of": series.last_date,
+        "last": price_store.format_close(float(last)),
+        "returns_pct": returns,
+        "volatility_pct": vol,
+        "trend": trends,
+        "from_52w_high_pct": _pct(last, year.max()),
+        "from_52w_low_pct": _pct(last, year.min()),
+        "max_drawdown_1y_pct": _round((year / peak - 1).min() * 100, 1),
+        "vs_sma_pct": {f"sma{w}": _pct(last, latest.get(f"sma_{w}")) for w in (20, 60, 120)},
+        "rsi": {"value": _round(rsi, 1), "state": None if rsi is None else "overbought" if rsi >= 70 else "oversold" if rsi <= 30 else "neutral"},
+        "macd": {"hist": macd_hist, "state": None if macd_hist is None else ("bullish" if macd_hist > 0 else "bearish") + (" cross" if crossed else "")},
+        "bollinger_pctb": _round(latest.get("bb_pctb")),
+        "atr_pct": None if atr is None else round(atr / last * 100, 2),
+    }
+
+def get_features(symbol: str):
+    """
+    Cached features for a symbol in the price store (None if not loaded).
+    """
+    series = price_store.get_series(symbol)
+    if series is None or not len(series):
+        return None
+
+    key = (symbol, series.last_date)
+    cached = FEATURE_CACHE.get(key)
+    hit = bool(cached) and cached[0] == series.version
+    metrics.cache("price_features", hit)
+    if hit:
+        FEATURE_CACHE.move_to_end(key)
+        return cached[1]
+
+    features = extract(series)
+    FEATURE_CACHE[key] = (series.version, features)
+    while len(FEATURE_CACHE) > FEATURE_CACHE_SIZE:
+        FEATURE_CACHE.popitem(last=False)
+    return features
+
+def features_from_records(records, symbol: str = "context"):
+    """
+    Features for a [{"date", "close"}, ...] list (e.g. chat context sent by the frontend).
+    """
+    if not records:
+        return None
+    series = price_store.PriceSeries(symbol)
+    try:
+        dates, data = price_store._as_columns(records)
+    except (KeyError, TypeError, ValueError):
+        return None
+    series.dates = dates
+    for field in price_store.FIELDS:
+        setattr(series, field, data[field])
+    return extract(series)
+
+def _fmt(value, suffix="", signed=True):
+    if value is None:
+        return "n/a"
+    return f"{value:{'+' if signed else ''}g}{suffix}"
+
+def format_features(f: dict):
+    """
+    Few-line prompt block for a feature dict.
+    """
+    if not f:
+        return "No price data available."
+    r = f["returns_pct"]
+    t20, t60 = f["trend"]["20d"], f["trend"]["60d"]
+    return "\n".join([
+        f"Last close {f['last']} (as of {f['as_of']})",
+        "Returns % 1d/5d/20d/60d/120d/250d: " + " / ".join(_fmt(r[k]) for k in r),
+        f"Volatility (ann.) 20d/60d: {_fmt(f['volatility_pct']['20d'], '%', False)} / {_fmt(f['volatility_pct']['60d'], '%', False)}",
+        f"Trend slope 20d: {_fmt(t20['slope_pct_yr'], '%/yr')} (r2 {t20['r2']}), 60d: {_fmt(t60['slope_pct_yr'], '%/yr')} (r2 {t60['r2']})",
+        f"52w: {_fmt(f['from_52w_high_pct'], '%')} from high, {_fmt(f['from_52w_low_pct'], '%')} from low; max drawdown 1y {_fmt(f['max_drawdown_1y_pct'], '%')}",
+        "Price vs SMA20/60/120: " + " / ".join(_fmt(v, "%") for v in f["vs_sma_pct"].values()),
+        f"RSI14 {_fmt(f['rsi']['value'], '', False)} ({f['rsi']['state'] or 'n/a'}), MACD hist {_fmt(f['macd']['hist'])} ({f['macd']['state']}), "
+        f"Bollinger %B {f['bollinger_pctb']}, ATR {_fmt(f['atr_pct'], '%', False)} of price",
+    ])
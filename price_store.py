@@ -0,0 +1,177 @@
+"""
+Local price store: daily OHLCV bars per symbol, kept as NumPy columns.
+
+Providers (data.go.kr, FDR, ...) feed bars in through merge_bars(), by way of
+adjustments.ingest() so the store holds split/rights-adjusted bars; readers
+(snapshots, indicators, analytics) work on the arrays directly. Listeners are
+told the index of the first new/changed bar, so they can update incrementally
+instead of recomputing over the whole history.
+"""
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+class PriceSeries:
+    """
+    Columnar daily bars for one symbol. `dates` is datetime64[D], the other
+    columns are float64 (NaN where a provider did not supply the field).
+    """
+    __slots__ = ("symbol", "name", "dates", "open", "high", "low", "close", "volume", "version", "updated_at")
+
+    def __init__(self, symbol: str, name: str = None):
+        self.symbol = symbol
+        self.name = name or symbol
+        self.dates = np.array([], dtype="datetime64[D]")
+        for field in FIELDS:
+            setattr(self, field, np.array([], dtype=np.float64))
+        self.version = 0
+        self.updated_at = 0.0
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def last_date(self):
+        return str(self.dates[-1]) if len(self.dates) else None
+
+    def window(self, start_date: str = None, end_date: str = None):
+        """
+        Index slice covering [start_date, end_date] (YYYY-MM-DD, inclusive).
+        """
+        lo = np.searchsorted(self.dates, np.datetime64(start_date, "D")) if start_date else 0
+        hi = np.searchsorted(self.dates, np.datetime64(end_date, "D"), side="right") if end_date else len(self.dates)
+        return slice(lo, hi)
+
+    def to_records(self, start_date: str = None, end_date: str = None, last: int = None):
+        """
+        API shape used by get_stock_price: [{"date": "YYYY-MM-DD", "close": ...}, ...]
+        last: only the last N bars with a close (sliced before any record is built).
+        """
+        sl = self.window(start_date, end_date)
+        dates, closes = self.dates[sl], self.close[sl]
+        if last is not None:
+            keep = np.flatnonzero(~np.isnan(closes))[-last:] if last > 0 else []
+            dates, closes = dates[keep], closes[keep]
+        return [{"date": d, "close": format_close(c)} for d, c in zip(dates.astype(str).tolist(), closes.tolist()) if c == c]
+
+def format_close(value: float):
+    # Same rounding the providers always used: large (KRW) prices as int, small (USD) with 2 decimals
+    return int(value) if value > 5000 else round(value, 2)
+
+PRICE_STORE = {
+    "series": {},    # symbol -> PriceSeries
+    "listeners": [], # fn(series, start_index)
+}
+
+def get_series(symbol: str):
+    return PRICE_STORE["series"].get(symbol)
+
+def add_listener(fn):
+    """
+    Register fn(series, start) called after every merge that changed bars;
+    bars[start:] are new or revised (start == 0 means history was rewritten).
+    """
+    PRICE_STORE["listeners"].append(fn)
+    return fn
+
+def _notify(series: PriceSeries, start: int):
+    for fn in PRICE_STORE["listeners"]:
+        try:
+            fn(series, start)
+        except Exception as e:
+            logger.error(f"[ERROR] Price store listener {getattr(fn, '__name__', fn)} failed: {e}")
+
+def _as_columns(bars):
+    """
+    Accepts {"date": [...], "close": [...], ...} or [{"date":..., "close":...}, ...].
+    Returns (dates, {field: float array}) sorted by date, duplicates dropped (last wins).
+    """
+    if isinstance(bars, dict):
+        columns = bars
+    else:
+        columns = {"date": [b["date"] for b in bars]}
+        for field in FIELDS:
+            columns[field] = [b.get(field, np.nan) for b in bars]
+
+    dates = np.asarray(columns["date"], dtype="datetime64[D]")
+    n = len(dates)
+    data = {}
+    for field in FIELDS:
+        values = columns.get(field)
+        data[field] = np.full(n, np.nan) if values is None else np.asarray(values, dtype=np.float64)
+
+    # Sort + de-duplicate on date (keep the last occurrence)
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+    keep = np.ones(n, dtype=bool)
+    keep[:-1] = dates[1:] != dates[:-1]
+    return dates[keep], {f: v[order][keep] for f, v in data.items()}
+
+def merge_into(series: PriceSeries, bars):
+    """
+    Merge bars into series in place without bumping its version or notifying.
+    Returns the first new/changed bar index, or None when nothing changed.
+    """
+    dates, data = _as_columns(bars)
+    if not len(dates):
+        return None
+
+    old_n = len(series.dates)
+    if old_n == 0 or dates[0] > series.dates[-1]:
+        # Fast path: pure append
+        start = old_n
+        series.dates = np.concatenate([series.dates, dates])
+        for field in FIELDS:
+            setattr(series, field, np.concatenate([getattr(series, field), data[field]]))
+    else:
+        merged_dates = np.union1d(series.dates, dates)
+        old_idx = np.searchsorted(merged_dates, series.dates)
+        new_idx = np.searchsorted(merged_dates, dates)
+
+        changed = np.ones(len(merged_dates), dtype=bool)
+        changed[old_idx] = False
+        for field in FIELDS:
+            old_aligned = np.full(len(merged_dates), np.nan)
+            old_aligned[old_idx] = getattr(series, field)
+            merged = old_aligned.copy()
+            incoming = data[field]
+            # A provider without this field must not erase what another provider gave us
+            has_value = ~np.isnan(incoming)
+            merged[new_idx[has_value]] = incoming[has_value]
+            changed |= ~((merged == old_aligned) | (np.isnan(merged) & np.isnan(old_aligned)))
+            setattr(series, field, merged)
+        series.dates = merged_dates
+        start = int(np.argmax(changed)) if changed.any() else None
+
+    if start is None or start >= len(series.dates):
+        return None
+    return start
+
+def mark_changed(series: PriceSeries, start: int):
+    """
+    Bump the version and notify listeners after bars[start:] were modified in place.
+    """
+    series.version += 1
+    series.updated_at = time.time()
+    _notify(series, start)
+
+def merge_bars(symbol: str, bars, name: str = None):
+    """
+    Merge provider bars into the store. Returns (series, start) where start is
+    the first new/changed bar index, or None when nothing changed.
+    """
+    series = PRICE_STORE["series"].get(symbol)
+    if series is None:
+        series = PRICE_STORE["series"][symbol] = PriceSeries(symbol, name)
+    elif name:
+        series.name = name
+
+    start = merge_into(series, bars)
+    if start is not None:
+        mark_changed(series, start)
+    return series, start
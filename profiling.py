@@ -0,0 +1,372 @@
+"""
+Profiling a running server without a redeploy (admin only: ADMIN_TOKEN).
+
+- Request accounting (always on, cheap): for every request, time spent
+  running on the event loop vs. blocked in executor threads (queued
+  and running). Sent back as a Server-Timing header and summed per route
+  in /metrics. Tasks a request spawns (gather, create_task) count toward it.
+- Process sampling: Sampler snapshots every thread's stack each interval
+  (sys._current_frames) for N seconds. Stacks are rooted at "event-loop",
+  the executor pool name or the thread name, and the loop's idle wait is
+  reported separately.
+- Per-request profiling: a request sent with `X-Profile: 1` and a valid
+  `X-Admin-Token` is sampled while it runs (only its tasks and the executor
+  threads working for it). The response carries X-Profile-Id; the profile
+  is kept in a small ring buffer for /api/admin/profile/requests/{id}.
+
+Output is folded stacks ("frame;frame;frame count"), which flamegraph.pl,
+speedscope and inferno read directly, or a JSON summary with self/total
+sample counts per frame.
+"""
+import asyncio
+import collections
+import collections.abc
+import contextvars
+import hmac
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20")) # per-request profiles kept for download
+MAX_REQUEST_PROFILES = 4 # concurrent per-request samplers; more requests run unprofiled
+
+# Accounting for the request being handled in this context (None outside requests)
+ACCOUNT = contextvars.ContextVar("profiling_account", default=None)
+# task -> account of the request it works for (read from other threads, e.g. loop_watchdog)
+TASK_ACCOUNTS = weakref.WeakKeyDictionary()
+
+PROFILE_STATE = {
+    "loop": None,
+    "loop_thread": None,
+    "running": None,  # process-wide Sampler in progress
+    "requests": collections.OrderedDict(), # profile id -> per-request profile
+    "active_requests": 0,
+}
+
+_ids = itertools.count(1)
+_lock = threading.Lock()
+
+# Innermost Python frame of an event loop waiting for I/O (selector loop; uvloop waits in C)
+IDLE_LEAVES = ("selectors.py:", "runners.py:Runner.run", "base_events.py:BaseEventLoop.run_until_complete")
+
+class ProfilingError(ValueError):
+    pass
+
+class ProfilerBusyError(ProfilingError):
+    pass
+
+def is_admin(token) -> bool:
+    # No ADMIN_TOKEN configured: the admin surface is disabled entirely
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(str(token), ADMIN_TOKEN)
+
+def new_account(scope=None):
+    return {"loop": 0.0, "executor": 0.0, "queued": 0.0, "executor_calls": 0, "tasks": set(), "threads": set(),
+            "scope": scope}
+
+def _track(task, account):
+    account["tasks"].add(task)
+    TASK_ACCOUNTS[task] = account
+
+def route_of(task):
+    """
+    Route template of the request `task` is working for, None for background tasks.
+    """
+    account = TASK_ACCOUNTS.get(task) if task is not None else None
+    if account is None or account["scope"] is None:
+        return None
+    scope = account["scope"]
+    return getattr(scope.get("route"), "path", None) or scope.get("path")
+
+class TimedCoroutine(collections.abc.Coroutine):
+    """
+    Wraps a coroutine and adds the time of each step (send/throw) to account["loop"].
+    """
+    __slots__ = ("coro", "account")
+
+    def __init__(self, coro, account):
+        self.coro = coro
+        self.account = account
+
+    def send(self, value):
+        started = time.perf_counter()
+        try:
+            return self.coro.send(value)
+        finally:
+            self.account["loop"] += time.perf_counter() - started
+
+    def throw(self, *args):
+        started = time.perf_counter()
+        try:
+            return self.coro.throw(*args)
+        finally:
+            self.account["loop"] += time.perf_counter() - started
+
+    def close(self):
+        return self.coro.close()
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+def _task_factory(loop, coro, **kwargs):
+    context = kwargs.get("context")
+    account = context.get(ACCOUNT) if context is not None else ACCOUNT.get()
+    if account is None:
+        return asyncio.Task(coro, loop=loop, **kwargs)
+    task = asyncio.Task(TimedCoroutine(coro, account), loop=loop, **kwargs)
+    _track(task, account)
+    return task
+
+class AccountingExecutor(ThreadPoolExecutor):
+    """
+    Default executor that charges queue and run time to the submitting request.
+    """
+    def submit(self, fn, /, *args, **kwargs):
+        account = ACCOUNT.get()
+        if account is None:
+            return super().submit(fn, *args, **kwargs)
+        submitted = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            ident = threading.get_ident()
+            account["threads"].add(ident)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                account["threads"].discard(ident)
+                finished = time.perf_counter()
+                with _lock:
+                    account["queued"] += started - submitted
+                    account["executor"] += finished - started
+                    account["executor_calls"] += 1
+
+        return super().submit(run)
+
+def install(loop):
+    """
+    Called once from the app's lifespan, on the loop thread.
+    """
+    PROFILE_STATE["loop"] = loop
+    PROFILE_STATE["loop_thread"] = threading.get_ident()
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_task_factory)
+    loop.set_default_executor(AccountingExecutor(thread_name_prefix="asyncio"))
+
+def frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+def fold(frame, root: str):
+    names = []
+    while frame is not None:
+        names.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    names.append(root)
+    return ";".join(reversed(names))
+
+_POOL_SUFFIX = re.compile(r"_\d+$|-\d+(?= \()") # asyncio_3, Thread-7 (worker)
+
+class Sampler(threading.Thread):
+    """
+    Samples all thread stacks every `interval` seconds until stop().
+
+    `select(ident)` returns the root label for a thread, or None to skip it;
+    the default keeps every thread, labelling the loop thread "event-loop".
+    """
+    def __init__(self, interval: float, select=None):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self.select = select or self._any_thread
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.elapsed = 0.0
+        self._halt = threading.Event()
+        self._names = {}
+
+    def _any_thread(self, ident):
+        if ident == PROFILE_STATE["loop_thread"]:
+            return "event-loop"
+        if ident not in self._names:
+            self._names = {t.ident: _POOL_SUFFIX.sub("", t.name) for t in threading.enumerate()} # merge a pool's workers
+        return self._names.get(ident, f"thread-{ident}")
+
+    def run(self):
+        self.started_at = time.perf_counter()
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                root = self.select(ident)
+                if root is not None:
+                    self.stacks[fold(frame, root)] += 1
+            self.samples += 1
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def stop(self):
+        self._halt.set()
+        self.join()
+        return self
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 30):
+        roots = collections.Counter()
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        idle = 0
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            roots[frames[0]] += count
+            if frames[0] == "event-loop" and frames[-1].startswith(IDLE_LEAVES):
+                idle += count
+                continue
+            self_counts[frames[-1]] += count
+            for name in set(frames[1:]):
+                total_counts[name] += count
+        loop_samples = roots.get("event-loop", 0)
+        return {
+            "seconds": round(self.elapsed, 3),
+            "interval_ms": round(self.interval * 1000, 2),
+            "samples": self.samples,
+            "threads": dict(roots.most_common()),
+            "event_loop": {
+                "busy_pct": round(100 * (loop_samples - idle) / loop_samples, 1) if loop_samples else None,
+                "idle_samples": idle,
+            },
+            "top_self": [{"frame": f, "samples": c} for f, c in self_counts.most_common(top)],
+            "top_total": [{"frame": f, "samples": c} for f, c in total_counts.most_common(top)],
+        }
+
+def _interval(interval_ms):
+    interval_ms = PROFILE_INTERVAL_MS if interval_ms is None else interval_ms
+    if not 1 <= interval_ms <= 1000:
+        raise ProfilingError("interval_ms must be between 1 and 1000")
+    return interval_ms / 1000
+
+async def profile_process(seconds: float, interval_ms: float = None):
+    """
+    Sample every thread for `seconds`; one process-wide profile at a time.
+    """
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise ProfilingError(f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+    if PROFILE_STATE["running"] is not None:
+        raise ProfilerBusyError("A profile is already running")
+    sampler = Sampler(_interval(interval_ms))
+    PROFILE_STATE["running"] = sampler
+    try:
+        sampler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+        PROFILE_STATE["running"] = None
+    return sampler
+
+def _request_sampler(account):
+    loop = PROFILE_STATE["loop"]
+
+    def select(ident):
+        if ident == PROFILE_STATE["loop_thread"]:
+            # Only while one of this request's tasks holds the loop
+            return "event-loop" if asyncio.current_task(loop) in account["tasks"] else None
+        return "executor" if ident in account["threads"] else None
+
+    return Sampler(_interval(None), select)
+
+def _keep_profile(entry):
+    profiles = PROFILE_STATE["requests"]
+    profiles[entry["id"]] = entry
+    while len(profiles) > PROFILE_KEEP:
+        profiles.popitem(last=False)
+
+def list_request_profiles():
+    return [{k: v for k, v in p.items() if k != "sampler"} for p in reversed(PROFILE_STATE["requests"].values())]
+
+def get_request_profile(profile_id: int):
+    return PROFILE_STATE["requests"].get(profile_id)
+
+def server_timing(account, total: float):
+    return (f"loop;dur={account['loop'] * 1000:.1f}, executor;dur={account['executor'] * 1000:.1f}, "
+            f"queue;dur={account['queued'] * 1000:.1f}, total;dur={total * 1000:.1f}")
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware: per-request accounting, plus sampling on X-Profile.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or PROFILE_STATE["loop"] is None:
+            return await self.app(scope, receive, send)
+        account = new_account(scope)
+        task = asyncio.current_task()
+        _track(task, account)
+        token = ACCOUNT.set(account)
+        started = time.perf_counter()
+        sampler = self._sampler_for(scope, account)
+        profile_id = next(_ids) if sampler is not None else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(account, time.perf_counter() - started).encode()))
+                if profile_id is not None:
+                    headers.append((b"x-profile-id", str(profile_id).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await TimedCoroutine(self.app(scope, receive, send_wrapper), account)
+        finally:
+            ACCOUNT.reset(token)
+            TASK_ACCOUNTS.pop(task, None) # the connection's task may serve later requests
+            elapsed = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.REQUEST_LOOP_SECONDS.inc((route,), account["loop"])
+            metrics.REQUEST_EXECUTOR_SECONDS.inc((route,), account["executor"])
+            if sampler is not None:
+                sampler.stop()
+                PROFILE_STATE["active_requests"] -= 1
+                _keep_profile({
+                    "id": profile_id, "method": scope["method"], "path": scope["path"], "route": route,
+                    "at": time.time(), "ms": round(elapsed * 1000, 1),
+                    "loop_ms": round(account["loop"] * 1000, 1), "executor_ms": round(account["executor"] * 1000, 1),
+                    "queued_ms": round(account["queued"] * 1000, 1), "executor_calls": account["executor_calls"],
+                    "samples": sum(sampler.stacks.values()), "sampler": sampler,
+                })
+
+    @staticmethod
+    def _sampler_for(scope, account):
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-profile") not in (b"1", b"true"):
+            return None
+        if not is_admin(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            return None
+        if PROFILE_STATE["active_requests"] >= MAX_REQUEST_PROFILES:
+            logger.warning("[WARN] Too many concurrent request profiles; serving unprofiled.")
+            return None
+        PROFILE_STATE["active_requests"] += 1
+        sampler = _request_sampler(account)
+        sampler.start()
+        return sampler
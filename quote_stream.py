@@ -0,0 +1,400 @@
+"""
+Real-time quotes over WebSocket with server-side fan-out.
+
+Clients subscribe to stock symbols ("005930", "AAPL") and dashboard index
+keys ("US_10Y", "VIX", ...). The hub runs ONE poller per distinct symbol and
+ONE shared poller for all index keys, no matter how many clients listen;
+each poll result is diffed against the last quote and only changed fields
+are pushed. Every client has a latest-wins outbox flushed at most every
+CLIENT_MIN_INTERVAL, so a slow client never queues up stale ticks.
+
+Protocol (JSON text frames):
+    -> {"action": "subscribe", "symbols": ["005930", "VIX"]}
+    -> {"action": "unsubscribe", "symbols": ["VIX"]}
+    -> {"action": "ping"}
+    <- {"type": "snapshot", "symbol": "005930", "data": {...full quote...}}
+    <- {"type": "quote", "symbol": "005930", "data": {...changed fields...}}
+    <- {"type": "error", "message": "..."} / {"type": "pong"}
+
+Topics starting with "alerts:" are event channels (e.g. "alerts:<user id>"):
+nothing is polled for them, services push events through broadcast(). A
+client may only subscribe to the channel of the user it connected as
+(X-User-Id, see main.get_user_id); "alerts" alone is shorthand for it.
+Distinct polled symbols are capped at MAX_POLLERS across all clients.
+
+QUOTE_SOURCE=fake swaps upstream for a local random-walk source (tests, demos).
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+import index_service
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUOTE_POLL_INTERVAL = float(os.getenv("QUOTE_POLL_INTERVAL", "3"))
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "30"))
+CLIENT_MIN_INTERVAL = float(os.getenv("QUOTE_CLIENT_MIN_INTERVAL", "0.25"))
+MAX_SUBSCRIPTIONS = 200
+MAX_POLLERS = int(os.getenv("QUOTE_MAX_POLLERS", "500")) # distinct symbols polled for clients, server-wide
+MAX_BACKOFF = 60.0
+
+INDEX_KEYS = tuple(index_service.INDEX_SYMBOLS)
+INDEX_TOPIC = "__indices__"
+EVENT_PREFIX = "alerts:"
+
+# 1. Sources
+class YahooQuoteSource:
+    """
+    Last price from Yahoo's chart endpoint (KRX codes get a .KS/.KQ suffix);
+    indices come from the dashboard provider in one batched call.
+    """
+    CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+
+    def __init__(self):
+        self.client = None
+
+    def _yahoo_symbol(self, symbol: str):
+        if not (symbol.isdigit() and len(symbol) == 6):
+            return symbol
+        import screener
+
+        universe = screener.SCREENER_CACHE["universe"]
+        if universe is not None:
+            hit = (universe.columns["code"] == symbol).nonzero()[0]
+            if len(hit) and universe.columns["market"][hit[0]] == "KOSDAQ":
+                return f"{symbol}.KQ"
+        return f"{symbol}.KS"
+
+    async def fetch_quote(self, symbol: str):
+        if self.client is None:
+            import httpx # deferred: ~0.1s at import, first poll is soon enough
+
+            self.client = httpx.AsyncClient(timeout=5, headers={"User-Agent": "Mozilla/5.0"})
+        with metrics.upstream("yahoo", "chart") as call:
+            res = call.response(await self.client.get(self.CHART_URL.format(symbol=self._yahoo_symbol(symbol)),
+                                                      params={"range": "1d", "interval": "1m"}))
+            res.raise_for_status()
+        meta = res.json()["chart"]["result"][0]["meta"]
+        price = meta.get("regularMarketPrice")
+        prev = meta.get("chartPreviousClose") or meta.get("previousClose")
+        if price is None:
+            return None
+        return _quote(price, prev, meta.get("regularMarketVolume"), meta.get("regularMarketTime"))
+
+    async def fetch_indices(self):
+        return await index_service.get_indices()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+class FakeQuoteSource:
+    """
+    Deterministic random walk per symbol; counts upstream calls.
+    """
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self.prices = {}
+        self.calls = 0
+
+    def _step(self, key: str, base: float):
+        rng = random.Random(f"{self.seed}:{key}:{self.calls}")
+        prev = self.prices.get(key, base)
+        price = round(prev * (1 + rng.gauss(0, 0.002)), 2)
+        self.prices[key] = price
+        return _quote(price, base, rng.randint(1_000, 1_000_000), time.time())
+
+    async def fetch_quote(self, symbol: str):
+        self.calls += 1
+        return self._step(symbol, 70000.0 if symbol.isdigit() else 150.0)
+
+    async def fetch_indices(self):
+        self.calls += 1
+        return {key: self._step(key, 100.0) for key in INDEX_KEYS}
+
+    async def close(self):
+        pass
+
+def _quote(price, prev, volume=None, ts=None):
+    change = price - prev if prev else None
+    return {
+        "price": price,
+        "prev_close": prev,
+        "change": round(change, 4) if change is not None else None,
+        "pct_change": round(change / prev * 100, 2) if prev else None,
+        "volume": volume,
+        "ts": ts,
+    }
+
+def make_source(name: str = None):
+    name = (name or os.getenv("QUOTE_SOURCE", "yahoo")).lower()
+    return FakeQuoteSource() if name == "fake" else YahooQuoteSource()
+
+# 2. Hub
+class Client:
+    def __init__(self, websocket: WebSocket, user_id: str = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.symbols = set()
+        self.outbox = {} # symbol -> message (latest wins)
+        self.wakeup = asyncio.Event()
+
+    def push(self, symbol: str, message: dict):
+        queued = self.outbox.get(symbol)
+        if queued is not None and message["type"] == "quote":
+            # Merge deltas that arrive between two flushes; a pending snapshot stays a snapshot
+            queued["data"].update(message["data"])
+        else:
+            self.outbox[symbol] = message
+        self.wakeup.set()
+
+    async def sender(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                messages, self.outbox = list(self.outbox.values()), {}
+                for message in messages:
+                    await self.websocket.send_text(json.dumps(message, ensure_ascii=False))
+                await asyncio.sleep(CLIENT_MIN_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Connection gone: the receive loop notices and cleans up
+            logger.info(f"[INFO] Quote client send failed: {e}")
+
+class Topic:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.clients = set()
+        self.latest = None
+
+class QuoteHub:
+    def __init__(self, source=None):
+        self.source = source
+        self.topics = {}  # symbol / index key -> Topic
+        self.pollers = {} # symbol or INDEX_TOPIC -> asyncio.Task
+        self.clients = set()
+        self.watched = {}   # symbol -> internal watchers (kept polled without clients)
+        self.listeners = [] # fn(symbol, quote) on every new quote
+        self.stats = {"upstream_calls": 0, "upstream_errors": 0, "messages": 0}
+
+    def add_listener(self, fn):
+        """
+        Register fn(symbol, quote) for every changed quote (alerts, stores...).
+        """
+        self.listeners.append(fn)
+        return fn
+
+    def _source(self):
+        if self.source is None:
+            self.source = make_source()
+        return self.source
+
+    # Fan-out
+    def publish(self, symbol: str, quote: dict):
+        topic = self.topics.get(symbol)
+        if topic is None or not quote:
+            return
+        if topic.latest is None:
+            delta = quote
+        else:
+            delta = {k: v for k, v in quote.items() if topic.latest.get(k) != v and k != "ts"}
+            if not delta:
+                return
+            delta["ts"] = quote.get("ts")
+        topic.latest = quote
+
+        for fn in self.listeners:
+            try:
+                fn(symbol, quote)
+            except Exception as e:
+                logger.error(f"[ERROR] Quote listener {getattr(fn, '__name__', fn)} failed: {e}")
+
+        message = {"type": "quote", "symbol": symbol, "data": delta}
+        for client in topic.clients:
+            client.push(symbol, {**message, "data": dict(delta)})
+        self.stats["messages"] += len(topic.clients)
+
+    # Pollers
+    async def _poll(self, key: str, interval: float, fetch):
+        backoff = interval
+        while True:
+            try:
+                self.stats["upstream_calls"] += 1
+                result = await fetch()
+                backoff = interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["upstream_errors"] += 1
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                logger.warning(f"[WARN] Quote poll failed for {key}: {e}")
+                result = None
+            if result:
+                if key == INDEX_TOPIC:
+                    for index_key, quote in result.items():
+                        self.publish(index_key, quote)
+                else:
+                    self.publish(key, result)
+            await asyncio.sleep(backoff)
+
+    def _ensure_poller(self, symbol: str):
+        if symbol.startswith(EVENT_PREFIX):
+            return
+        key = INDEX_TOPIC if symbol in INDEX_KEYS else symbol
+        task = self.pollers.get(key)
+        if task is not None and not task.done():
+            return
+        source = self._source()
+        if key == INDEX_TOPIC:
+            coro = self._poll(key, INDEX_POLL_INTERVAL, source.fetch_indices)
+        else:
+            coro = self._poll(key, QUOTE_POLL_INTERVAL, lambda: source.fetch_quote(symbol))
+        self.pollers[key] = asyncio.get_running_loop().create_task(coro)
+
+    def _maybe_stop_poller(self, symbol: str):
+        if symbol in INDEX_KEYS:
+            if any(k in self.topics for k in INDEX_KEYS):
+                return
+            key = INDEX_TOPIC
+        else:
+            key = symbol
+        task = self.pollers.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def _symbol_pollers(self):
+        return sum(1 for key in self.pollers if key != INDEX_TOPIC)
+
+    # Subscriptions
+    def subscribe(self, client: Client, symbols):
+        for symbol in symbols:
+            if symbol == EVENT_PREFIX.rstrip(":"):
+                symbol = f"{EVENT_PREFIX}{client.user_id}"
+            if symbol in client.symbols:
+                continue
+            if len(client.symbols) >= MAX_SUBSCRIPTIONS:
+                client.push("__error__", {"type": "error", "message": f"Subscription limit ({MAX_SUBSCRIPTIONS}) reached"})
+                break
+            if symbol.startswith(EVENT_PREFIX) and symbol != f"{EVENT_PREFIX}{client.user_id}":
+                client.push("__error__", {"type": "error", "message": f"Not allowed: {symbol}"})
+                continue
+            topic = self.topics.get(symbol)
+            if (topic is None and not symbol.startswith(EVENT_PREFIX) and symbol not in INDEX_KEYS
+                    and self._symbol_pollers() >= MAX_POLLERS):
+                client.push("__error__", {"type": "error", "message": f"Server symbol limit ({MAX_POLLERS}) reached"})
+                break
+            if topic is None:
+                topic = self.topics[symbol] = Topic(symbol)
+            topic.clients.add(client)
+            client.symbols.add(symbol)
+            if topic.latest is not None:
+                # Snapshot-on-subscribe: a late joiner gets the full quote without waiting for the next tick
+                client.push(symbol, {"type": "snapshot", "symbol": symbol, "data": dict(topic.latest)})
+            self._ensure_poller(symbol)
+
+    def unsubscribe(self, client: Client, symbols):
+        for symbol in symbols:
+            if symbol not in client.symbols:
+                continue
+            client.symbols.discard(symbol)
+            client.outbox.pop(symbol, None)
+            topic = self.topics.get(symbol)
+            if topic is None:
+                continue
+            topic.clients.discard(client)
+            self._maybe_drop_topic(symbol)
+
+    def _maybe_drop_topic(self, symbol: str):
+        topic = self.topics.get(symbol)
+        if topic is not None and not topic.clients and not self.watched.get(symbol):
+            del self.topics[symbol]
+            self._maybe_stop_poller(symbol)
+
+    def watch(self, symbol: str):
+        """
+        Keep a symbol polled without any WebSocket client (server-side consumers).
+        """
+        self.watched[symbol] = self.watched.get(symbol, 0) + 1
+        if symbol not in self.topics:
+            self.topics[symbol] = Topic(symbol)
+        self._ensure_poller(symbol)
+
+    def unwatch(self, symbol: str):
+        count = self.watched.get(symbol, 0) - 1
+        if count > 0:
+            self.watched[symbol] = count
+            return
+        self.watched.pop(symbol, None)
+        self._maybe_drop_topic(symbol)
+
+    def broadcast(self, topic_name: str, message: dict, key: str = None):
+        """
+        Push an event to the clients of an event topic; key keeps distinct events from merging.
+        """
+        topic = self.topics.get(topic_name)
+        if topic is None:
+            return 0
+        for client in topic.clients:
+            client.push(key or topic_name, message)
+        self.stats["messages"] += len(topic.clients)
+        return len(topic.clients)
+
+    async def serve(self, websocket: WebSocket, user_id: str = None):
+        await websocket.accept()
+        client = Client(websocket, user_id)
+        self.clients.add(client)
+        sender = asyncio.get_running_loop().create_task(client.sender())
+        try:
+            while True:
+                try:
+                    msg = json.loads(await websocket.receive_text())
+                    action = msg.get("action")
+                    symbols = msg.get("symbols", [])
+                    if not isinstance(symbols, list):
+                        # A bare string would otherwise subscribe to each of its characters
+                        raise ValueError("symbols must be a list")
+                    symbols = [str(s).strip() for s in symbols if str(s).strip()]
+                except (ValueError, AttributeError):
+                    client.push("__error__", {"type": "error", "message": "Invalid message"})
+                    continue
+                if action == "subscribe":
+                    self.subscribe(client, symbols)
+                elif action == "unsubscribe":
+                    self.unsubscribe(client, symbols)
+                elif action == "ping":
+                    client.push("__pong__", {"type": "pong"})
+                else:
+                    client.push("__error__", {"type": "error", "message": f"Unknown action: {action}"})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            self.unsubscribe(client, list(client.symbols))
+            self.clients.discard(client)
+
+    def get_stats(self):
+        return {
+            "clients": len(self.clients),
+            "topics": len(self.topics),
+            "pollers": len(self.pollers),
+            **self.stats,
+        }
+
+    async def shutdown(self):
+        for task in self.pollers.values():
+            task.cancel()
+        self.pollers.clear()
+        if self.source is not None:
+            await self.source.close()
+
+HUB = QuoteHub()
@@ -1,13 +1,18 @@
-import requests
-from bs4 import BeautifulSoup
+import os
 import logging
-import asyncio
 import re
 
+import executors
+import metrics
+
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='[%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
+# List pages (module-level so the offline benchmarks can point them at a stub server)
+HANKYUNG_LIST_URL = "https://consensus.hankyung.com/analysis/list"
+NAVER_LIST_URL = "https://finance.naver.com/research/company_list.naver"
+
 CACHE = {
     "data": [],
     "last_fetched": 0
@@ -47,7 +52,10 @@ def fetch_hankyung_reports(start_date: str = None, end_date: str = None, max_pag
     Scrape Hankyung Consensus Research Reports
     Target URL: https://consensus.hankyung.com/analysis/list
     """
-    base_url = "https://consensus.hankyung.com/analysis/list"
+    import requests
+    from bs4 import BeautifulSoup # deferred: bs4 pulls in lxml at import
+
+    base_url = HANKYUNG_LIST_URL
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
@@ -71,9 +79,10 @@ def fetch_hankyung_reports(start_date: str = None, end_date: str = None, max_pag
             if end_dt:
                 params["edate"] = end_dt
                 
-            logger.info(f"Fetching Hankyung reports page {page}...")
+            logger.debug("Fetching Hankyung reports page %d", page)
             
-            res = requests.get(base_url, params=params, headers=headers, timeout=10)
+            with metrics.upstream("hankyung", "report_list") as call:
+                res = call.response(requests.get(base_url, params=params, headers=headers, timeout=10))
             res.encoding = 'utf-8' 
             
             if res.status_code != 200:
@@ -157,7 +166,7 @@ def fetch_hankyung_reports(start_date: str = None, end_date: str = None, max_pag
                     logger.error(f"Error parsing row: {e}")
                     continue
             
-            logger.info(f"Hankyung page {page}: Found {page_items_count} reports")
+            logger.debug("Hankyung page %d: Found %d reports", page, page_items_count)
             
             if page_items_count == 0:
                 break
@@ -173,7 +182,10 @@ def fetch_naver_reports(start_date: str = None, end_date: str = None, max_pages:
     Scrape Naver Finance Research - Company List
     Target URL: https://finance.naver.com/research/company_list.naver
     """
-    base_url = "https://finance.naver.com/research/company_list.naver"
+    import requests
+    from bs4 import BeautifulSoup # deferred: bs4 pulls in lxml at import
+
+    base_url = NAVER_LIST_URL
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
@@ -190,9 +202,10 @@ def fetch_naver_reports(start_date: str = None, end_date: str = None, max_pages:
     for page in range(1, max_pages + 1):
         try:
             url = f"{base_url}?&page={page}"
-            logger.info(f"Fetching Naver reports page {page}...")
+            logger.debug("Fetching Naver reports page %d", page)
             
-            res = requests.get(url, headers=headers, timeout=5)
+            with metrics.upstream("naver", "report_list") as call:
+                res = call.response(requests.get(url, headers=headers, timeout=5))
             res.encoding = 'euc-kr' 
             
             if res.status_code != 200:
@@ -269,7 +282,7 @@ def fetch_naver_reports(start_date: str = None, end_date: str = None, max_pages:
                 except Exception as e:
                     continue
             
-            logger.info(f"Naver page {page}: Found {page_items_count} reports")
+            logger.debug("Naver page %d: Found %d reports", page, page_items_count)
             
             if page_items_count == 0:
                 pass
@@ -293,6 +306,4 @@ async def get_research_reports(source: str = "hankyung", start_date: str = None,
     """
     Async wrapper for scraping function with source selection.
     """
-    loop = asyncio.get_event_loop()
-    data = await loop.run_in_executor(None, fetch_reports_sync, source, start_date, end_date)
-    return data
+    return await executors.run("scrape", fetch_reports_sync, source, start_date, end_date)
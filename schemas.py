@@ -1,16 +1,70 @@
 from pydantic import BaseModel
 from datetime import datetime
+from typing import List, Optional
 
 class FavoriteBase(BaseModel):
     stock_code: str
     stock_name: str
 
 class FavoriteCreate(FavoriteBase):
-    pass
+    market: Optional[str] = None # "KR" / "US", inferred from the code if omitted
 
 class Favorite(FavoriteBase):
     id: int
+    market: str
+    watchlist_id: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
+
+class FavoriteKey(BaseModel):
+    stock_code: str
+    market: Optional[str] = None
+
+class FavoriteBulkRequest(BaseModel):
+    add: List[FavoriteCreate] = []
+    remove: List[FavoriteKey] = []
+    replace: bool = False # Drop everything (in `market`, if given) not listed in `add`
+    market: Optional[str] = None
+
+class FavoriteBulkResult(BaseModel):
+    upserted: int
+    removed: int
+
+class WatchlistCreate(BaseModel):
+    name: str
+
+class Watchlist(BaseModel):
+    id: int
+    name: str
+    created_at: Optional[datetime] = None
+    count: int = 0
+    items: Optional[List[Favorite]] = None
+
+class AlertCreate(BaseModel):
+    stock_code: str
+    kind: str                           # "above" / "below" (price level) or "pct_up" / "pct_down" (percent)
+    value: float
+    reference: Optional[float] = None   # Base price for pct_* rules (defaults to the latest price)
+    market: Optional[str] = None
+    repeat: bool = False
+    note: Optional[str] = None
+
+class Alert(BaseModel):
+    id: int
+    market: str
+    stock_code: str
+    kind: str
+    value: float
+    reference: Optional[float] = None
+    level: float
+    repeat: bool
+    active: bool
+    note: Optional[str] = None
+    created_at: Optional[datetime] = None
+    triggered_at: Optional[datetime] = None
+    triggered_price: Optional[float] = None
+
+    class Config:
+        from_attributes = True
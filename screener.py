@@ -0,0 +1,492 @@
+"""
+KRX market screener.
+
+Keeps one columnar snapshot of every KRX listing (price, change, volume,
+market cap, PER/PBR/EPS/BPS/dividend yield, 20/60-day momentum) as NumPy
+arrays. Filter and sort expressions are parsed once into small closures
+over those arrays, so a query over the whole universe is a handful of
+vectorized ops plus an argpartition for the requested page.
+
+Daily all-stock tables come from the KRX data portal (one request per
+trading day); FDR's StockListing is the fallback for the latest day.
+"""
+import ast
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+import executors
+import metrics
+
+logger = logging.getLogger(__name__)
+
+KRX_DATA_URL = "http://data.krx.co.kr/comm/bldAttendant/getJsonData.cmd"
+KRX_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Referer": "http://data.krx.co.kr/contents/MDC/MDI/mdiLoader/index.cmd",
+}
+BLD_DAILY_PRICES = "dbms/MDC/STAT/standard/MDCSTAT01501"
+BLD_FUNDAMENTALS = "dbms/MDC/STAT/standard/MDCSTAT03501"
+
+SCREENER_TTL = int(os.getenv("SCREENER_TTL", "600"))  # seconds before the snapshot is refreshed
+MOMENTUM_WINDOWS = (20, 60)
+HISTORY_DAYS = max(MOMENTUM_WINDOWS) + 1
+HISTORY_FETCH_WORKERS = 4
+MAX_EXPRESSION_LENGTH = 500
+MAX_PAGE_SIZE = 500
+
+DEFAULT_FIELDS = ["code", "name", "market", "close", "change_pct", "volume", "market_cap", "per", "pbr", "momentum_20d"]
+
+SCREENER_CACHE = {
+    "universe": None,  # Universe
+    "history": {},     # "YYYY-MM-DD" -> (codes, closes) for the momentum window
+    "loaded_at": 0.0,
+    "lock": None,
+    "refresh_task": None,
+}
+
+class ScreenerError(ValueError):
+    pass
+
+class UniverseUnavailableError(RuntimeError):
+    # Listings could not be loaded (KRX down, first load failed): not the caller's fault
+    pass
+
+class Universe:
+    """
+    One row per listing; every column is a NumPy array of the same length.
+    Text columns are fixed-width unicode, numeric ones float64 (NaN = unknown).
+    """
+    TEXT_COLUMNS = ("code", "name", "market")
+
+    def __init__(self, as_of: str, columns: dict):
+        self.as_of = as_of
+        self.columns = columns
+        self.size = len(columns["code"])
+        self._positions = None # code -> row, built on first lookup
+
+    def lookup(self, code: str):
+        """
+        One listing as a dict (all columns), or None.
+        """
+        if self._positions is None:
+            self._positions = {c: i for i, c in enumerate(self.columns["code"].tolist())}
+        i = self._positions.get(code)
+        return None if i is None else self.rows(np.array([i]), list(self.columns))[0]
+
+    def rows(self, index, fields):
+        out = []
+        cols = [(f, self.columns[f][index].tolist()) for f in fields]
+        for i in range(len(index)):
+            row = {}
+            for f, values in cols:
+                v = values[i]
+                row[f] = None if isinstance(v, float) and v != v else v
+            out.append(row)
+        return out
+
+# 1. Loading
+def _to_float(values):
+    import pandas as pd # only needed on (background) loads; keeps app startup light
+
+    return pd.to_numeric(pd.Series(values, dtype="object").astype(str).str.replace(",", "", regex=False), errors="coerce").to_numpy(dtype="float64")
+
+def _krx_table(bld: str, trade_date: str, **params):
+    """
+    All-stock table for one trading day (YYYYMMDD) from the KRX data portal, or [] on holidays.
+    """
+    import requests # only needed on (background) loads, like pandas
+
+    data = {"bld": bld, "mktId": "ALL", "trdDd": trade_date, "share": "1", "money": "1", "csvxls_isNo": "false", **params}
+    with metrics.upstream("krx_data", bld.rsplit("/", 1)[-1]) as call:
+        res = call.response(requests.post(KRX_DATA_URL, data=data, headers=KRX_HEADERS, timeout=10))
+        res.raise_for_status()
+    payload = res.json()
+    rows = payload.get("OutBlock_1") or payload.get("output") or []
+    # Non-trading days come back as rows with "-" prices
+    return [r for r in rows if r.get("TDD_CLSPRC", "0") not in ("-", "")]
+
+def _fetch_daily(day: datetime):
+    rows = _krx_table(BLD_DAILY_PRICES, day.strftime("%Y%m%d"))
+    if not rows:
+        return None
+    return {
+        "code": np.array([r["ISU_SRT_CD"] for r in rows]),
+        "name": np.array([r.get("ISU_ABBRV", "") for r in rows]),
+        "market": np.array([r.get("MKT_NM", "") for r in rows]),
+        "close": _to_float([r.get("TDD_CLSPRC") for r in rows]),
+        "change_pct": _to_float([r.get("FLUC_RT") for r in rows]),
+        "volume": _to_float([r.get("ACC_TRDVOL") for r in rows]),
+        "amount": _to_float([r.get("ACC_TRDVAL") for r in rows]),
+        "market_cap": _to_float([r.get("MKTCAP") for r in rows]),
+        "shares": _to_float([r.get("LIST_SHRS") for r in rows]),
+    }
+
+def _fetch_listing_fdr():
+    import FinanceDataReader as fdr
+
+    with metrics.upstream("fdr", "stock_listing"):
+        df = fdr.StockListing("KRX")
+    def col(name):
+        return df[name].to_numpy() if name in df.columns else np.full(len(df), np.nan)
+    return {
+        "code": df["Code"].astype(str).str.zfill(6).to_numpy().astype(str),
+        "name": df["Name"].astype(str).to_numpy().astype(str),
+        "market": df["Market"].astype(str).to_numpy().astype(str) if "Market" in df.columns else np.full(len(df), ""),
+        "close": _to_float(col("Close")),
+        "change_pct": _to_float(col("ChagesRatio") if "ChagesRatio" in df.columns else col("ChangesRatio")),
+        "volume": _to_float(col("Volume")),
+        "amount": _to_float(col("Amount")),
+        "market_cap": _to_float(col("Marcap")),
+        "shares": _to_float(col("Stocks")),
+    }
+
+def _fetch_fundamentals(day: datetime):
+    rows = _krx_table(BLD_FUNDAMENTALS, day.strftime("%Y%m%d"), searchType="1")
+    return {
+        "code": np.array([r["ISU_SRT_CD"] for r in rows]),
+        "eps": _to_float([r.get("EPS") for r in rows]),
+        "per": _to_float([r.get("PER") for r in rows]),
+        "bps": _to_float([r.get("BPS") for r in rows]),
+        "pbr": _to_float([r.get("PBR") for r in rows]),
+        "dps": _to_float([r.get("DPS") for r in rows]),
+        "div_yield": _to_float([r.get("DVD_YLD") for r in rows]),
+    }
+
+def _align(codes: np.ndarray, other_codes: np.ndarray, values: np.ndarray):
+    """
+    values (keyed by other_codes) re-ordered onto codes; NaN where missing.
+    """
+    out = np.full(len(codes), np.nan)
+    if not len(other_codes):
+        return out
+    order = np.argsort(other_codes)
+    sorted_codes = other_codes[order]
+    pos = np.clip(np.searchsorted(sorted_codes, codes), 0, len(sorted_codes) - 1)
+    found = sorted_codes[pos] == codes
+    out[found] = values[order][pos[found]]
+    return out
+
+def _update_history(latest_day: datetime, latest: dict):
+    """
+    Keep HISTORY_DAYS trading days of closes; only missing days are fetched.
+    """
+    history = SCREENER_CACHE["history"]
+    history[latest_day.strftime("%Y-%m-%d")] = (latest["code"], latest["close"])
+
+    # Calendar days to look at: trading days are ~5/7 of them, plus holidays
+    candidates = [latest_day - timedelta(days=i) for i in range(1, int(HISTORY_DAYS * 1.6) + 10)]
+    missing = [d for d in candidates if d.strftime("%Y-%m-%d") not in history and d.weekday() < 5]
+    known_trading = sum(1 for d in candidates if history.get(d.strftime("%Y-%m-%d")))
+    if known_trading < HISTORY_DAYS - 1 and missing:
+        def fetch(day):
+            try:
+                return day, _fetch_daily(day)
+            except Exception as e:
+                logger.warning(f"[WARN] KRX history fetch failed for {day:%Y-%m-%d}: {e}")
+                return day, False
+        with ThreadPoolExecutor(HISTORY_FETCH_WORKERS) as pool:
+            for day, table in pool.map(fetch, missing):
+                if table is not False:
+                    # None marks a holiday so it is not asked for again
+                    history[day.strftime("%Y-%m-%d")] = table and (table["code"], table["close"])
+
+    trading_days = [key for key in sorted(history) if history[key]]
+    cutoff = trading_days[-HISTORY_DAYS] if len(trading_days) >= HISTORY_DAYS else None
+    for key in [k for k in history if cutoff and k < cutoff]:
+        del history[key]
+
+def load_universe():
+    """
+    Blocking: build a fresh Universe (run in an executor).
+    """
+    latest, latest_day = None, datetime.now()
+    for back in range(10):
+        day = datetime.now() - timedelta(days=back)
+        if day.weekday() >= 5:
+            continue
+        try:
+            latest = _fetch_daily(day)
+        except Exception as e:
+            logger.warning(f"[WARN] KRX daily table failed for {day:%Y-%m-%d}: {e}")
+            break
+        if latest:
+            latest_day = day
+            break
+
+    if latest:
+        _update_history(latest_day, latest)
+    else:
+        logger.info("[INFO] Screener falling back to FDR StockListing (no momentum history).")
+        latest = _fetch_listing_fdr()
+
+    columns = dict(latest)
+    codes = columns["code"]
+
+    try:
+        fundamentals = _fetch_fundamentals(latest_day)
+        for field in ("eps", "per", "bps", "pbr", "dps", "div_yield"):
+            columns[field] = _align(codes, fundamentals["code"], fundamentals[field])
+    except Exception as e:
+        logger.warning(f"[WARN] KRX fundamentals failed: {e}")
+        for field in ("eps", "per", "bps", "pbr", "dps", "div_yield"):
+            columns[field] = np.full(len(codes), np.nan)
+
+    days = [key for key in sorted(SCREENER_CACHE["history"]) if SCREENER_CACHE["history"][key]]
+    for w in MOMENTUM_WINDOWS:
+        if len(days) > w:
+            past_codes, past_closes = SCREENER_CACHE["history"][days[-w - 1]]
+            past = _align(codes, past_codes, past_closes)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                columns[f"momentum_{w}d"] = (columns["close"] / past - 1.0) * 100
+        else:
+            columns[f"momentum_{w}d"] = np.full(len(codes), np.nan)
+
+    return Universe(latest_day.strftime("%Y-%m-%d"), columns)
+
+async def _share_names(universe: Universe):
+    """
+    Seed the search cache with the listing's code <-> name pairs, on the loop and
+    under the KRX lock; names survive a failed KIND download. The KIND master list
+    is still loaded (and marked loaded) by stock_data_provider only.
+    """
+    import stock_data_provider as data_service
+
+    cache = data_service.KRX_CACHE
+    if cache["lock"] is None:
+        cache["lock"] = asyncio.Lock()
+    if cache["loaded"] or cache["lock"].locked():
+        return # filled, or being filled, from the master list
+    async with cache["lock"]:
+        for code, name in zip(universe.columns["code"].tolist(), universe.columns["name"].tolist()):
+            cache["name_map"].setdefault(name, code)
+            cache["code_map"].setdefault(code, name)
+
+async def _refresh():
+    if SCREENER_CACHE["lock"] is None:
+        SCREENER_CACHE["lock"] = asyncio.Lock()
+    async with SCREENER_CACHE["lock"]:
+        if SCREENER_CACHE["universe"] is not None and time.time() - SCREENER_CACHE["loaded_at"] < SCREENER_TTL:
+            return SCREENER_CACHE["universe"]
+        try:
+            universe = await executors.run("scrape", load_universe)
+        except Exception as e:
+            logger.error(f"[ERROR] Screener universe load failed: {e}")
+            return SCREENER_CACHE["universe"]
+        SCREENER_CACHE["universe"] = universe
+        SCREENER_CACHE["loaded_at"] = time.time()
+        await _share_names(universe)
+        logger.info(f"[INFO] Screener universe loaded: {universe.size} listings as of {universe.as_of}")
+        return universe
+
+async def get_universe():
+    """
+    Current snapshot; a stale one is served while a refresh runs in the background.
+    """
+    universe = SCREENER_CACHE["universe"]
+    metrics.cache("screener_universe", universe is not None)
+    if universe is None:
+        return await _refresh()
+    if time.time() - SCREENER_CACHE["loaded_at"] >= SCREENER_TTL:
+        task = SCREENER_CACHE["refresh_task"]
+        if task is None or task.done():
+            SCREENER_CACHE["refresh_task"] = asyncio.get_running_loop().create_task(_refresh())
+    return universe
+
+def universe_version():
+    """
+    Load time of the snapshot screen() would query as is; None when it would (re)load.
+    """
+    if SCREENER_CACHE["universe"] is None or time.time() - SCREENER_CACHE["loaded_at"] >= SCREENER_TTL:
+        return None
+    return SCREENER_CACHE["loaded_at"]
+
+# 2. Expressions
+_COMPARE = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal,
+    ast.Eq: np.equal, ast.NotEq: np.not_equal,
+}
+_ARITH = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+_FUNCTIONS = {"abs": np.abs, "log": np.log}
+
+def _compile(node):
+    """
+    AST -> fn(columns) returning an array or scalar. Anything outside the
+    small whitelist (attributes, subscripts, arbitrary calls...) is rejected.
+    """
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)) and not isinstance(node.value, bool):
+        value = node.value
+        return lambda cols: value
+    if isinstance(node, ast.Name):
+        name = node.id.lower()
+        def column(cols):
+            if name not in cols:
+                raise ScreenerError(f"Unknown field: {node.id}")
+            return cols[name]
+        return column
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        def boolop(cols):
+            result = parts[0](cols)
+            for part in parts[1:]:
+                result = combine(result, part(cols))
+            return result
+        return boolop
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        operand = _compile(node.operand)
+        op = np.logical_not if isinstance(node.op, ast.Not) else np.negative
+        return lambda cols: op(operand(cols))
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+        left, right, op = _compile(node.left), _compile(node.right), _ARITH[type(node.op)]
+        def binop(cols):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return op(left(cols), right(cols))
+        return binop
+    if isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+        operands = [_compile(node.left)] + [_compile(c) for c in node.comparators]
+        ops = [_COMPARE[type(op)] for op in node.ops]
+        def compare(cols):
+            values = [f(cols) for f in operands]
+            result = True
+            with np.errstate(invalid="ignore"):
+                for op, a, b in zip(ops, values, values[1:]): # chained: a < b < c
+                    result = np.logical_and(result, op(a, b))
+            return result
+        return compare
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and len(node.args) == 1 and not node.keywords:
+        arg, fn = _compile(node.args[0]), _FUNCTIONS[node.func.id]
+        def call(cols):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return fn(arg(cols))
+        return call
+    raise ScreenerError(f"Unsupported expression: {ast.dump(node)[:80]}")
+
+@lru_cache(maxsize=256)
+def compile_expression(expr: str):
+    """
+    "pbr < 1 and market == 'KOSPI' and momentum_20d > 5" -> fn(columns).
+    SQL-ish AND/OR/NOT are accepted as well.
+    """
+    if len(expr) > MAX_EXPRESSION_LENGTH:
+        raise ScreenerError("Expression too long")
+    normalized = " ".join(
+        tok.lower() if tok.upper() in ("AND", "OR", "NOT") else tok for tok in expr.replace("\n", " ").split(" ")
+    )
+    try:
+        tree = ast.parse(normalized, mode="eval")
+    except SyntaxError as e:
+        raise ScreenerError(f"Invalid expression: {e.msg}")
+    return _compile(tree)
+
+@lru_cache(maxsize=256)
+def parse_sort(sort: str):
+    """
+    "momentum_20d desc", "-per", "market, market_cap desc" -> [(fn, descending), ...]
+    """
+    keys = []
+    for part in sort.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        descending = False
+        lowered = part.lower()
+        if lowered.endswith(" desc"):
+            part, descending = part[:-5], True
+        elif lowered.endswith(" asc"):
+            part = part[:-4]
+        elif part.startswith("-"):
+            part, descending = part[1:], True
+        keys.append((compile_expression(part.strip()), descending))
+    return keys
+
+def _rank_key(values: np.ndarray, descending: bool):
+    """
+    Numeric ascending sort key; NaN (or missing text) always sorts last.
+    """
+    if values.dtype.kind in "US":
+        _, values = np.unique(values, return_inverse=True)
+        values = values.astype(np.float64)
+    else:
+        values = values.astype(np.float64, copy=True)
+    if descending:
+        values = -values
+    values[np.isnan(values)] = np.inf
+    return values
+
+def _order(cols: dict, index: np.ndarray, keys, stop: int):
+    if not keys or not len(index):
+        return index
+    if len(keys) == 1:
+        fn, descending = keys[0]
+        values = _rank_key(np.broadcast_to(fn(cols), (len(cols["code"]),))[index], descending)
+        if stop < len(values):
+            # Only the first `stop` rows are needed: everything up to the stop-th value, then sort
+            # that slice. Rows tied at the boundary all stay in, so ties keep universe order like
+            # the full stable sort and consecutive pages neither overlap nor skip rows.
+            boundary = np.partition(values, stop - 1)[stop - 1]
+            top = np.flatnonzero(values <= boundary)
+            return index[top[np.argsort(values[top], kind="stable")][:stop]]
+        return index[np.argsort(values, kind="stable")]
+    # lexsort: last key is the primary one
+    rank_keys = [_rank_key(np.broadcast_to(fn(cols), (len(cols["code"]),))[index], d) for fn, d in reversed(keys)]
+    return index[np.lexsort(rank_keys)]
+
+# 3. Queries
+def run_query(universe: Universe, filter: str = None, sort: str = None, limit: int = 50, offset: int = 0, fields=None):
+    fields = fields or DEFAULT_FIELDS
+    unknown = [f for f in fields if f not in universe.columns]
+    if unknown:
+        raise ScreenerError(f"Unknown field(s): {', '.join(unknown)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    cols = universe.columns
+
+    if filter:
+        condition = compile_expression(filter)
+        try:
+            mask = np.broadcast_to(np.asarray(condition(cols)), (universe.size,))
+        except ScreenerError:
+            raise
+        except Exception as e:
+            # Whitelisted syntax can still mix types: market < 1, name * 3, 'a' * 100
+            raise ScreenerError(f"Cannot evaluate filter {filter!r}: {e}")
+        if mask.dtype != bool:
+            raise ScreenerError("Filter must be a condition (e.g. 'pbr < 1')")
+        index = np.flatnonzero(mask)
+    else:
+        index = np.arange(universe.size)
+
+    keys = parse_sort(sort) if sort else []
+    try:
+        ordered = _order(cols, index, keys, offset + limit)
+    except ScreenerError:
+        raise
+    except Exception as e:
+        raise ScreenerError(f"Cannot sort by {sort!r}: {e}")
+    page = ordered[offset:offset + limit]
+    return {
+        "as_of": universe.as_of,
+        "total": int(len(index)),
+        "offset": offset,
+        "limit": limit,
+        "items": universe.rows(page, fields),
+    }
+
+async def screen(filter: str = None, sort: str = None, limit: int = 50, offset: int = 0, fields=None):
+    universe = await get_universe()
+    if universe is None:
+        raise UniverseUnavailableError("Market universe is not available right now")
+    return run_query(universe, filter, sort, limit, offset, fields)
+
+def list_fields():
+    universe = SCREENER_CACHE["universe"]
+    return sorted(universe.columns) if universe else sorted(DEFAULT_FIELDS)
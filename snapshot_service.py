@@ -0,0 +1,162 @@
+"""
+Watchlist quote snapshots.
+
+Every time the price store merges new bars for a symbol, the symbol's
+snapshot row (last close, previous close, change, sparkline) is recomputed
+from the last few bars only and upserted into `quote_snapshots`. Reading a
+whole watchlist with prices is then a single favorites LEFT JOIN snapshots
+query, independent of how many upstream price endpoints would be involved.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+
+import crud
+import database
+import price_store
+import watchlist_service
+
+logger = logging.getLogger(__name__)
+
+SPARKLINE_POINTS = int(os.getenv("SNAPSHOT_SPARKLINE_POINTS", "30"))
+WARM_CONCURRENCY = int(os.getenv("SNAPSHOT_WARM_CONCURRENCY", "4"))
+
+SNAPSHOT_STATE = {
+    "pending": {},       # (market, code) -> row waiting to be written
+    "flush_task": None,
+    "warming": set(),    # codes with a price fetch in flight
+    "warm_semaphore": None,
+}
+
+def compute_snapshot(series: price_store.PriceSeries):
+    """
+    Snapshot row from the tail of a price series (O(SPARKLINE_POINTS)).
+    """
+    tail_closes = series.close[-(SPARKLINE_POINTS + 1):]
+    tail_dates = series.dates[-(SPARKLINE_POINTS + 1):]
+    valid = ~np.isnan(tail_closes)
+    if not valid.any():
+        return None
+    closes = tail_closes[valid]
+    dates = tail_dates[valid]
+
+    last = float(closes[-1])
+    prev = float(closes[-2]) if len(closes) > 1 else None
+    change = last - prev if prev is not None else None
+    pct_change = (change / prev) * 100 if prev else None
+
+    return {
+        "market": crud.infer_market(series.symbol),
+        "stock_code": series.symbol,
+        "as_of": str(dates[-1]),
+        "last_close": last,
+        "prev_close": prev,
+        "change": change,
+        "pct_change": pct_change,
+        "sparkline": json.dumps([price_store.format_close(c) for c in closes[-SPARKLINE_POINTS:].tolist()]),
+        "updated_at": datetime.now(timezone.utc),
+    }
+
+@price_store.add_listener
+def on_price_update(series: price_store.PriceSeries, start: int):
+    row = compute_snapshot(series)
+    if not row:
+        return
+    SNAPSHOT_STATE["pending"][(row["market"], row["stock_code"])] = row
+    _schedule_flush()
+
+def _schedule_flush():
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return # No loop (scripts): rows stay pending until the next flush
+    task = SNAPSHOT_STATE["flush_task"]
+    if task is None or task.done():
+        SNAPSHOT_STATE["flush_task"] = loop.create_task(flush_pending())
+
+async def flush_pending():
+    # Yield once so updates landing in the same tick are written together;
+    # keep going while updates arrive during the write (they would otherwise wait for the next merge)
+    await asyncio.sleep(0)
+    while SNAPSHOT_STATE["pending"]:
+        rows = list(SNAPSHOT_STATE["pending"].values())
+        SNAPSHOT_STATE["pending"].clear()
+        try:
+            async with database.AsyncSessionLocal() as db:
+                await crud.upsert_quote_snapshots(db, rows)
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to write {len(rows)} quote snapshots: {e}")
+            # Keep them for the next flush; a newer row for the same symbol wins
+            pending = SNAPSHOT_STATE["pending"]
+            for row in rows:
+                pending.setdefault((row["market"], row["stock_code"]), row)
+            return
+
+async def _warm(code: str):
+    import stock_data_provider as data_service
+
+    if SNAPSHOT_STATE["warm_semaphore"] is None:
+        SNAPSHOT_STATE["warm_semaphore"] = asyncio.Semaphore(WARM_CONCURRENCY)
+    try:
+        series = price_store.get_series(code)
+        if series is not None and len(series):
+            on_price_update(series, 0)
+            return
+        async with SNAPSHOT_STATE["warm_semaphore"]:
+            await data_service.get_stock_price(code, "day", None, None)
+    except Exception as e:
+        logger.error(f"[ERROR] Snapshot warm-up failed for {code}: {e}")
+    finally:
+        SNAPSHOT_STATE["warming"].discard(code)
+
+def warm_symbols(codes):
+    """
+    Fetch prices for symbols that have no snapshot yet, in the background.
+    """
+    for code in codes:
+        if code in SNAPSHOT_STATE["warming"]:
+            continue
+        SNAPSHOT_STATE["warming"].add(code)
+        asyncio.get_running_loop().create_task(_warm(code))
+
+def _snapshot_item(fav, snap):
+    item = {
+        "id": fav.id,
+        "market": fav.market,
+        "stock_code": fav.stock_code,
+        "stock_name": fav.stock_name,
+        "as_of": None,
+        "last_close": None,
+        "prev_close": None,
+        "change": None,
+        "pct_change": None,
+        "sparkline": [],
+    }
+    if snap is not None:
+        item.update({
+            "as_of": snap.as_of,
+            "last_close": price_store.format_close(snap.last_close),
+            "prev_close": price_store.format_close(snap.prev_close) if snap.prev_close is not None else None,
+            "change": snap.change,
+            "pct_change": round(snap.pct_change, 2) if snap.pct_change is not None else None,
+            "sparkline": json.loads(snap.sparkline) if snap.sparkline else [],
+        })
+    return item
+
+async def get_watchlist_snapshot(db, user_id: str, watchlist: str):
+    watchlist_id = await watchlist_service.get_watchlist_id(db, user_id, watchlist)
+    if watchlist_id is None:
+        return {"watchlist": watchlist, "items": [], "pending": []}
+
+    rows = await crud.get_watchlist_snapshot(db, watchlist_id)
+    items = [_snapshot_item(fav, snap) for fav, snap in rows]
+
+    missing = [item["stock_code"] for item in items if item["as_of"] is None]
+    if missing:
+        warm_symbols(missing)
+
+    return {"watchlist": watchlist, "items": items, "pending": missing}
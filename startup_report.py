@@ -0,0 +1,84 @@
+"""
+Startup timing: where import time and app startup go.
+
+mark()/phase() record named startup steps (main's imports, DB init, alert
+loading). import_breakdown() runs `python -X importtime -c "import <module>"`
+in a fresh interpreter and totals the self time per top-level package, so a
+heavy SDK creeping back into the import path shows up at the top.
+
+CLI: python startup_report.py [module] [--top N]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+STARTUP = {
+    "started": time.perf_counter(), # ~ interpreter start for the importing process
+    "phases": OrderedDict(),        # name -> ms
+}
+
+_IMPORTTIME = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+def mark(name: str, since: float):
+    STARTUP["phases"][name] = round((time.perf_counter() - since) * 1000, 1)
+
+@contextmanager
+def phase(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        mark(name, started)
+
+def report():
+    return {
+        "uptime_s": round(time.perf_counter() - STARTUP["started"], 1),
+        "phases_ms": dict(STARTUP["phases"]),
+    }
+
+def import_breakdown(module: str = "main", top: int = 20):
+    """
+    Blocking: import `module` in a child interpreter and summarize -X importtime.
+    """
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, timeout=120,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    packages = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = int(m.group(1)), int(m.group(2)), m.group(3), m.group(4)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+        if name == module and len(indent) <= 1:
+            total_us = cumulative_us
+    ranked = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "import_ms": round(total_us / 1000, 1),
+        "wall_ms": round((time.perf_counter() - started) * 1000, 1),
+        "packages": [{"package": p, "self_ms": round(us / 1000, 1)} for p, us in ranked],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time breakdown per top-level package")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    result = import_breakdown(args.module, args.top)
+    print(f"import {result['module']}: {result['import_ms']} ms (child process {result['wall_ms']} ms)"
+          + ("" if result["ok"] else "  [import FAILED]"))
+    for row in result["packages"]:
+        print(f"  {row['self_ms']:>9.1f} ms  {row['package']}")
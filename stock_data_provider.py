@@ -1,58 +1,108 @@
-import FinanceDataReader as fdr
-import pandas as pd
 from datetime import datetime, timedelta
 import asyncio
-import httpx
 import os
-import requests
+import time
 from urllib.parse import unquote
+from io import BytesIO
+
+import price_store
+import indicators
+import index_service
+import metrics
+import executors
+import data_providers
+import adjustments
 
 import logging
 
-# Configure Logging (Writes to stderr by default, safe for MCP)
-logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+# Configure Logging (Writes to stderr by default, safe for MCP). Hot paths log at DEBUG with
+# lazy %-args, so nothing is formatted unless LOG_LEVEL=DEBUG.
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='[%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 
-# DEBUG PRINT TO CONFIRM LOAD
-logger.info("!!! LOADING STOCK_DATA_PROVIDER.PY - HYBRID (PUBLIC DATA + FDR) !!!")
+
+# Upstream endpoints (module-level so the offline benchmarks can point them at a stub server)
+KRX_LIST_URL = "http://kind.krx.co.kr/corpgeneral/corpList.do?method=download&searchType=13"
+YAHOO_SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"
+PUBLIC_DATA_URL = "https://apis.data.go.kr/1160100/service/GetStockSecuritiesInfoService/getStockPriceInfo"
+
+PRICE_FRESH_SECONDS = int(os.getenv("PRICE_FRESH_SECONDS", "300")) # cached bars are served without refetching for this long
+
+# code -> {"at": fetch time, "start": first date fetched, "default_start": first date of the
+# provider's default window, when one was asked for}; lets range reads skip the upstream
+PRICE_FETCH_LOG = {}
 
 KRX_CACHE = {
     "name_map": {}, # Name -> Code
     "code_map": {}, # Code -> Name
-    "loaded": False
+    "loaded": False,
+    "lock": None,
 }
 
+def download_krx_list():
+    import requests # deferred: requests/httpx cost ~0.2s of `import main` together
+
+    # Fetched as bytes: read_html(url) decodes URLs as UTF-8 regardless of encoding= on recent pandas
+    with metrics.upstream("krx_kind", "master_list") as call:
+        res = call.response(requests.get(KRX_LIST_URL, timeout=10))
+        res.raise_for_status()
+    return res.content
+
+def parse_krx_list(content: bytes):
+    """
+    KRX master list HTML -> [(name, code)]. CPU-bound (~1s); runs in the "cpu" process pool.
+    """
+    import pandas as pd
+
+    # Explicit encoding for Korean Windows site
+    df = pd.read_html(BytesIO(content), header=0, encoding='euc-kr')[0]
+    codes = df['종목코드'].astype(str).str.zfill(6)
+    return list(zip(df['회사명'].tolist(), codes.tolist()))
+
+def _fill_krx_cache(rows):
+    for name, code in rows:
+        KRX_CACHE["name_map"][name] = code
+        KRX_CACHE["code_map"][code] = name
+    KRX_CACHE["loaded"] = True
+    logger.info(f"[INFO] Loaded {len(rows)} Korean stocks.")
+
 def load_krx_data():
+    """
+    Blocking load, for scripts; the API uses ensure_krx_data().
+    """
     if KRX_CACHE["loaded"]:
         return
-
-    logger.info("[DEBUG] Loading KRX Master List...")
     try:
-        url = "http://kind.krx.co.kr/corpgeneral/corpList.do?method=download&searchType=13"
-        # Explicit encoding for Korean Windows site
-        dfs = pd.read_html(url, header=0, encoding='euc-kr') 
-        df = dfs[0]
-        
-        # Clean up
-        df = df[['회사명', '종목코드']]
-        df = df.rename(columns={'회사명': 'name', '종목코드': 'code'})
-        df['code'] = df['code'].astype(str).str.zfill(6)
-        
-        for _, row in df.iterrows():
-            KRX_CACHE["name_map"][row['name']] = row['code']
-            KRX_CACHE["code_map"][row['code']] = row['name']
-            
-        KRX_CACHE["loaded"] = True
-        logger.info(f"[DEBUG] Loaded {len(df)} Korean stocks.")
+        _fill_krx_cache(parse_krx_list(download_krx_list()))
     except Exception as e:
-        logger.info(f"[ERROR] Failed to load KRX data: {e}")
+        logger.error(f"[ERROR] Failed to load KRX data: {e}")
+
+async def ensure_krx_data():
+    """
+    Load the master list once, off the event loop: download on "scrape", parse on "cpu".
+    """
+    if KRX_CACHE["loaded"]:
+        return
+    if KRX_CACHE["lock"] is None:
+        KRX_CACHE["lock"] = asyncio.Lock()
+    async with KRX_CACHE["lock"]:
+        if KRX_CACHE["loaded"]:
+            return
+        logger.debug("[DEBUG] Loading KRX Master List...")
+        try:
+            content = await executors.run("scrape", download_krx_list)
+            _fill_krx_cache(await executors.run("cpu", parse_krx_list, content))
+        except executors.PoolSaturatedError:
+            raise
+        except Exception as e:
+            logger.error(f"[ERROR] Failed to load KRX data: {e}")
 
 async def search_stock(query: str):
-    logger.info(f"[DEBUG] Searching stock for: {query}")
+    import httpx
+
+    logger.debug("[DEBUG] Searching stock for: %s", query)
     
-    # Ensure data is loaded (blocking call ok for first time/cache)
-    if not KRX_CACHE["loaded"]:
-        load_krx_data()
+    await ensure_krx_data()
         
     results = []
     query = query.strip()
@@ -72,7 +122,7 @@ async def search_stock(query: str):
             })
             
     # 2. Search Yahoo Finance Global (for US/Global stocks)
-    yahoo_url = "https://query2.finance.yahoo.com/v1/finance/search"
+    yahoo_url = YAHOO_SEARCH_URL
     params = {
         "q": query,
         "quotesCount": 6,
@@ -84,7 +134,8 @@ async def search_stock(query: str):
     
     try:
         async with httpx.AsyncClient() as client:
-            res = await client.get(yahoo_url, params=params, headers=headers)
+            with metrics.upstream("yahoo", "search") as call:
+                res = call.response(await client.get(yahoo_url, params=params, headers=headers))
             if res.status_code == 200:
                 y_data = res.json()
                 quotes = y_data.get("quotes", [])
@@ -112,7 +163,7 @@ async def search_stock(query: str):
                         "score": 8 if symbol.lower() == query.lower() else 3
                     })
     except Exception as e:
-        logger.info(f"[ERROR] Yahoo Search failed: {e}")
+        logger.error(f"[ERROR] Yahoo Search failed: {e}")
             
     # Sort by relevance
     results.sort(key=lambda x: x["score"], reverse=True)
@@ -123,19 +174,22 @@ async def search_stock(query: str):
     
     return results
 
-def fetch_public_data(code: str, start_date: str, end_date: str):
+def fetch_public_data(code: str, start_date: str, end_date: str, raise_errors: bool = False):
     """
     Fetch from Public Data Portal (data.go.kr)
+    raise_errors: re-raise transport/HTTP failures (the provider router counts them) instead of returning None.
     """
+    import requests
+
     api_key = os.getenv("DATA_GO_KR_API_KEY")
     if not api_key:
-        logger.info("[DEBUG] No Public Data API Key found.")
+        logger.debug("[DEBUG] No Public Data API Key found.")
         return None
 
     # Handle URL encoding of key if needed
     decoded_key = unquote(api_key) 
     
-    url = "https://apis.data.go.kr/1160100/service/GetStockSecuritiesInfoService/getStockPriceInfo"
+    url = PUBLIC_DATA_URL
     
     # Dates for API are typically YYYYMMDD
     # Input start_date is YYYY-MM-DD
@@ -154,24 +208,28 @@ def fetch_public_data(code: str, start_date: str, end_date: str):
     if s_date: params["beginBasDt"] = s_date
     if e_date: params["endBasDt"] = e_date
 
-    logger.info(f"[DEBUG] Public API fetching for {code}...")
+    logger.debug("[DEBUG] Public API fetching for %s", code)
     try:
-        res = requests.get(url, params=params, timeout=5)
+        with metrics.upstream("data_go_kr", "daily_bars") as call:
+            res = call.response(requests.get(url, params=params, timeout=5))
         if res.status_code != 200:
-            logger.info(f"[ERROR] Public API Status: {res.status_code}")
+            logger.error(f"[ERROR] Public API Status: {res.status_code}")
+            if raise_errors:
+                res.raise_for_status()
+                raise RuntimeError(f"Public API status {res.status_code}")
             return None
             
         data = res.json()
         items = data.get("response", {}).get("body", {}).get("items", {}).get("item", [])
         
         if not items:
-            logger.info("[DEBUG] Public API returned no items.")
+            logger.debug("[DEBUG] Public API returned no items.")
             return None
             
         # Parse items
         parsed_data = []
         for item in items:
-            # item fields: basDt (20240120), clpr (74000)
+            # item fields: basDt (20240120), clpr (74000), mkp/hipr/lopr (open/high/low), trqu (volume)
             d_str = item.get("basDt")
             close_val = item.get("clpr")
             
@@ -179,127 +237,163 @@ def fetch_public_data(code: str, start_date: str, end_date: str):
                 fmt_date = f"{d_str[:4]}-{d_str[4:6]}-{d_str[6:]}"
                 parsed_data.append({
                     "date": fmt_date,
-                    "close": int(close_val)
+                    "close": int(close_val),
+                    "open": float(item.get("mkp") or "nan"),
+                    "high": float(item.get("hipr") or "nan"),
+                    "low": float(item.get("lopr") or "nan"),
+                    "volume": float(item.get("trqu") or "nan")
                 })
         
         # Sort by date ascending
         parsed_data.sort(key=lambda x: x["date"])
-        logger.info(f"[DEBUG] Public API success. {len(parsed_data)} points.")
+        logger.debug("[DEBUG] Public API success. %d points.", len(parsed_data))
         return parsed_data
         
     except Exception as e:
-        logger.info(f"[ERROR] Public API fetch exception: {e}")
+        logger.error(f"[ERROR] Public API fetch exception: {e}")
+        if raise_errors:
+            raise
         return None
 
-async def get_stock_price(code: str, timeframe: str = "day", start_date: str = None, end_date: str = None):
-    logger.info(f"[DEBUG] get_stock_price called via HYBRID PROVIDER. Code: {code}")
-    
-    if not KRX_CACHE["loaded"]:
-        load_krx_data()
-        
+def store_fdr_frame(code: str, df, date_col: str, name: str):
+    """
+    Feed an FDR frame (already reset_index()'ed) into the local price store.
+    """
+    try:
+        price_store.merge_bars(code, data_providers.frame_to_bars(df, date_col), name)
+    except Exception as e:
+        logger.error(f"[ERROR] Failed to store FDR bars for {code}: {e}")
+
+def _resolve_start(code: str, start_date: str = None):
+    # No start_date means the provider's default window: the one it returned last time
+    if start_date:
+        return start_date
+    logged = PRICE_FETCH_LOG.get(code)
+    return logged.get("default_start") if logged else None
+
+def price_version(code: str, start_date: str = None):
+    """
+    Version of what get_stock_price(code, start_date=...) serves from the price
+    store without going upstream, or None when it would fetch. HTTP ETags derive from it.
+    """
+    series = price_store.get_series(code)
+    logged = PRICE_FETCH_LOG.get(code)
+    start_date = _resolve_start(code, start_date)
+    if (not start_date or series is None or not len(series) or logged is None
+            or time.time() - logged["at"] >= PRICE_FRESH_SECONDS or logged["start"] > start_date):
+        return None
+    raw = adjustments.ADJUSTMENT_STATE["raw"].get(code)
+    factors = adjustments.ADJUSTMENT_STATE["factors"].get(code)
+    return (series.version, len(raw) if raw is not None else 0, len(factors) if factors is not None else 0,
+            KRX_CACHE["code_map"].get(code, code), start_date)
+
+async def get_stock_price(code: str, timeframe: str = "day", start_date: str = None, end_date: str = None, adjusted: bool = True):
+    """
+    Daily closes from the healthiest provider covering the market (see data_providers),
+    stored through the corporate-action layer. adjusted=False serves raw closes.
+    Ranges the store was filled for within PRICE_FRESH_SECONDS are served from it.
+    """
+    await ensure_krx_data()
+
     stock_name = KRX_CACHE["code_map"].get(code, code)
-    is_krx_code = code.isdigit() and len(code) == 6
-    
-    data = []
-    
-    # --- STRATEGY 1: Public Data Portal (Only for Korean Stocks) ---
-    if is_krx_code:
-        # Default dates if missing
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d")
-        if not end_date:
-            end_date = datetime.now().strftime("%Y-%m-%d")
-
-        # Run in executor to avoid blocking async loop since requests is sync
-        loop = asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: fetch_public_data(code, start_date, end_date))
-        
-        if data:
-            logger.info(f"[DEBUG] Data provided by Public Data Portal.")
-            return {"name": stock_name, "data": data}
-        else:
-            logger.info(f"[WARN] Public Data Portal failed/empty. Falling back to FinanceDataReader.")
-            data = [] # Reset for fallback
-
-    # --- STRATEGY 2: FinanceDataReader (Fallback for KRX, Primary for US) ---
+    market = "KR" if code.isdigit() and len(code) == 6 else "US"
+
+    if price_version(code, start_date) is not None:
+        start = _resolve_start(code, start_date)
+        if not adjusted:
+            return {"name": stock_name, "data": adjustments.raw_records(code, start, end_date)}
+        return {"name": stock_name, "data": price_store.get_series(code).to_records(start, end_date)}
+
+    bars, provider = await data_providers.ROUTER.fetch(code, market, start_date, end_date)
+    if bars is None:
+        logger.warning(f"[WARN] No provider returned data for {code}")
+        return {"name": stock_name + " (No Data)", "data": []}
+
     try:
-        # FDR requires dates in YYYY-MM-DD
-        s_d = start_date if start_date else "2023-01-01"
-        e_d = end_date if end_date else datetime.now().strftime("%Y-%m-%d")
-        
-        loop = asyncio.get_event_loop()
-        
-        # Determine symbol for FDR
-        # For KRX: '005930' (FDR handles suffixes auto for Korea if just digits?) 
-        # Actually FDR works best with '005930' (Naver) or 'KRX:005930'
-        # For US: 'AAPL', 'RDW'
-        
-        fdr_symbol = code
-        # No change needed usually for FDR if code is standard
-        
-        def fetch_fdr(sym, start, end):
-            # FDR returns a DataFrame
-            df = fdr.DataReader(sym, start, end)
-            return df
-            
-        df = await loop.run_in_executor(None, lambda: fetch_fdr(fdr_symbol, s_d, e_d))
-        
-        if not df.empty:
-            # reset_index moves 'Date' (or 'index') to a column
-            df = df.reset_index()
-            
-            # Identify the date column and close column
-            date_col = 'Date' if 'Date' in df.columns else ('index' if 'index' in df.columns else df.columns[0])
-            close_col = 'Close'
-            
-            for index, row in df.iterrows():
-                try:
-                    d_val = row[date_col]
-                    
-                    # Convert Timestamp to string
-                    d_str = ""
-                    if isinstance(d_val, (pd.Timestamp, datetime)):
-                        d_str = d_val.strftime("%Y-%m-%d")
-                    else:
-                        d_str = str(d_val)[:10] # Handle string dates if any
-                    
-                    close_val = row[close_col]
-                    
-                    # Formatting check
-                    final_close = 0
-                    if hasattr(close_val, 'item'): close_val = close_val.item() # Handle numpy types
-                    
-                    if pd.isna(close_val): continue
-                    
-                    if isinstance(close_val, float):
-                         final_close = int(close_val) if close_val > 5000 else round(close_val, 2)
-                    else:
-                         final_close = int(close_val)
-                    
-                    data.append({
-                        "date": d_str,
-                        "close": final_close
-                    })
-                except Exception as e:
-                    # print(f"[DEBUG] Row parsing error: {e}")
-                    continue
-                    
-            logger.info(f"[DEBUG] FDR Success. {len(data)} points.")
-            
-            return {
-                "name": stock_name, 
-                "data": data
-            }
-            
+        series, _ = adjustments.ingest(code, bars, provider.adjusted, stock_name)
     except Exception as e:
-        logger.info(f"[ERROR] FDR failed: {e}")
+        logger.error(f"[ERROR] Failed to store {provider.name} bars for {code}: {e}")
+        return {"name": stock_name + " (No Data)", "data": []}
 
-    return {
-        "name": stock_name + " (No Data)",
-        "data": []
-    }
+    default_window = not start_date
+    if default_window:
+        # Same window the provider returned (the store may hold a longer history)
+        dates = bars["date"] if isinstance(bars, dict) else [b["date"] for b in bars]
+        start_date = str(min(dates))[:10]
+    logged = PRICE_FETCH_LOG.get(code)
+    if end_date is None or end_date >= datetime.now().strftime("%Y-%m-%d"):
+        covered = min(start_date, logged["start"]) if logged else start_date
+        entry = PRICE_FETCH_LOG[code] = {**(logged or {}), "at": time.time(), "start": covered}
+        if default_window:
+            entry["default_start"] = start_date
+    logger.debug("[DEBUG] %s served by %s", code, provider.name)
+    if not adjusted:
+        return {"name": stock_name, "data": adjustments.raw_records(code, start_date, end_date)}
+    return {"name": stock_name, "data": series.to_records(start_date, end_date)}
+
+def indicators_version(code: str):
+    """
+    Version of the series get_indicators reads (None until it has been loaded).
+    """
+    series = price_store.get_series(code)
+    return series.version if series is not None and len(series) else None
+
+async def get_indicators(code: str, points: int = 0):
+    """
+    Technical indicators over the cached daily series (loaded on first use).
+    """
+    series = price_store.get_series(code)
+    if series is None or not len(series):
+        await get_stock_price(code, "day", None, None)
+
+    summary = indicators.summarize(code, points)
+    if summary is None:
+        return {"symbol": code, "error": "No price data"}
+    return summary
+
+async def get_recent_prices(code: str, days: int):
+    """
+    Last `days` daily closes. Served from the price store when it was filled
+    recently enough and reaches back far enough; otherwise fetches only that range.
+    """
+    days = max(1, days)
+    # Trading days -> calendar days, with slack for holidays
+    start_date = (datetime.now() - timedelta(days=days * 7 // 5 + 10)).strftime("%Y-%m-%d")
+    series = price_store.get_series(code)
+    logged = PRICE_FETCH_LOG.get(code)
+    cached = (
+        series is not None and len(series) > 0 and logged is not None
+        and time.time() - logged["at"] < PRICE_FRESH_SECONDS and logged["start"] <= start_date
+    )
+    metrics.cache("price_store", bool(cached))
+    if not cached:
+        result = await get_stock_price(code, "day", start_date, None)
+        series = price_store.get_series(code)
+        if not result["data"] or series is None:
+            return result
+    return {"name": series.name, "data": series.to_records(last=days)}
 
 async def get_financials(code: str):
+    """
+    Valuation fundamentals for KRX listings from the screener's market snapshot
+    (shared cache, refreshed in the background); placeholder values otherwise.
+    """
+    if code.isdigit() and len(code) == 6:
+        import screener
+
+        universe = await screener.get_universe()
+        row = universe.lookup(code) if universe is not None else None
+        if row is not None:
+            return {
+                "per": row.get("per"),
+                "pbr": row.get("pbr"),
+                "eps": row.get("eps"),
+                "bps": row.get("bps"),
+                "dps": row.get("dps"),
+                "div_yield": row.get("div_yield"),
+                "market_cap": row.get("market_cap"),
+                "as_of": universe.as_of,
+            }
     # Mock for now
     return {
         "revenue": "100B",
@@ -311,88 +405,6 @@ async def get_financials(code: str):
 
 async def get_global_market_indices():
     """
-    Fetch global market indices for the dashboard.
+    Fetch global market indices for the dashboard (batched, cached two-bar windows).
     """
-    indices = {
-        "US_10Y": "^TNX",
-        "DXY": "DX-Y.NYB",
-        "USD_KRW": "KRW=X",
-        "VIX": "^VIX",
-        "BTC": "BTC-USD",
-        "ES_F": "ES=F",
-        "NQ_F": "NQ=F",
-        "WTI": "CL=F",
-        "NVDA": "NVDA",
-        "TSLA": "TSLA",
-        "FearGreed": "MOCK_FG",  # Special handle
-        "KoreanCDS": "MOCK_CDS"  # Special handle
-    }
-
-    results = {}
-    
-    # We will fetch only the last 2 days to calculate change
-    loop = asyncio.get_event_loop()
-    
-    def fetch_index(key, symbol):
-        # MOCK DATA FOR MISSING APIs
-        if key == "FearGreed":
-            # Real API harder to find, returning static/random for MVP
-            return key, {
-                "value": 45, 
-                "prev": 48, 
-                "change": -3, 
-                "pct_change": -6.25
-            }
-        if key == "KoreanCDS":
-            return key, {
-                "value": 32.5, 
-                "prev": 32.0, 
-                "change": 0.5, 
-                "pct_change": 1.56
-            }
-
-        try:
-            # Fetch last 5 distinct trading days to be safe
-            df = fdr.DataReader(symbol, (datetime.now() - timedelta(days=10)).strftime("%Y-%m-%d"))
-            if df.empty:
-                return key, None
-                
-            last_row = df.iloc[-1]
-            prev_row = df.iloc[-2] if len(df) > 1 else last_row
-            
-            val = last_row['Close']
-            prev = prev_row['Close']
-
-            # Check for NaN immediately
-            if pd.isna(val) or pd.isna(prev):
-                return key, None
-            
-            # Formatting
-            if key == "US_10Y": val = val # Yahoo returns yield directly (e.g. 4.25)
-            
-            change = val - prev
-            pct_change = (change / prev) * 100 if prev != 0 else 0
-            
-            # Final check for calculated NaNs (e.g. if prev was 0 or something weird)
-            if pd.isna(change) or pd.isna(pct_change):
-                return key, None
-            
-            return key, {
-                "value": float(val), # Ensure native float
-                "prev": float(prev),
-                "change": float(change),
-                "pct_change": float(pct_change)
-            }
-        except Exception as e:
-            logger.info(f"[ERROR] Failed to fetch {key} ({symbol}): {e}")
-            return key, None
-
-    # Run in parallel
-    tasks = [loop.run_in_executor(None, lambda k=k, s=s: fetch_index(k, s)) for k, s in indices.items()]
-    fetched = await asyncio.gather(*tasks)
-    
-    for key, data in fetched:
-        if data:
-            results[key] = data
-            
-    return results
+    return await index_service.get_indices()
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import adjustments
+import price_store
+
+SYMBOL = "999990"
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    price_store.PRICE_STORE["series"].pop(SYMBOL, None)
+    adjustments.ADJUSTMENT_STATE["raw"].pop(SYMBOL, None)
+    adjustments.ADJUSTMENT_STATE["factors"].pop(SYMBOL, None)
+
+def _bars(dates, closes):
+    return [{"date": d, "open": c, "high": c, "low": c, "close": c, "volume": 1000.0} for d, c in zip(dates, closes)]
+
+DATES = ["2024-03-04", "2024-03-05", "2024-03-06", "2024-03-07", "2024-03-08"]
+
+def test_factor_table_cumulative_is_product_of_later_events():
+    table = adjustments.FactorTable()
+    table.add("2024-03-06", 0.5, "split")
+    table.add("2024-03-08", 0.1, "split")
+    dates = np.array(DATES, dtype="datetime64[D]")
+    np.testing.assert_allclose(table.cumulative(dates), [0.05, 0.05, 0.1, 0.1, 1.0])
+
+def test_factor_table_folds_same_ex_date():
+    table = adjustments.FactorTable()
+    table.add("2024-03-06", 0.5, "split")
+    table.add("2024-03-06", 0.5, "bonus")
+    assert len(table) == 1
+    assert table.to_list() == [{"ex_date": "2024-03-06", "factor": 0.25, "kind": "split"}]
+
+def test_record_action_back_adjusts_stored_bars():
+    adjustments.ingest(SYMBOL, _bars(DATES, [100.0, 101.0, 102.0, 103.0, 104.0]), adjusted=True)
+    events = adjustments.record_action(SYMBOL, "2024-03-07", 0.5)
+    assert events == [{"ex_date": "2024-03-07", "factor": 0.5, "kind": "split"}]
+    series = price_store.get_series(SYMBOL)
+    np.testing.assert_allclose(series.close, [50.0, 50.5, 51.0, 103.0, 104.0])
+    np.testing.assert_allclose(series.volume, [2000.0, 2000.0, 2000.0, 1000.0, 1000.0])
+
+def test_record_action_rejects_non_positive_factor():
+    with pytest.raises(ValueError):
+        adjustments.record_action(SYMBOL, "2024-03-07", 0)
+
+def test_raw_split_gap_is_inferred_and_adjusted():
+    # 1:50 split: 2,500,000 -> 50,000 with no adjusted provider ever consulted
+    closes = [2_480_000.0, 2_500_000.0, 50_000.0, 50_500.0, 51_000.0]
+    series, _ = adjustments.ingest(SYMBOL, _bars(DATES, closes), adjusted=False)
+    assert adjustments.get_events(SYMBOL) == [{"ex_date": "2024-03-06", "factor": 0.02, "kind": "inferred_gap"}]
+    np.testing.assert_allclose(series.close, [49_600.0, 50_000.0, 50_000.0, 50_500.0, 51_000.0])
+    # Raw closes are served unchanged
+    assert [r["close"] for r in adjustments.raw_records(SYMBOL)] == [int(c) for c in closes]
+
+def test_raw_split_gap_rescales_previously_stored_bars():
+    adjustments.ingest(SYMBOL, _bars(DATES[:2], [2_480_000.0, 2_500_000.0]), adjusted=False)
+    series, _ = adjustments.ingest(SYMBOL, _bars(DATES[2:], [50_000.0, 50_500.0, 51_000.0]), adjusted=False)
+    np.testing.assert_allclose(series.close, [49_600.0, 50_000.0, 50_000.0, 50_500.0, 51_000.0])
+    # Re-ingesting the same raw bars finds nothing new
+    adjustments.ingest(SYMBOL, _bars(DATES, [2_480_000.0, 2_500_000.0, 50_000.0, 50_500.0, 51_000.0]), adjusted=False)
+    assert len(adjustments.get_events(SYMBOL)) == 1
+
+def test_moves_within_price_limit_are_not_actions():
+    series, _ = adjustments.ingest(SYMBOL, _bars(DATES, [100.0, 129.0, 91.0, 100.0, 72.0]), adjusted=False)
+    assert adjustments.get_events(SYMBOL) == []
+    np.testing.assert_allclose(series.close, [100.0, 129.0, 91.0, 100.0, 72.0])
@@ -0,0 +1,75 @@
+import pytest
+
+import alerts
+from models import ALERT_ABOVE, ALERT_BELOW, ALERT_PCT_DOWN, ALERT_PCT_UP
+
+def _rules(*specs):
+    # (id, direction, repeat, level)
+    rules = alerts.SymbolRules()
+    for alert_id, direction, repeat, level in specs:
+        rules.bucket({"direction": direction, "repeat": repeat}).add(level, alert_id)
+    return rules
+
+def test_one_shot_above_fires_at_or_above_once():
+    rules = _rules((1, ALERT_ABOVE, False, 100.0), (2, ALERT_ABOVE, False, 110.0))
+    assert rules.evaluate(99.0) == []
+    assert rules.evaluate(100.0) == [1]
+    assert rules.evaluate(120.0) == [2]
+    assert rules.evaluate(130.0) == []
+    assert len(rules) == 0
+
+def test_one_shot_below_fires_at_or_below():
+    rules = _rules((1, ALERT_BELOW, False, 90.0), (2, ALERT_BELOW, False, 80.0))
+    assert rules.evaluate(91.0) == []
+    assert sorted(rules.evaluate(80.0)) == [1, 2]
+    assert len(rules) == 0
+
+def test_sources_keep_separate_last_prices():
+    # A stale daily close between two live quotes is not a crossing
+    rules = _rules((1, ALERT_ABOVE, True, 100.0))
+    assert rules.evaluate(105.0, "quote") == []
+    assert rules.evaluate(95.0, "bar") == []
+    assert rules.evaluate(106.0, "quote") == []
+    assert rules.evaluate(101.0, "bar") == [1]
+
+def test_one_shot_fires_on_first_price_without_history():
+    rules = _rules((1, ALERT_ABOVE, False, 100.0))
+    assert rules.last_prices == {}
+    assert rules.evaluate(150.0) == [1]
+
+def test_repeating_fires_on_each_crossing_only():
+    rules = _rules((1, ALERT_ABOVE, True, 100.0), (2, ALERT_BELOW, True, 100.0))
+    assert rules.evaluate(105.0) == [] # no previous price: no crossing yet
+    assert rules.evaluate(95.0) == [2]
+    assert rules.evaluate(94.0) == []
+    assert rules.evaluate(101.0) == [1]
+    assert rules.evaluate(101.0) == []
+    assert len(rules) == 2
+
+def test_repeating_levels_strictly_passed():
+    rules = _rules((1, ALERT_ABOVE, True, 100.0), (2, ALERT_ABOVE, True, 105.0), (3, ALERT_ABOVE, True, 110.0))
+    rules.evaluate(100.0)
+    # From exactly 100: 100 is not passed again, 105 and 110 are
+    assert rules.evaluate(110.0) == [2, 3]
+
+def test_thresholds_remove_matches_id_among_equal_levels():
+    thresholds = alerts.Thresholds()
+    for alert_id in (1, 2, 3):
+        thresholds.add(50.0, alert_id)
+    assert thresholds.remove(50.0, 2)
+    assert thresholds.ids == [1, 3]
+    assert not thresholds.remove(50.0, 2)
+
+@pytest.mark.parametrize("kind, value, reference, level", [
+    (ALERT_ABOVE, 120.0, None, 120.0),
+    (ALERT_BELOW, 80.0, None, 80.0),
+    (ALERT_PCT_UP, 10.0, 200.0, 220.0),
+    (ALERT_PCT_DOWN, 10.0, 200.0, 180.0),
+    (ALERT_PCT_DOWN, -10.0, 200.0, 180.0),
+])
+def test_resolve_level(kind, value, reference, level):
+    assert alerts.resolve_level(kind, value, reference) == pytest.approx(level)
+
+def test_pct_alert_needs_reference():
+    with pytest.raises(ValueError):
+        alerts.resolve_level(ALERT_PCT_UP, 5.0, None)
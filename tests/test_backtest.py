@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import backtest
+
+def _prices(n=300, seed=1):
+    rnd = np.random.default_rng(seed)
+    close = 10_000 * np.exp(np.cumsum(rnd.normal(0, 0.01, n)))
+    return close, close * (1 + rnd.normal(0, 0.002, n))
+
+@pytest.mark.parametrize("rule", list(backtest.RULES))
+def test_rules_default_params(rule):
+    close, open_ = _prices()
+    position, returns, turnover = backtest.simulate(close, open_, rule, {})
+    assert len(position) == len(returns) == len(close)
+    assert set(np.unique(position)) <= {0.0, 1.0}
+    assert np.isfinite(returns).all()
+
+def test_buy_hold_matches_price_change_before_costs():
+    close, open_ = _prices()
+    position, returns, _ = backtest.simulate(close, open_, "buy_hold", {}, fee_bps=0, slippage_bps=0)
+    # Bought at the second bar's open
+    assert np.prod(1 + returns) == pytest.approx(close[-1] / open_[1])
+
+@pytest.mark.parametrize("rule, params", [
+    ("sma_cross", {"fast": "x"}),
+    ("sma_cross", {"fast": 60, "slow": 20}),
+    ("sma_cross", {"fast": 80}),          # default slow is 60
+    ("breakout", {"window": 0}),
+    ("rsi", {"window": 0}),
+    ("rsi", {"window": True}),
+    ("bollinger", {"k": float("nan")}),
+    ("macd_cross", {"length": 5}),
+])
+def test_bad_params_raise_backtest_error(rule, params):
+    close, open_ = _prices()
+    with pytest.raises(backtest.BacktestError):
+        backtest.simulate(close, open_, rule, params)
+
+def test_unknown_rule():
+    close, open_ = _prices()
+    with pytest.raises(backtest.BacktestError):
+        backtest.simulate(close, open_, "nope", {})
+
+def test_sweep_chunk_reports_bad_combo_per_combo():
+    close, open_ = _prices()
+    combos = [{"window": 14}, {"window": 0}, {"window": "x"}]
+    out = backtest._sweep_chunk(close, open_, "rsi", combos, 0, 0)
+    assert "stats" in out[0]
+    assert "error" in out[1] and "error" in out[2]
+
+def test_expand_grid_limit():
+    with pytest.raises(backtest.BacktestError):
+        backtest.expand_grid({"fast": list(range(100)), "slow": list(range(100))})
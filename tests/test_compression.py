@@ -0,0 +1,89 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compression
+import fast_json
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate", "gzip"),
+    ("GZIP", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=0.0, deflate", None),
+    ("gzip;q=0.5", "gzip"),
+    ("identity", None),
+    ("", None),
+    (None, None),
+    ("*", "br" if compression.brotli is not None else "gzip"),
+    ("br", "br" if compression.brotli is not None else None),
+    ("br, gzip", "br" if compression.brotli is not None else "gzip"),
+    ("gzip;q=abc", None),
+])
+def test_negotiate(header, expected):
+    assert compression.negotiate(header) == expected
+
+def _client():
+    app = FastAPI(default_response_class=fast_json.FastJSONResponse)
+    app.add_middleware(compression.CompressionMiddleware, minimum_size=100)
+
+    @app.get("/big")
+    async def big():
+        return {"rows": [{"date": "2026-01-01", "close": 1000}] * 50}
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(3):
+                yield "x" * 200
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/binary")
+    async def binary():
+        return PlainTextResponse("y" * 500, media_type="application/octet-stream")
+
+    return TestClient(app)
+
+def test_large_json_is_gzipped():
+    res = _client().get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["vary"]
+    assert int(res.headers["content-length"]) < len(res.content)
+    assert res.json()["rows"][0]["close"] == 1000
+
+def test_small_and_unaccepted_bodies_pass_through():
+    client = _client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+def test_streaming_and_binary_pass_through():
+    client = _client()
+    res = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in res.headers and res.text == "x" * 600
+    assert "content-encoding" not in client.get("/binary", headers={"Accept-Encoding": "gzip"}).headers
+
+def test_gzip_roundtrip():
+    body = b'{"a": 1}' * 100
+    assert gzip.decompress(compression.compress(body, "gzip")) == body
+
+def test_fast_json_matches_default_encoder():
+    payload = {"name": "삼성전자", "data": [{"date": "2026-01-01", "close": 70000}, {"date": "2026-01-02", "close": 70.5}],
+               "none": None, "flag": True}
+    assert json.loads(fast_json.dumps(payload)) == json.loads(fast_json.dumps_stdlib(payload))
+
+def test_fast_json_numpy_and_fallback():
+    from pydantic import BaseModel
+
+    class Item(BaseModel):
+        code: str
+
+    assert json.loads(fast_json.dumps({"a": np.float64(1.5), "b": np.arange(3), 1: "x"})) == {"a": 1.5, "b": [0, 1, 2], "1": "x"}
+    assert json.loads(fast_json.dumps({"item": Item(code="005930")})) == {"item": {"code": "005930"}}
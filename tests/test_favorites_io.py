@@ -0,0 +1,22 @@
+import pytest
+
+import crud
+import favorites_io
+import schemas
+
+def test_exchange_names_map_to_markets():
+    body = "종목코드,종목명,시장\n5930,삼성전자,코스피\n035720,카카오,KOSDAQ\nAAPL,Apple,nasdaq\nMSFT,Microsoft,\n".encode("cp949")
+    favorites = favorites_io.parse_import(body, "csv")
+    assert [(f.stock_code, f.market) for f in favorites] == [
+        ("005930", "KR"), ("035720", "KR"), ("AAPL", "US"), ("MSFT", None),
+    ]
+
+def test_unknown_market_is_rejected():
+    with pytest.raises(favorites_io.ImportFormatError, match="TSE"):
+        favorites_io.parse_import(b'[{"code": "7203", "market": "TSE"}]', "json")
+
+def test_normalize_favorites_validates_market():
+    rows = crud.normalize_favorites([schemas.FavoriteCreate(stock_code="005930", stock_name="Samsung", market="kospi")])
+    assert rows == [{"market": "KR", "stock_code": "005930", "stock_name": "Samsung"}]
+    with pytest.raises(crud.InvalidMarketError):
+        crud.normalize_favorites([schemas.FavoriteCreate(stock_code="005930", stock_name="Samsung", market="XX")])
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+import http_cache
+
+def _request(**headers):
+    raw = [(k.replace("_", "-").lower().encode(), v.encode()) for k, v in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw, "query_string": b""})
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    http_cache.ENTRIES.clear()
+    http_cache.INFLIGHT.clear()
+    http_cache.BODY_SIZES.clear()
+    yield
+    http_cache.ENTRIES.clear()
+    http_cache.BODY_SIZES.clear()
+
+class Producer:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return self.payload
+
+def _respond(request, name, key, produce, version=None):
+    return asyncio.run(http_cache.respond(request, name, key, produce, version))
+
+def test_versioned_etag_and_304_without_running_handler():
+    produce = Producer({"data": [1, 2, 3]})
+    first = _respond(_request(), "price", "k", produce, lambda: 7)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "public, max-age=60"
+    assert first.headers["etag"] == http_cache.version_etag("k", 7)
+
+    again = _respond(_request(if_none_match=first.headers["etag"]), "price", "k", produce, lambda: 7)
+    assert again.status_code == 304 and again.body == b""
+    assert produce.calls == 1
+
+def test_evicted_entry_still_answers_304_for_current_version():
+    produce = Producer({"x": 1})
+    etag = _respond(_request(), "price", "k", produce, lambda: 3).headers["etag"]
+    http_cache.ENTRIES.clear()
+    assert _respond(_request(if_none_match=etag), "price", "k", produce, lambda: 3).status_code == 304
+    assert produce.calls == 1
+
+@pytest.mark.parametrize("payload,encoded", [({"x": 1}, False), ({"x": "y" * 5000}, True)])
+def test_evicted_304_uses_the_same_encoding_rule(payload, encoded):
+    produce = Producer(payload)
+    first = _respond(_request(accept_encoding="gzip"), "price", "k", produce, lambda: 3)
+    assert ("content-encoding" in first.headers) == encoded
+    http_cache.ENTRIES.clear()
+    res = _respond(_request(if_none_match=first.headers["etag"], accept_encoding="gzip"), "price", "k", produce, lambda: 3)
+    assert res.status_code == 304
+    assert res.headers["etag"] == first.headers["etag"]
+    assert produce.calls == 1
+
+def test_new_version_rerenders():
+    produce = Producer({"x": 1})
+    etag = _respond(_request(), "price", "k", produce, lambda: 1).headers["etag"]
+    res = _respond(_request(if_none_match=etag), "price", "k", produce, lambda: 2)
+    assert res.status_code == 200
+    assert res.headers["etag"] != etag
+    assert produce.calls == 2
+
+def test_unknown_version_is_not_cached():
+    produce = Producer({"x": 1})
+    _respond(_request(), "price", "k", produce, lambda: None)
+    _respond(_request(), "price", "k", produce, lambda: None)
+    assert produce.calls == 2
+    assert "k" not in http_cache.ENTRIES
+
+def test_timed_entry_uses_body_hash_and_expires(monkeypatch):
+    produce = Producer({"reports": ["a"]})
+    res = _respond(_request(), "reports", "r", produce)
+    assert res.headers["etag"] == http_cache.body_etag(res.body)
+    _respond(_request(), "reports", "r", produce)
+    assert produce.calls == 1
+    now = http_cache.time.time()
+    monkeypatch.setattr(http_cache.time, "time", lambda: now + http_cache.POLICIES["reports"]["ttl"] + 1)
+    _respond(_request(), "reports", "r", produce)
+    assert produce.calls == 2
+
+def test_concurrent_misses_share_one_render():
+    produce = Producer({"x": 1})
+
+    async def many():
+        return await asyncio.gather(*(http_cache.respond(_request(), "dashboard", "d", produce) for _ in range(10)))
+
+    responses = asyncio.run(many())
+    assert produce.calls == 1
+    assert {r.headers["etag"] for r in responses} == {responses[0].headers["etag"]}
+
+def test_compressed_variant_gets_suffix_and_matches():
+    produce = Producer({"data": ["x" * 10] * 500})
+    res = _respond(_request(accept_encoding="gzip"), "price", "k", produce, lambda: 1)
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["etag"].endswith('-gzip"')
+    # The compressed tag revalidates the identity variant too
+    again = _respond(_request(if_none_match=res.headers["etag"]), "price", "k", produce, lambda: 1)
+    assert again.status_code == 304
+
+def test_small_bodies_are_not_compressed():
+    res = _respond(_request(accept_encoding="gzip"), "price", "k", Producer({"x": 1}), lambda: 1)
+    assert "content-encoding" not in res.headers
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"zzz", "abc-gzip"', True),
+    ('"abc-br"', True),
+    ("*", True),
+    ('"abcd"', False),
+    ("", False),
+    (None, False),
+])
+def test_etag_matches(header, expected):
+    assert http_cache.etag_matches(header, '"abc"') is expected
+
+def test_lru_is_bounded(monkeypatch):
+    monkeypatch.setattr(http_cache, "HTTP_CACHE_ENTRIES", 3)
+    for i in range(5):
+        _respond(_request(), "price", f"k{i}", Producer({"i": i}), lambda: 1)
+    assert list(http_cache.ENTRIES) == ["k2", "k3", "k4"]
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+import price_store
+
+def _series(n=300, seed=3, symbol="TEST"):
+    rnd = np.random.default_rng(seed)
+    close = np.round(10_000 * np.exp(np.cumsum(rnd.normal(0, 0.015, n))))
+    series = price_store.PriceSeries(symbol)
+    series.dates = np.datetime64("2024-01-01") + np.arange(n).astype("timedelta64[D]")
+    series.close = close
+    series.open = close * (1 + rnd.normal(0, 0.003, n))
+    series.high = np.maximum(series.open, close) * 1.01
+    series.low = np.minimum(series.open, close) * 0.99
+    series.volume = rnd.integers(1_000, 100_000, n).astype(np.float64)
+    return series
+
+def _truncated(series, n):
+    part = price_store.PriceSeries(series.symbol)
+    for field in ("dates", "open", "high", "low", "close", "volume"):
+        setattr(part, field, getattr(series, field)[:n])
+    return part
+
+def test_ewm_matches_pandas():
+    x = np.random.default_rng(0).normal(size=1000)
+    expected = pd.Series(x).ewm(alpha=0.1, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(indicators.ewm(x, 0.1), expected, rtol=1e-9)
+
+def test_ewm_resumes_from_init():
+    x = np.random.default_rng(1).normal(size=300)
+    full = indicators.ewm(x, 0.2)
+    np.testing.assert_allclose(indicators.ewm(x[100:], 0.2, full[99]), full[100:], rtol=1e-9)
+
+def test_rsi_matches_wilder_pandas():
+    series = _series()
+    state = indicators.IndicatorState("TEST").update(series, 0)
+    delta = pd.Series(series.close).diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / indicators.RSI_WINDOW, adjust=False).mean()
+    loss = (-delta).clip(lower=0).ewm(alpha=1 / indicators.RSI_WINDOW, adjust=False).mean()
+    expected = (100 - 100 / (1 + gain / loss)).to_numpy()
+    rsi = state.arrays[f"rsi_{indicators.RSI_WINDOW}"]
+    assert np.isnan(rsi[:indicators.RSI_WINDOW]).all()
+    np.testing.assert_allclose(rsi[indicators.RSI_WINDOW:], expected[indicators.RSI_WINDOW:], rtol=1e-9)
+
+def test_full_series_rsi_matches_state_column():
+    # backtest's RSI rule uses indicators.rsi; it must agree with /indicators
+    series = _series()
+    state = indicators.IndicatorState("TEST").update(series, 0)
+    np.testing.assert_array_equal(indicators.rsi(series.close), state.arrays[f"rsi_{indicators.RSI_WINDOW}"])
+
+@pytest.mark.parametrize("split", [1, 2, 10, 15, 150, 299])
+def test_incremental_equals_full(split):
+    series = _series()
+    full = indicators.IndicatorState("TEST").update(series, 0)
+    state = indicators.IndicatorState("TEST").update(_truncated(series, split), 0)
+    state.update(series, split)
+    assert state.arrays.keys() == full.arrays.keys()
+    for key in full.arrays:
+        np.testing.assert_allclose(state.arrays[key], full.arrays[key], rtol=1e-7, atol=1e-6, equal_nan=True, err_msg=key)
+
+def test_recompute_from_changed_bar():
+    series = _series()
+    state = indicators.IndicatorState("TEST").update(series, 0)
+    series.close = series.close.copy()
+    series.close[200:] *= 1.1
+    state.update(series, 200)
+    full = indicators.IndicatorState("TEST").update(series, 0)
+    for key in full.arrays:
+        np.testing.assert_allclose(state.arrays[key], full.arrays[key], rtol=1e-7, atol=1e-6, equal_nan=True, err_msg=key)
+
+def test_sma_and_bollinger():
+    series = _series()
+    state = indicators.IndicatorState("TEST").update(series, 0)
+    close = pd.Series(series.close)
+    np.testing.assert_allclose(state.arrays["sma_20"], close.rolling(20).mean(), rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(state.arrays["bb_upper"], close.rolling(20).mean() + 2 * close.rolling(20).std(),
+                               rtol=1e-9, equal_nan=True)
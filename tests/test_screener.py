@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import screener
+
+def _universe():
+    return screener.Universe("2026-10-16", {
+        "code": np.array(["005930", "000660", "035420", "068270"]),
+        "name": np.array(["Samsung", "Hynix", "Naver", "Celltrion"]),
+        "market": np.array(["KOSPI", "KOSPI", "KOSPI", "KOSDAQ"]),
+        "close": np.array([70000.0, 180000.0, 200000.0, np.nan]),
+        "change_pct": np.array([1.0, -2.0, 0.5, 0.0]),
+        "volume": np.array([1e7, 3e6, 5e5, 1e6]),
+        "market_cap": np.array([4e14, 1.3e14, 3e13, 2.5e13]),
+        "per": np.array([12.0, np.nan, 25.0, 40.0]),
+        "pbr": np.array([0.9, 1.5, 1.1, 3.0]),
+        "momentum_20d": np.array([5.0, 10.0, -3.0, np.nan]),
+    })
+
+def _codes(result):
+    return [row["code"] for row in result["items"]]
+
+def test_filter_and_sort():
+    result = screener.run_query(_universe(), "pbr < 2 AND market == 'KOSPI'", "momentum_20d desc")
+    assert result["total"] == 3
+    assert _codes(result) == ["000660", "005930", "035420"]
+
+def test_nan_sorts_last_both_directions():
+    assert _codes(screener.run_query(_universe(), None, "per"))[-1] == "000660"
+    assert _codes(screener.run_query(_universe(), None, "-per"))[-1] == "000660"
+
+def test_multi_key_sort_and_paging():
+    result = screener.run_query(_universe(), None, "market, close desc", limit=2, offset=1)
+    assert _codes(result) == ["035420", "000660"] # KOSDAQ first, then KOSPI by close
+    assert result["total"] == 4
+
+def test_paging_with_ties_neither_overlaps_nor_skips():
+    n = 500
+    rng = np.random.default_rng(7)
+    per = rng.choice([5.0, 10.0, np.nan], n) # heavy ties, NaN ranks as +inf
+    universe = screener.Universe("2026-10-16", {
+        "code": np.array([f"{i:06d}" for i in range(n)]),
+        "per": per,
+    })
+    full = _codes(screener.run_query(universe, None, "per", limit=n, fields=["code"]))
+    pages = []
+    for offset in range(0, n, 37):
+        pages += _codes(screener.run_query(universe, None, "per", limit=37, offset=offset, fields=["code"]))
+    assert pages == full
+    assert len(set(pages)) == n
+    # Ties keep universe order
+    tied = [c for c in full if per[int(c)] == 5.0]
+    assert tied == sorted(tied)
+
+def test_fields_projection_and_nan_as_none():
+    result = screener.run_query(_universe(), "code == '000660'", fields=["code", "per"])
+    assert result["items"] == [{"code": "000660", "per": None}]
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os')",
+    "close.real > 1",
+    "close[0] > 1",
+    "lambda: 1",
+    "pbr <",
+    "unknown_field > 1",
+    "x" * (screener.MAX_EXPRESSION_LENGTH + 1),
+])
+def test_rejected_expressions(expr):
+    with pytest.raises(screener.ScreenerError):
+        screener.run_query(_universe(), expr)
+
+@pytest.mark.parametrize("expr", ["market < 1", "'a' * 100", "name * 3 == 'aaa'"])
+def test_type_errors_become_screener_errors(expr):
+    with pytest.raises(screener.ScreenerError, match="Cannot evaluate"):
+        screener.run_query(_universe(), expr)
+
+def test_bad_sort_expression():
+    with pytest.raises(screener.ScreenerError, match="Cannot sort"):
+        screener.run_query(_universe(), None, "name * 2")
+
+def test_filter_must_be_condition():
+    with pytest.raises(screener.ScreenerError):
+        screener.run_query(_universe(), "pbr + 1")
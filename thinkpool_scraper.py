@@ -264,7 +264,15 @@ def scrape_issue_detail(issn):
 async def get_ai_issue_data_selenium():
     """
     Main entry point for getting AI issue data using Selenium.
-    Captures bubble chart from main page and detail screenshots.
+    The crawl is blocking (several Chrome sessions); it runs on the "browser" executor.
+    """
+    import executors
+
+    return await executors.run("browser", collect_ai_issue_data)
+
+def collect_ai_issue_data():
+    """
+    Captures the issue list, bubble chart from main page and detail screenshots.
     """
     try:
         # Get main issue list
@@ -1,8 +1,9 @@
-import requests
 import re
 import json
 import logging
-import asyncio
+
+import executors
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +22,8 @@ async def get_ai_issue_data():
         from thinkpool_scraper import get_ai_issue_data_selenium
         
         logger.info("Fetching ThinkPool data using Selenium scraper...")
-        data = await get_ai_issue_data_selenium()
+        with metrics.upstream("thinkpool", "selenium"):
+            data = await get_ai_issue_data_selenium()
         
         return data
 
@@ -29,8 +31,7 @@ async def get_ai_issue_data():
         logger.error(f"Selenium not available, falling back to simple scraper: {e}")
         # Fallback to original implementation
         try:
-            loop = asyncio.get_event_loop()
-            content = await loop.run_in_executor(None, _fetch_html)
+            content = await executors.run("scrape", _fetch_html)
             
             if not content:
                 return {"error": "Failed to fetch data"}
@@ -38,18 +39,25 @@ async def get_ai_issue_data():
             data = _extract_nuxt_data(content)
             return data
 
+        except executors.PoolSaturatedError:
+            raise
         except Exception as e2:
             logger.error(f"Fallback scraper also failed: {e2}")
             return {"error": str(e2)}
     
+    except executors.PoolSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"Error fetching ThinkPool data: {e}")
         return {"error": str(e)}
 
 
 def _fetch_html():
-    response = requests.get(THINKPOOL_URL, headers=HEADERS)
-    response.raise_for_status()
+    import requests # deferred: only the (cached) ThinkPool scrape needs it
+
+    with metrics.upstream("thinkpool", "page") as call:
+        response = call.response(requests.get(THINKPOOL_URL, headers=HEADERS))
+        response.raise_for_status()
     return response.text
 
 def _extract_nuxt_data(content):
@@ -0,0 +1,157 @@
+"""
+Per-user watchlists with an in-process read cache.
+
+Each user's watchlists and their items are loaded with two queries on the
+first read and then served from memory until a write by that user (which
+invalidates the entry) or until the TTL expires. The TTL bounds staleness
+when several worker processes serve the same user.
+"""
+import asyncio
+import bisect
+import os
+import time
+from collections import OrderedDict
+
+import crud
+import schemas
+from models import DEFAULT_WATCHLIST, MARKETS
+
+CACHE_TTL = float(os.getenv("FAVORITES_CACHE_TTL", "300"))
+CACHE_MAX_USERS = int(os.getenv("FAVORITES_CACHE_MAX_USERS", "10000"))
+
+FAVORITES_CACHE = {
+    "users": OrderedDict(),  # user_id -> entry (LRU order)
+    "fills": {},             # user_id -> {"lock", "waiting", "writes"} while a DB fill is running or queued
+    "hits": 0,
+    "misses": 0,
+}
+
+def invalidate(user_id: str):
+    fill = FAVORITES_CACHE["fills"].get(user_id)
+    if fill is not None:
+        fill["writes"] += 1 # a fill reading right now must not keep its snapshot
+    FAVORITES_CACHE["users"].pop(user_id, None)
+
+def _view(items):
+    return items, [f.id for f in items]
+
+def _build_entry(watchlists, favorites):
+    lists = {}
+    by_id = {}
+    for wl in watchlists:
+        by_id[wl.id] = lists[wl.name] = {"id": wl.id, "name": wl.name, "created_at": wl.created_at, "items": []}
+
+    for fav in favorites:
+        wl = by_id.get(fav.watchlist_id)
+        if wl is not None:
+            wl["items"].append(schemas.Favorite.model_validate(fav))
+
+    for wl in lists.values():
+        # Pre-split per market so paginated reads are a bisect + slice
+        wl["views"] = {None: _view(wl["items"])}
+        for market in MARKETS:
+            wl["views"][market] = _view([f for f in wl["items"] if f.market == market])
+
+    return {"loaded_at": time.monotonic(), "watchlists": lists}
+
+async def load_user(db, user_id: str):
+    cache = FAVORITES_CACHE["users"]
+    entry = cache.get(user_id)
+    if entry and time.monotonic() - entry["loaded_at"] < CACHE_TTL:
+        cache.move_to_end(user_id)
+        FAVORITES_CACHE["hits"] += 1
+        return entry
+
+    # One DB fill per user at a time; the record only lives while someone is filling or waiting
+    fills = FAVORITES_CACHE["fills"]
+    fill = fills.get(user_id)
+    if fill is None:
+        fill = fills[user_id] = {"lock": asyncio.Lock(), "waiting": 0, "writes": 0}
+    fill["waiting"] += 1
+    try:
+        async with fill["lock"]:
+            entry = cache.get(user_id)
+            if entry and time.monotonic() - entry["loaded_at"] < CACHE_TTL:
+                FAVORITES_CACHE["hits"] += 1
+                return entry
+
+            FAVORITES_CACHE["misses"] += 1
+            writes = fill["writes"]
+            watchlists = await crud.get_watchlists(db, user_id)
+            favorites = await crud.get_user_favorites(db, user_id)
+            entry = _build_entry(watchlists, favorites)
+
+            # A write that landed while we were reading makes this snapshot stale: serve it once, don't keep it
+            if fill["writes"] == writes:
+                cache[user_id] = entry
+                cache.move_to_end(user_id)
+                while len(cache) > CACHE_MAX_USERS:
+                    cache.popitem(last=False)
+            return entry
+    finally:
+        fill["waiting"] -= 1
+        if not fill["waiting"]:
+            fills.pop(user_id, None)
+
+# Reads
+async def list_watchlists(db, user_id: str, include_items: bool = True):
+    entry = await load_user(db, user_id)
+    result = []
+    for wl in entry["watchlists"].values():
+        item = {"id": wl["id"], "name": wl["name"], "created_at": wl["created_at"], "count": len(wl["items"])}
+        if include_items:
+            item["items"] = wl["items"]
+        result.append(item)
+    return result
+
+async def list_favorites(db, user_id: str, watchlist: str = DEFAULT_WATCHLIST, market: str = None,
+                         after_id: int = None, limit: int = 100, skip: int = 0):
+    """
+    Keyset (after_id) or offset (skip) page of one watchlist, served from cache.
+    """
+    entry = await load_user(db, user_id)
+    wl = entry["watchlists"].get(watchlist)
+    if not wl:
+        return []
+    items, ids = wl["views"].get(market.upper() if market else None, ([], []))
+    start = bisect.bisect_right(ids, after_id) if after_id is not None else skip
+    return items[start:start + limit]
+
+async def get_watchlist_id(db, user_id: str, watchlist: str = DEFAULT_WATCHLIST):
+    entry = await load_user(db, user_id)
+    wl = entry["watchlists"].get(watchlist)
+    return wl["id"] if wl else None
+
+# Writes (always invalidate the user's cache entry)
+async def create_watchlist(db, user_id: str, name: str):
+    watchlist = await crud.get_or_create_watchlist(db, user_id, name)
+    invalidate(user_id)
+    return watchlist
+
+async def delete_watchlist(db, user_id: str, name: str):
+    deleted = await crud.delete_watchlist(db, user_id, name)
+    invalidate(user_id)
+    return deleted
+
+async def add_favorite(db, user_id: str, favorite: schemas.FavoriteCreate, watchlist: str = DEFAULT_WATCHLIST,
+                       market: str = None):
+    wl = await crud.get_or_create_watchlist(db, user_id, watchlist)
+    fav = await crud.create_favorite(db, wl, favorite, market)
+    invalidate(user_id)
+    return fav
+
+async def remove_favorite(db, user_id: str, stock_code: str, watchlist: str = DEFAULT_WATCHLIST, market: str = None):
+    watchlist_id = await get_watchlist_id(db, user_id, watchlist)
+    if watchlist_id is None:
+        return False
+    deleted = await crud.delete_favorite(db, watchlist_id, stock_code, market)
+    invalidate(user_id)
+    return deleted
+
+async def bulk_update(db, user_id: str, watchlist: str = DEFAULT_WATCHLIST, add=(), remove=(), replace: bool = False,
+                      market: str = None):
+    wl = await crud.get_or_create_watchlist(db, user_id, watchlist)
+    try:
+        return await crud.bulk_update_favorites(db, wl, add, remove, replace, market)
+    finally:
+        invalidate(user_id)